@@ -0,0 +1,308 @@
+# -*- coding: utf-8 -*-
+"""
+本地模拟服务
+
+用于性能测试，不访问真实网站：
+- MockApiServer：模拟 main.py 中用到的 api2.liblib.art 接口（搜索、详情、配套模型、下载校验、下载地址）
+- RangeFileServer：支持 HEAD / Range 请求的文件服务，按需生成任意大小的合成文件（不占用磁盘），
+  带 auth_key 的地址过期后返回 403（模拟下载地址签名过期）
+
+两者都支持配置请求延迟、单连接带宽上限和错误注入。
+"""
+
+import json
+import random
+import re
+import sys
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+TILE_SIZE = 1024 * 1024
+_TILE = random.Random(20250602).randbytes(TILE_SIZE)
+
+
+def synthetic_bytes(offset, length):
+    """
+    合成文件在 [offset, offset + length) 区间的内容，内容由固定的 1MB 随机块循环组成
+    """
+    parts = []
+    while length > 0:
+        start = offset % TILE_SIZE
+        n = min(length, TILE_SIZE - start)
+        parts.append(_TILE[start:start + n])
+        offset += n
+        length -= n
+    return b''.join(parts)
+
+
+class _HTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # 客户端主动断开（如分片被拆分后提前关闭连接）属于正常情况，不输出堆栈
+        if isinstance(sys.exc_info()[1], (ConnectionResetError, BrokenPipeError)):
+            return
+        super().handle_error(request, client_address)
+
+
+class _Server:
+    """
+    在后台线程中运行的 HTTP 服务
+    """
+
+    def __init__(self, handler_cls, host='127.0.0.1', port=0, latency=0.0, bandwidth=0, error_rate=0.0):
+        """
+        :param handler_cls: 请求处理类
+        :param latency: 每个请求的额外延迟（秒）
+        :param bandwidth: 单连接带宽上限（字节/秒），0 表示不限
+        :param error_rate: 请求出错的概率（0~1）
+        """
+        self.httpd = _HTTPServer((host, port), handler_cls)
+        self.httpd.latency = latency
+        self.httpd.bandwidth = bandwidth
+        self.httpd.error_rate = error_rate
+        self.httpd.request_count = 0
+        self.httpd.count_lock = threading.Lock()
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def request_count(self):
+        return self.httpd.request_count
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class _BaseHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # 响应头和响应体分两次发送，关闭 Nagle 避免 keep-alive 连接上的延迟确认等待
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def _begin(self):
+        with self.server.count_lock:
+            self.server.request_count += 1
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        return random.random() >= self.server.error_rate
+
+    def _send_bytes(self, code, body, content_type='application/octet-stream', headers=None):
+        self.send_response(code)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(body)
+
+    def _read_json(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        if not length:
+            return {}
+        return json.loads(self.rfile.read(length) or b'{}')
+
+
+class _ApiHandler(_BaseHandler):
+    def do_GET(self):
+        self._handle()
+
+    def do_POST(self):
+        self._handle()
+
+    def _handle(self):
+        body = self._read_json()
+        if not self._begin():
+            self._send_bytes(500, b'{"code":500,"msg":"injected error"}', 'application/json')
+            return
+        path = urlparse(self.path).path
+        catalog = self.server.catalog
+        if path.endswith('/model/search'):
+            data = catalog.search(body.get('page', 1), body.get('pageSize', 50))
+        elif '/model/getByUuid/' in path:
+            data = catalog.models.get(path.rsplit('/', 1)[-1])
+            if data is None:
+                self._json({'code': 404, 'msg': '模型不存在', 'data': None})
+                return
+        elif path.endswith('/model-version/modelVersion/listByIds'):
+            data = catalog.list_by_ids(body.get('versionIds') or [])
+        elif path.endswith('/community/downloadCheck'):
+            data = True
+        elif '/model/download/' in path:
+            data = catalog.download_url(path.rsplit('/', 1)[-1])
+        else:
+            self._send_bytes(404, b'{}', 'application/json')
+            return
+        self._json({'code': 0, 'msg': 'ok', 'data': data})
+
+    def _json(self, payload):
+        self._send_bytes(200, json.dumps(payload, ensure_ascii=False).encode('utf-8'), 'application/json')
+
+
+class MockCatalog:
+    """
+    合成的模型目录：若干底模（Checkpoint）和引用这些底模的 LoRA
+    """
+
+    def __init__(self, num_models=200, num_checkpoints=5, file_size=1024 * 1024, file_server_url='', url_ttl=0):
+        """
+        :param url_ttl: 下载地址有效期（秒），0 表示不过期
+        """
+        self.file_size = file_size
+        self.url_ttl = url_ttl
+        self.file_server_url = file_server_url
+        self.models = {}
+        self.versions = {}
+        self.order = []
+        for i in range(num_models):
+            is_checkpoint = i < num_checkpoints
+            uuid = f"{i:032x}"
+            version_id = 100000 + i
+            ckpt = [] if is_checkpoint else [100000 + (i % num_checkpoints)]
+            self.models[uuid] = {
+                'id': i + 1,
+                'uuid': uuid,
+                'name': f"bench-model-{i}",
+                'modelType': 1 if is_checkpoint else 5,
+                'versions': [{
+                    'id': version_id,
+                    'uuid': f"{version_id:032x}",
+                    'name': 'v1',
+                    'versionDesc': 'synthetic model',
+                    'versionIntro': json.dumps({'ckpt': ckpt}),
+                    'attachment': {'modelSource': f"https://www.liblib.art/modelinfo/{uuid}?versionUuid={version_id:032x}"},
+                    'imageGroup': {
+                        'coverUrl': f"{file_server_url}/files/{uuid}.png?size=65536",
+                        'images': [{'imageUrl': f"{file_server_url}/files/{uuid}-{n}.jpg?size=131072"}
+                                   for n in range(3)],
+                    },
+                }],
+            }
+            self.versions[version_id] = {
+                'id': version_id,
+                'modelUuid': uuid,
+                'modelName': f"bench-model-{i}",
+                'baseType': 19,
+                'modelVersionName': 'v1',
+            }
+            self.order.append(uuid)
+
+    def search(self, page, page_size):
+        start = (page - 1) * page_size
+        items = [{'uuid': u} for u in self.order[start:start + page_size]]
+        return {'data': items, 'hasMore': start + page_size < len(self.order)}
+
+    def list_by_ids(self, version_ids):
+        return [self.versions[int(v)] for v in version_ids if int(v) in self.versions]
+
+    def download_url(self, uuid):
+        url = f"{self.file_server_url}/files/{uuid}.safetensors?size={self.file_size}"
+        if self.url_ttl:
+            # 与真实地址类似：auth_key 以过期时间戳开头
+            url += f"&auth_key={time.time() + self.url_ttl:.3f}-0-0-bench"
+        return url
+
+
+class MockApiServer(_Server):
+    """
+    模拟 liblib 接口服务，接口路径与 main.py 中的 baseUrl 一致（/api/www/...）
+    """
+
+    def __init__(self, catalog, **kwargs):
+        super().__init__(_ApiHandler, **kwargs)
+        self.httpd.catalog = catalog
+
+    @property
+    def base_url(self):
+        return self.url + '/api/www'
+
+
+class _FileHandler(_BaseHandler):
+    def do_HEAD(self):
+        self._handle()
+
+    def do_GET(self):
+        self._handle()
+
+    def _handle(self):
+        ok = self._begin()
+        query = parse_qs(urlparse(self.path).query)
+        size = int(query.get('size', ['0'])[0])
+        if self.command == 'GET' and not ok:
+            self._send_bytes(503, b'injected error', 'text/plain')
+            return
+        auth_key = query.get('auth_key', [''])[0]
+        if auth_key and float(auth_key.split('-', 1)[0]) < time.time():
+            self._send_bytes(403, b'auth_key expired', 'text/plain')
+            return
+
+        start, end, code = 0, size - 1, 200
+        rng = self.headers.get('Range')
+        if rng and self.command == 'GET':
+            m = re.match(r'bytes=(\d+)-(\d*)', rng)
+            start = int(m.group(1))
+            end = min(int(m.group(2)), size - 1) if m.group(2) else size - 1
+            code = 206
+            if start >= size:
+                # 与真实服务一致：起始位置超出文件大小时返回 416
+                self.send_response(416)
+                self.send_header('Content-Range', f"bytes */{size}")
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+        length = max(0, end - start + 1)
+
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/octet-stream')
+        self.send_header('Content-Length', str(length))
+        self.send_header('Accept-Ranges', 'bytes')
+        if code == 206:
+            self.send_header('Content-Range', f"bytes {start}-{end}/{size}")
+        self.end_headers()
+        if self.command == 'HEAD':
+            return
+        self._stream(start, length)
+
+    def _stream(self, offset, length):
+        block = 256 * 1024
+        bandwidth = self.server.bandwidth
+        began = time.monotonic()
+        sent = 0
+        try:
+            while sent < length:
+                n = min(block, length - sent)
+                self.wfile.write(synthetic_bytes(offset + sent, n))
+                sent += n
+                if bandwidth:
+                    # 按单连接带宽上限限速
+                    ahead = sent / bandwidth - (time.monotonic() - began)
+                    if ahead > 0:
+                        time.sleep(ahead)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+
+class RangeFileServer(_Server):
+    """
+    支持 Range 请求的合成文件服务：/files/<任意文件名>?size=<字节数>
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(_FileHandler, **kwargs)
+
+    def file_url(self, name, size):
+        return f"{self.url}/files/{name}?size={size}"
@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+"""
+性能测试
+
+启动本地模拟接口与 Range 文件服务，在独立子进程中逐个运行测试场景，每个场景输出一行 JSON：
+- search：搜索列表分页抓取
+- metadata：模型详情、配套模型依赖与下载地址解析
+- download_single：单线程下载
+- download_multi：多线程分片下载
+
+用法（在项目根目录执行）：
+    python -m bench.run_bench
+    python -m bench.run_bench --scenario download_multi --size-mb 1024 4096 --threads 10
+    python -m bench.run_bench --latency 0.05 --bandwidth-mbps 20 --error-rate 0.01 --output bench_output.txt
+"""
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCENARIOS = ('search', 'metadata', 'download_single', 'download_multi')
+
+
+def _usage():
+    """
+    当前进程的 CPU 时间（秒）与峰值内存（MB）
+    """
+    if resource is None:
+        return time.process_time(), None
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    # Linux 下 ru_maxrss 单位为 KB，macOS 下为字节
+    peak = usage.ru_maxrss / 1024 if sys.platform != 'darwin' else usage.ru_maxrss / 1024 / 1024
+    return usage.ru_utime + usage.ru_stime, round(peak, 1)
+
+
+def _prepare_workdir(workdir):
+    """
+    在临时目录中生成配置文件，数据库与模型都写入临时目录
+    """
+    import yaml
+    with open(os.path.join(ROOT_DIR, 'conf', 'conf.yml'), 'r', encoding='utf-8') as f:
+        config = yaml.safe_load(f)
+    config['user'] = {'token': 'bench', 'cid': 'bench'}
+    config['db']['path'] = workdir
+    config['download']['model_parent_path'] = workdir + '/models/'
+    # 模拟文件内容相同，关闭按内容去重，保证每个模型都实际下载
+    config['download']['blob_store'] = False
+    os.makedirs(os.path.join(workdir, 'conf'), exist_ok=True)
+    with open(os.path.join(workdir, 'conf', 'conf.yml'), 'w', encoding='utf-8') as f:
+        yaml.safe_dump(config, f, allow_unicode=True)
+
+
+def run_worker(spec):
+    """
+    子进程中运行单个场景，返回结果 dict
+    """
+    import logging
+    sys.path.insert(0, ROOT_DIR)
+    logging.basicConfig(level=logging.WARNING)
+    workdir = spec['workdir']
+    _prepare_workdir(workdir)
+    os.chdir(workdir)
+
+    scenario = spec['scenario']
+    result = {'scenario': scenario}
+    cpu_before, _ = _usage()
+    began = time.perf_counter()
+
+    if scenario in ('search', 'metadata'):
+        import main
+        main.baseUrl = spec['api_url']
+        main.TOKEN = main.CID = 'bench'
+        main.autoDownload = False
+        main.rate_limiter.configure(api_requests_per_second=spec['api_rps'])
+        main.search_concurrency = spec['concurrency']
+        if scenario == 'search':
+            result['items'] = len(main.search_model('bench'))
+        else:
+            uuids = main.search_model('bench')[:spec['models']]
+            began = time.perf_counter()
+            result['items'] = len(main.download_models(uuids))
+    else:
+        from util.DownloadUtil import DownloadUtil
+        path = os.path.join(workdir, 'models', 'bench.bin')
+        downloader = DownloadUtil(max_retries=3, retry_wait=1, chunk_size=spec['chunk_size'])
+        if scenario == 'download_single':
+            downloader.download_file(spec['file_url'], path)
+        else:
+            downloader.download_file_multi_threaded(spec['file_url'], path, num_threads=spec['threads'])
+        result['bytes'] = os.path.getsize(path)
+        os.remove(path)
+
+    seconds = time.perf_counter() - began
+    cpu_after, peak_rss = _usage()
+    result['seconds'] = round(seconds, 3)
+    result['cpu_seconds'] = round(cpu_after - cpu_before, 3)
+    result['peak_rss_mb'] = peak_rss
+    if 'bytes' in result:
+        mb = result['bytes'] / 1024 / 1024
+        result['size_mb'] = round(mb, 1)
+        result['mb_per_s'] = round(mb / seconds, 2) if seconds else None
+        result['cpu_seconds_per_gb'] = round(result['cpu_seconds'] / (mb / 1024), 3) if mb else None
+    return result
+
+
+def _run_scenario(spec, api_server, file_server):
+    """
+    在子进程中运行场景，并统计模拟服务收到的请求数
+    """
+    env = dict(os.environ, TQDM_DISABLE='1')
+    requests_before = api_server.request_count + file_server.request_count
+    proc = subprocess.run([sys.executable, '-m', 'bench.run_bench', '--worker', json.dumps(spec)],
+                          cwd=ROOT_DIR, env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    if proc.returncode != 0:
+        return {'scenario': spec['scenario'], 'error': proc.stderr.strip().splitlines()[-1:]}
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    requests = api_server.request_count + file_server.request_count - requests_before
+    result['requests'] = requests
+    result['requests_per_s'] = round(requests / result['seconds'], 2) if result['seconds'] else None
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='liblib-spider 性能测试')
+    parser.add_argument('--scenario', nargs='+', choices=SCENARIOS, default=list(SCENARIOS), help='要运行的场景')
+    parser.add_argument('--size-mb', nargs='+', type=int, default=[1024], help='下载场景的合成文件大小（MB）')
+    parser.add_argument('--threads', type=int, default=10, help='多线程下载的线程数')
+    parser.add_argument('--chunk-size', type=int, default=1024 * 1024, help='每个下载线程的接收缓冲区大小（字节）')
+    parser.add_argument('--models', type=int, default=200, help='模拟目录中的模型数')
+    parser.add_argument('--concurrency', type=int, default=4, help='搜索列表并发页数')
+    parser.add_argument('--api-rps', type=float, default=0, help='接口每秒请求数（全局限速），0 表示不限')
+    parser.add_argument('--latency', type=float, default=0.0, help='模拟服务每个请求的延迟（秒）')
+    parser.add_argument('--bandwidth-mbps', type=float, default=0, help='文件服务单连接带宽上限（MB/s），0 表示不限')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='模拟服务的错误注入概率（0~1）')
+    parser.add_argument('--output', help='追加写入结果的文件（JSON Lines）')
+    parser.add_argument('--worker', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.worker:
+        print(json.dumps(run_worker(json.loads(args.worker)), ensure_ascii=False))
+        return
+
+    sys.path.insert(0, ROOT_DIR)
+    from bench.mock_server import MockApiServer, MockCatalog, RangeFileServer
+
+    server_kwargs = dict(latency=args.latency, error_rate=args.error_rate)
+    file_server = RangeFileServer(bandwidth=int(args.bandwidth_mbps * 1024 * 1024), **server_kwargs).start()
+    catalog = MockCatalog(num_models=args.models, file_server_url=file_server.url)
+    api_server = MockApiServer(catalog, **server_kwargs).start()
+
+    specs = []
+    base = {'api_url': api_server.base_url, 'models': args.models, 'concurrency': args.concurrency,
+            'api_rps': args.api_rps, 'threads': args.threads, 'chunk_size': args.chunk_size}
+    for scenario in args.scenario:
+        if scenario.startswith('download'):
+            for size_mb in args.size_mb:
+                size = size_mb * 1024 * 1024
+                specs.append(dict(base, scenario=scenario, file_url=file_server.file_url('bench.bin', size)))
+        else:
+            specs.append(dict(base, scenario=scenario))
+
+    try:
+        for spec in specs:
+            workdir = tempfile.mkdtemp(prefix='liblib-bench-')
+            try:
+                result = _run_scenario(dict(spec, workdir=workdir), api_server, file_server)
+            finally:
+                shutil.rmtree(workdir, ignore_errors=True)
+            if spec['scenario'] == 'download_multi':
+                result['threads'] = args.threads
+            line = json.dumps(result, ensure_ascii=False)
+            print(line, flush=True)
+            if args.output:
+                with open(args.output, 'a', encoding='utf-8') as f:
+                    f.write(line + '\n')
+    finally:
+        api_server.stop()
+        file_server.stop()
+
+
+if __name__ == '__main__':
+    main()
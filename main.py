@@ -1,31 +1,115 @@
 # -*- coding: utf-8 -*-
 
-import requests
 import json
 import time
 from urllib.parse import urlparse, parse_qs
 import os
-import subprocess
 import logging
 import signal
+import atexit
 import threading
+import argparse
+import sys
 
 from ModelType import ModelType
 from BaseModelType import BaseModelType
-from util.file_util import file_util
+from util.Config import Config
 from util.SQLiteDB import SQLiteDB
-from logging.handlers import TimedRotatingFileHandler
-from util.DownloadUtil import DownloadUtil
-from util.logger_utils import setup_global_logger
-
+from util.PageCrawler import PageCrawler
+from util.DownloadScheduler import DownloadScheduler, FAILED, SKIPPED
+from util.MetadataCache import MetadataCache
+from util.DependencyResolver import DependencyResolver
+from util.ManifestWriter import ManifestWriter
+from util.RateLimiter import RateLimiter
+from util.Metrics import Metrics
+from util.CatalogIndex import CatalogIndex
+from util.AssetPipeline import AssetPipeline
+from util.DiskSpace import DiskSpace
+from util.SignedUrl import SignedUrl
+from util.JobJournal import JobJournal, RESOLVED, URL_OBTAINED, DOWNLOADING, VERIFIED, DONE
+
+# requests、tqdm、tenacity、colorlog 等较重的模块在首次使用时才导入，离线查询等短命令启动更快
+# 数据库在首次访问时才打开并建表
 db = SQLiteDB()
-db.init_db()
+# 退出前提交缓冲中的记录
+atexit.register(db.close)
+# 下载任务日志：记录每个模型的下载阶段和分片进度，中断后可从断点继续
+journal = JobJournal(db)
+# 模型元数据缓存（内存 + SQLite）
+metadata_cache = MetadataCache(db)
+# 共享的 HTTP 客户端（连接池复用），首次请求时创建，见 get_http_client()
+http_client = None
+# 全局限速器（接口请求数、下载带宽），所有线程共享
+rate_limiter = RateLimiter.shared()
+# 运行指标（可选 Prometheus 接口与 JSON 快照）
+metrics = Metrics.shared()
+metrics.describe('liblib_api_request_seconds', 'histogram', '接口请求耗时（按接口）')
+metrics.describe('liblib_api_requests_total', 'counter', '接口请求次数（按接口、结果）')
+metrics.describe('liblib_http_requests_total', 'counter', 'HTTP 请求总数（含下载）')
+metrics.describe('liblib_http_pool_connections_total', 'counter', '连接池取连接次数（reused 复用，new 新建）')
+
+
+def collect_http_metrics():
+    if http_client is None:
+        return []
+    stats = http_client.stats()
+    return [
+        ('liblib_http_requests_total', {}, stats['requests']),
+        ('liblib_http_pool_connections_total', {'result': 'reused'}, stats['pool_hits']),
+        ('liblib_http_pool_connections_total', {'result': 'new'}, stats['pool_misses']),
+    ]
+
+
+metrics.register_collector(collect_http_metrics)
 keyboard_interrupted = False
+# 收到的退出信号（SIGINT / SIGTERM），未收到时为 None
+exit_signal = None
+# 收到退出信号后等待已中止的下载线程结束的最长时间（秒）
+SHUTDOWN_TIMEOUT = 10
 # 获取 TOKEN
 TOKEN = None
 CID = None
 autoDownload = None
+# 单个文件的下载线程（分片）数，为 1 时单连接顺序下载
 download_three_number = 1
+# 下载失败的最大尝试次数、请求超时时间（秒）、整个文件重试的等待时间与单个分片重试的间隔（秒）
+download_max_retries = 3
+download_timeout = 60
+download_retry_wait = 5
+download_retry_interval = 5
+# 按模型类型覆盖的下载参数：{ModelType: {参数: 值}}，如大模型使用更多分片、小文件单连接下载
+download_type_overrides = {}
+# 是否把搜索结果（模型UUID列表）保存到文件
+save_search_list = False
+# 同时下载的模型数、同时解析的模型数、所有下载共享的最大连接数
+download_parallel_jobs = 2
+download_resolve_workers = 2
+download_max_connections = 16
+# 多线程下载时各分片按偏移直接写入目标文件（False 则写入分片文件后合并）
+download_in_place = True
+# 多线程下载的初始分片大小（MB）
+download_segment_size_mb = 8
+# 每个下载线程的接收缓冲区大小（KB），数据直接读入缓冲区再写入文件
+download_buffer_size_kb = 1024
+# 按内容寻址的文件存储（相同内容只下载、保存一份），未启用时为 None
+blob_store = None
+# 预留磁盘空间后模型目录所在磁盘至少保留的剩余空间（MB）
+download_min_free_mb = 1024
+# 封面、模型信息等附属文件的下载线程数，是否下载 imageGroup 中的全部示例图片
+asset_workers = 4
+asset_download_images = False
+asset_pipeline = None
+# 附属文件下载的块大小
+ASSET_CHUNK_SIZE = 256 * 1024
+# 批量查询配套模型时每次请求的版本数
+recommend_batch_size = 100
+# 搜索列表并发页数
+search_concurrency = 4
+# 增量搜索：按最新排序抓取，连续遇到 search_known_run 个已见过的模型后停止翻页
+search_incremental = False
+# 搜索接口中“最新”排序对应的 sort 参数值，None 表示不传（接口默认排序）
+search_sort = None
+search_known_run = 50
 # 模型存放父级路径，这可以修改，也可以修改ModelType中文件路径
 model_file_parent_dir = None
 baseUrl = 'https://api2.liblib.art/api/www'
@@ -43,8 +127,49 @@ getDownloadUrl = "/model/download/"
 logger = logging.getLogger(__name__)
 
 
+# 共享的 HTTP 客户端：首次调用时按 conf.yml 的 http 配置创建
+def get_http_client():
+    global http_client
+    if http_client is None:
+        from util.HttpClient import HttpClient
+        http_conf = Config.shared().http
+        client = HttpClient(
+            pool_connections=http_conf.pool_connections,
+            pool_maxsize=http_conf.pool_maxsize,
+            connect_timeout=http_conf.connect_timeout,
+            read_timeout=http_conf.read_timeout,
+        )
+        HttpClient.set_shared(client)
+        http_client = client
+    return http_client
+
+
+# 调用接口：所有接口共用全局限速器的请求令牌，并按接口统计耗时
+def api_request(method, path, **kwargs):
+    endpoint = next((e for e in (searchModels, getModelInfo, recommendModels, checkDownloadUrl, getDownloadUrl)
+                     if path.startswith(e)), path).strip('/')
+    rate_limiter.acquire_api()
+    began = time.perf_counter()
+    try:
+        res = get_http_client().request(method, baseUrl + path, **kwargs)
+    except Exception:
+        metrics.inc('liblib_api_requests_total', endpoint=endpoint, result='error')
+        raise
+    metrics.observe('liblib_api_request_seconds', time.perf_counter() - began, endpoint=endpoint)
+    metrics.inc('liblib_api_requests_total', endpoint=endpoint, result=str(res.status_code))
+    return res
+
+
+def api_post(path, **kwargs):
+    return api_request('POST', path, **kwargs)
+
+
+def api_get(path, **kwargs):
+    return api_request('GET', path, **kwargs)
+
+
 # 搜索模型列表
-def search_model(keyword, types=[], models=[], vipType=[]):
+def search_model(keyword, types=[], models=[], vipType=[], incremental=None):
     '''
 
     :param keyword: 搜索内容
@@ -75,9 +200,23 @@ def search_model(keyword, types=[], models=[], vipType=[]):
         0 免费模型
         1 会员专属
         2 仅会员可下载
-    :return:
+    :param incremental: 是否增量同步，None 时使用配置 search.incremental
+    :return: 模型UUID列表；增量同步时为本次新抓取的结果，后面接上本地索引中该搜索条件已见过的模型
     '''
-    logger.info("全量获取数据中，请等待...")
+    if incremental is None:
+        incremental = search_incremental
+    # 搜索条件键：同一关键字、过滤条件和排序共用一份本地索引
+    query_key = json.dumps({'keyword': keyword, 'types': sorted(types), 'models': sorted(models),
+                            'vipType': sorted(vipType), 'sort': search_sort}, ensure_ascii=False, sort_keys=True)
+    stop_when = None
+    if incremental:
+        if search_sort is None:
+            logger.warning("未配置 search.sort（最新排序），无法保证结果按时间排序，本次仍全量获取")
+        elif db.get_search_synced_at(query_key) is None:
+            logger.info("该搜索条件首次同步，全量获取")
+        else:
+            stop_when = known_run_stopper(query_key)
+    logger.info("增量获取数据中，请等待..." if stop_when else "全量获取数据中，请等待...")
 
     bodys = {
         'keyword': keyword,
@@ -88,40 +227,69 @@ def search_model(keyword, types=[], models=[], vipType=[]):
         'models': models,
         'vipType': vipType,
     }
+    if search_sort is not None:
+        bodys['sort'] = search_sort
 
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/89.0.4389.90 Safari/537.36'
-    }
-
-    datas = []
-
-    while True:
-        logger.info("正在获取第 " + str(bodys["page"]) + " 页数据...")
-        time.sleep(1)
+    def fetch_page(page):
+        logger.info("正在获取第 " + str(page) + " 页数据...")
         params = {
             'timestamp': time.time()
         }
-        response = requests.post(baseUrl + searchModels, params=params, json=bodys, headers=headers)
+        response = api_post(searchModels, params=params, json=dict(bodys, page=page))
         json_data = response.json()
-        bodys["page"] = bodys["page"] + 1
         # logger.info(json.dumps(json_data, ensure_ascii=False))
-        if not json_data["data"]["hasMore"]:
-            break
-        else:
-            # logger.info(json.dumps(json_data.json(), ensure_ascii=False))
-            # 将数组存放到 数组中
-            for item in json_data["data"]["data"]:
-                datas.append(item['uuid'])
-    logger.info("获取数据完成，共有 " + str(len(datas)) + " 条数据")
+        return [item['uuid'] for item in json_data["data"]["data"]], json_data["data"]["hasMore"]
+
+    # fetch_page 通过 api_post 请求，已受全局限速器约束
+    crawler = PageCrawler(fetch_page, concurrency=search_concurrency)
+    datas = crawler.crawl(start_page=bodys["page"], stop_when=stop_when)
+    datas = list(dict.fromkeys(datas))
+    known = db.which_known_in_search(query_key, datas)
+    db.record_search_results(query_key, query_key, datas, time.time())
+    logger.info("获取数据完成，共有 " + str(len(datas)) + " 条数据，其中新增 " + str(len(datas) - len(known)) + " 条")
+    if stop_when:
+        # 未重新抓取的部分由本地索引补齐
+        datas = list(dict.fromkeys(datas + db.get_search_uuids(query_key)))
+    if save_search_list:
+        save_search_results(keyword, datas)
     return datas
 
 
+# 保存搜索结果：每行一个模型UUID，可直接作为 batch -U 的输入文件
+def save_search_results(keyword, uuids):
+    file_name = ''.join('_' if c in '\\/:*?"<>|' else c for c in keyword).strip() or 'search'
+    file_path = os.path.join(model_file_parent_dir or '.', 'search_lists', f"{file_name}.txt")
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    with open(file_path, 'w', encoding='utf-8') as f:
+        f.write(f"# {keyword} {time.strftime('%Y-%m-%d %H:%M:%S')}\n")
+        for uuid in uuids:
+            f.write(uuid + "\n")
+    logger.info(f"搜索结果已保存至 {file_path}")
+
+
+# 增量搜索的停止条件：按页码顺序检查，连续 search_known_run 个模型都已见过时停止翻页
+def known_run_stopper(query_key):
+    run = 0
+
+    def stop_when(items):
+        nonlocal run
+        known = db.which_known_in_search(query_key, items)
+        for uuid in items:
+            run = run + 1 if uuid in known else 0
+            if run >= search_known_run:
+                return True
+        return False
+
+    return stop_when
+
+
 # 获取模型详情
-def get_model_info(model_id):
+def get_model_info(model_id, bypass_cache=False):
     if model_id is None:
         return None
     '''
     :param model_id:
+    :param bypass_cache: True 时跳过元数据缓存，直接请求接口
     :return:
     modelType:
         1 Checkpoint
@@ -135,18 +303,19 @@ def get_model_info(model_id):
         9 Wildcards
         10 Other
     '''
-    params = {
-        'timestamp': time.time()
-    }
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/89.0.4389.90 Safari/537.36'
-    }
-    res = requests.post(baseUrl + getModelInfo + model_id, params=params, headers=headers)
-    # logger.info(json.dumps(res.json(), ensure_ascii=False))
-    if res.json()["code"] == 0:
-        return res.json()["data"]
-    else:
-        return None
+
+    def load():
+        params = {
+            'timestamp': time.time()
+        }
+        res = api_post(getModelInfo + model_id, params=params)
+        # logger.info(json.dumps(res.json(), ensure_ascii=False))
+        if res.json()["code"] == 0:
+            return res.json()["data"]
+        else:
+            return None
+
+    return metadata_cache.get_or_load(f"model:{model_id}", load, bypass=bypass_cache)
 
 
 # 获取搭配模型
@@ -157,10 +326,7 @@ def get_recommend_model(versionIds):
     bodys = {
         'versionIds': versionIds
     }
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/89.0.4389.90 Safari/537.36'
-    }
-    res = requests.post(baseUrl + recommendModels, json=bodys, params=params, headers=headers)
+    res = api_post(recommendModels, json=bodys, params=params)
     # 打印双引号json
     # logger.info(json.dumps(res.json(), ensure_ascii=False))
     return res.json()
@@ -171,11 +337,10 @@ def get_download_url(model_uuid, model_url):
     params = url_params_to_json(model_url)
     params['timestamp'] = time.time()
     headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/89.0.4389.90 Safari/537.36',
         'token': TOKEN
     }
     # logger.info(json.dumps(params, ensure_ascii=False))
-    res = requests.get(baseUrl + getDownloadUrl + model_uuid, params=params, headers=headers)
+    res = api_get(getDownloadUrl + model_uuid, params=params, headers=headers)
     # logger.info(json.dumps(res.json(), ensure_ascii=False))
     if res.json()["code"] == 0:
         return res.json()["data"]
@@ -202,10 +367,7 @@ def get_check_download(model_id, model_name, model_version_id, model_url, model_
     }
     # logger.info(json.dumps(bodys, ensure_ascii=False))
 
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/89.0.4389.90 Safari/537.36'
-    }
-    res = requests.post(baseUrl + checkDownloadUrl, json=bodys, params=params, headers=headers)
+    res = api_post(checkDownloadUrl, json=bodys, params=params)
     # logger.info(json.dumps(res.json(), ensure_ascii=False))
     return res.json()["data"]
 
@@ -244,98 +406,362 @@ def get_model_id_by_url(url):
 
 
 # 获取配套模型
-def get_compatible_model(versionIds=[]):
+def get_compatible_model(versionIds=[], bypass_cache=False):
     if len(versionIds) == 0:
         return None
 
+    # 已缓存的版本直接使用，只请求未命中的版本
+    compatible_models = []
+    missing_ids = []
+    for version_id in versionIds:
+        cached = metadata_cache.get(f"version:{version_id}", bypass=bypass_cache)
+        if cached is None:
+            missing_ids.append(version_id)
+        else:
+            compatible_models.append(cached)
+    if not missing_ids:
+        return compatible_models
+
     params = {
         'timestamp': time.time()
     }
 
-    bodys = {
-        "versionIds": versionIds
-    }
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/89.0.4389.90 Safari/537.36'
-    }
-    res = requests.post(baseUrl + recommendModels, json=bodys, params=params, headers=headers)
-    # logger.info(json.dumps(res.json(), ensure_ascii=False))
-    return res.json()["data"]
+    # 按批次请求，避免单次请求的版本数过多
+    for i in range(0, len(missing_ids), recommend_batch_size):
+        bodys = {
+            "versionIds": missing_ids[i:i + recommend_batch_size]
+        }
+        res = api_post(recommendModels, json=bodys, params=params)
+        # logger.info(json.dumps(res.json(), ensure_ascii=False))
+        for compatible_model in res.json()["data"] or []:
+            metadata_cache.put(f"version:{compatible_model['id']}", compatible_model)
+            compatible_models.append(compatible_model)
+    return compatible_models
 
 
-# 获取模型直连地址
-def get_direct_link(model_uuid):
+# 解析模型下载信息（不执行下载）
+def resolve_model(model_uuid):
+    '''
+    配套模型由 plan_models 统一解析，这里只处理单个模型
+    :param model_uuid: 模型UUID
+    :return: 下载信息 dict（model_uuid、model_name、model_info、download_url、model_path），无法下载时返回 None
+    '''
     if model_uuid is None:
         return None
     if db.is_model_downloaded(model_uuid):
         logger.warning("模型已下载")
         return None
+    # 上次已获取下载地址但未完成的任务，直接使用记录的下载信息继续
+    resolved = journal.resumable_payload(model_uuid)
+    if resolved:
+        logger.info(f"从任务日志继续下载：{resolved['model_name']}")
+        return resolved
     model_info = get_model_info(model_uuid)
-    if model_info:
-        model_id = model_info["id"]
-        # model_uuid = model_info["uuid"]
-        model_name = model_info["name"]
-        # TODO 后续需要增加明确的过滤：因为未登录导致下载失败的不应该存放
-        db.insert_model_info(model_uuid, model_name=model_name, model_info=json.dumps(model_info, ensure_ascii=False))
-        model_type = model_info["modelType"]
-        # 这里默认获取最新版本
-        model_version_name = model_info["versions"][0]["name"]
-        if model_info["versions"][0]["attachment"] is None:
+    if not model_info:
+        logger.warning("模型不存在")
+        return None
+    model_id = model_info["id"]
+    # model_uuid = model_info["uuid"]
+    model_name = model_info["name"]
+    # 下载完成后才写入已下载记录（见 download_resolved_model），这里只记录任务阶段
+    journal.record(model_uuid, RESOLVED)
+    model_type = model_info["modelType"]
+    # 这里默认获取最新版本
+    model_version_name = model_info["versions"][0]["name"]
+    if model_info["versions"][0]["attachment"] is None:
+        # 无法下载的模型结束任务，继续未完成的任务时不再反复解析
+        journal.unavailable(model_uuid, "模型没有可下载的文件")
+        return None
+    model_version_url = model_info["versions"][0]["attachment"]["modelSource"]
+    model_version_desc = model_info["versions"][0]["versionDesc"]
+    model_version_id = model_info["versions"][0]["id"]
+    model_version_uuid = model_info["versions"][0]["uuid"]
+
+    check_download = get_check_download(model_id, model_name, model_version_uuid, model_version_url, model_uuid)
+    if not check_download:
+        logger.warning("下载校验失败")
+        journal.unavailable(model_uuid, "下载校验失败")
+        return None
+    download_url = get_download_url(model_uuid, model_version_url)
+    # logger.info(
+    #     f'模型名称 ： {model_name}\r\n'
+    #     f'模型类型 ： {ModelType(model_type).desc()}\r\n'
+    #     f'模型下载地址 ：{download_url}\r\n'
+    #     f'模型介绍 ：{model_version_desc}\r\n'
+    # )
+    if not download_url:
+        logger.warning(f"获取模型({model_name})下载地址失败，请检查当前账号是否有下载权限")
+        journal.unavailable(model_uuid, "获取下载地址失败")
+        return None
+    url_suffix = get_url_suffix(download_url)
+    model_path = f"{model_file_parent_dir}{ModelType(model_type).file_path()}/{model_name}({model_version_name}){url_suffix}"
+    logger.info(
+        f'# {model_name}({model_version_name})  模型链接（https://www.liblib.art/modelinfo/{model_uuid}）')
+    logger.info(f'!wget -c "{download_url}" -O "{model_path}"')
+    resolved = {
+        'model_uuid': model_uuid,
+        'model_name': model_name,
+        'model_info': model_info,
+        'download_url': download_url,
+        'model_path': model_path,
+    }
+    journal.record(model_uuid, URL_OBTAINED, resolved)
+    return resolved
+
+
+# 从模型信息中获取文件哈希（如 attachment 中的 sha256 / md5 字段）
+def get_expected_hashes(model_info):
+    attachment = model_info["versions"][0].get("attachment") or {}
+    hashes = {}
+    for key, value in attachment.items():
+        if not isinstance(value, str) or not value:
+            continue
+        if 'sha256' in key.lower():
+            hashes['sha256'] = value
+        elif 'md5' in key.lower():
+            hashes['md5'] = value
+    return hashes
+
+
+# 下载地址签名过期时重新获取下载地址，并更新任务日志（之后断点续传使用新地址）
+def download_url_refresher(resolved):
+    def refresh():
+        model_version_url = resolved['model_info']["versions"][0]["attachment"]["modelSource"]
+        download_url = get_download_url(resolved['model_uuid'], model_version_url)
+        # 获取失败时返回的是错误信息
+        if not download_url or not str(download_url).startswith('http'):
+            logger.warning(f"重新获取模型({resolved['model_name']})下载地址失败: {download_url}")
             return None
-        model_version_url = model_info["versions"][0]["attachment"]["modelSource"]
-        model_version_desc = model_info["versions"][0]["versionDesc"]
-        model_version_id = model_info["versions"][0]["id"]
-        model_version_uuid = model_info["versions"][0]["uuid"]
-        if model_info["versions"][0]["versionIntro"]:
-            model_version_versionIntro = json.loads(model_info["versions"][0]["versionIntro"])
-            if "ckpt" in model_version_versionIntro:
-                base_model = model_version_versionIntro['ckpt']
-                compatible_models = get_compatible_model(base_model)
-                if compatible_models:
-                    # logger.info("配套模型：")
-                    for compatible_model in compatible_models:
-                        # logger.info(
-                        #     f'模型id ： {compatible_model["id"]}\r\n'
-                        #     f'模型UUID ： {compatible_model["modelUuid"]}\r\n'
-                        #     f'模型名称 ： {compatible_model["modelName"]}\r\n'
-                        #     f'模型类型 ： {BaseModelType(compatible_model["baseType"]).desc()}\r\n'
-                        #     f'模型版本名称 ：{compatible_model["modelVersionName"]}\r\n'
-                        # )
-                        get_direct_link(compatible_model['modelUuid'])
-
-        check_download = get_check_download(model_id, model_name, model_version_uuid, model_version_url, model_uuid)
-        if check_download:
-            download_url = get_download_url(model_uuid, model_version_url)
-            # logger.info(
-            #     f'模型名称 ： {model_name}\r\n'
-            #     f'模型类型 ： {ModelType(model_type).desc()}\r\n'
-            #     f'模型下载地址 ：{download_url}\r\n'
-            #     f'模型介绍 ：{model_version_desc}\r\n'
-            #     f'推荐参数 ：{model_version_versionIntro}\r\n'
-            # )
-            if download_url:
-                url_suffix = get_url_suffix(download_url)
-                model_path = f"{model_file_parent_dir}{ModelType(model_type).file_path()}/{model_name}({model_version_name}){url_suffix}"
-                logger.info(
-                    f'# {model_name}({model_version_name})  模型链接（https://www.liblib.art/modelinfo/{model_uuid}）')
-                logger.info(f'!wget -c "{download_url}" -O "{model_path}"')
-                if autoDownload:
-                    # wget_download_model(download_url, model_path)
-                    download_model_file(download_url, model_path)
-                    save_model_info(model_info)
-                    download_model_cover(model_info)  # 新增调用
-                # logger.info("================================================================")
+        resolved['download_url'] = download_url
+        journal.record(resolved['model_uuid'], DOWNLOADING, resolved)
+        return download_url
+
+    return refresh
+
+
+# 下载前需要预留的磁盘空间：(临时文件路径, 文件大小)，文件已存在或可直接链接时不需要预留
+def get_download_space(resolved):
+    model_path = resolved['model_path']
+    if not autoDownload or os.path.exists(model_path):
+        return None
+    if blob_store is not None and blob_store.has(get_expected_hashes(resolved['model_info']).get('sha256')):
+        return None
+    file_size = resolved.get('file_size')
+    if file_size is None:
+        from util.DownloadUtil import DownloadUtil
+        downloader = DownloadUtil(client=get_http_client())
+        file_size = downloader.get_remote_file_size(
+            SignedUrl(resolved['download_url'], download_url_refresher(resolved)))
+        resolved['file_size'] = file_size
+    if not file_size:
+        return None
+    return model_path + '.tmp', file_size
+
+
+# 写入已下载记录并结束任务
+def finish_model(resolved, hashes=None):
+    model_uuid = resolved['model_uuid']
+    # 已下载记录、文件哈希与任务完成阶段一起放入写入缓冲区，按批在同一个事务中提交，保证三者同时落盘；
+    # 提交前进程中断时任务仍为已校验，再次运行时文件已存在，直接补写记录
+    db.insert_model_info(model_uuid, model_name=resolved['model_name'],
+                         model_info=json.dumps(resolved['model_info'], ensure_ascii=False),
+                         sha256=(hashes or {}).get('sha256'), md5=(hashes or {}).get('md5'), job_stage=DONE)
+
+
+# 下载已解析的模型文件（模型信息及封面由 submit_side_assets 在解析完成后并行下载）
+def download_resolved_model(resolved, connection_limiter=None):
+    model_uuid = resolved['model_uuid']
+    if not autoDownload:
+        # 只输出下载链接时同样记为已处理，避免重复输出
+        finish_model(resolved)
+        return
+    journal.record(model_uuid, DOWNLOADING)
+    try:
+        # wget_download_model(resolved['download_url'], resolved['model_path'])
+        hashes = download_model_file(resolved['download_url'], resolved['model_path'],
+                                     connection_limiter=connection_limiter,
+                                     expected_hashes=get_expected_hashes(resolved['model_info']),
+                                     checkpoint=journal.segment_checkpoint(model_uuid),
+                                     refresh_url=download_url_refresher(resolved),
+                                     model_type=resolved['model_info'].get('modelType'))
+    except Exception as e:
+        journal.fail(model_uuid, e)
+        raise
+    journal.record(model_uuid, VERIFIED)
+    finish_model(resolved, hashes)
+
+
+# 获取附属文件下载队列（首次使用时创建）
+def get_asset_pipeline():
+    global asset_pipeline
+    if asset_pipeline is None:
+        asset_pipeline = AssetPipeline(workers=asset_workers)
+    return asset_pipeline
+
+
+# 模型解析完成后立即提交模型信息、封面（及示例图片）的下载，与模型文件传输并行
+def submit_side_assets(resolved):
+    if not resolved or not autoDownload:
+        return
+    model_info = resolved['model_info']
+    pipeline = get_asset_pipeline()
+    pipeline.submit(f"{resolved['model_name']} 模型信息", save_model_info, model_info)
+    pipeline.submit(f"{resolved['model_name']} 封面", download_model_cover, model_info)
+    if asset_download_images:
+        pipeline.submit(f"{resolved['model_name']} 示例图片", download_model_images, model_info)
+
+
+# 解析模型并提交附属文件下载
+def resolve_model_with_assets(model_uuid):
+    resolved = resolve_model(model_uuid)
+    submit_side_assets(resolved)
+    return resolved
+
+
+# 解析配套模型依赖，resolver.plan 为依赖在前、去重后的下载计划，
+# 已下载或无法解析的模型分别记录在 resolver.skipped、resolver.failed 中
+def plan_models(model_uuids):
+    resolver = DependencyResolver(get_model_info, get_compatible_model, filter_done=db.which_downloaded,
+                                  workers=download_resolve_workers)
+    resolver.resolve(model_uuids)
+    return resolver
+
+
+# 获取模型直连地址
+def get_direct_link(model_uuid):
+    resolver = plan_models([model_uuid])
+    for planned_uuid in resolver.plan:
+        if planned_uuid in resolver.failed:
+            continue
+        if planned_uuid in resolver.skipped:
+            logger.warning("模型已下载")
+            continue
+        resolved = resolve_model_with_assets(planned_uuid)
+        if resolved:
+            download_resolved_model(resolved)
+    get_asset_pipeline().wait()
+
+
+# 批量下载模型：解析与下载并行，同时下载多个模型
+def download_models(model_uuids, on_finish=None, plan=True):
+    '''
+    :param model_uuids: 模型UUID列表
+    :param on_finish: 可选，每个任务结束时调用，参数为 DownloadJob
+    :param plan: 是否先解析配套模型依赖（继续未完成的任务时不需要）
+    :return: DownloadJob 列表
+    '''
+    resolver = None
+    if plan:
+        resolver = plan_models(model_uuids)
+        model_uuids = resolver.plan
+    scheduler = DownloadScheduler(
+        resolve_fn=resolve_model_with_assets,
+        download_fn=lambda resolved: download_resolved_model(resolved, scheduler.connection_limiter),
+        max_jobs=download_parallel_jobs,
+        resolve_workers=download_resolve_workers,
+        max_connections=download_max_connections,
+        on_finish=on_finish,
+        space_fn=get_download_space,
+        disk_space=DiskSpace(min_free_bytes=download_min_free_mb * 1024 * 1024),
+        abort_fn=abort_downloads,
+    )
+    try:
+        for model_uuid in model_uuids:
+            # 依赖解析时已下载或无法获取详情的模型直接记录结果，同样写入结果清单
+            if resolver is not None and model_uuid in resolver.failed:
+                scheduler.report(model_uuid, FAILED, resolver.failed[model_uuid])
+            elif resolver is not None and model_uuid in resolver.skipped:
+                scheduler.report(model_uuid, SKIPPED)
             else:
-                logger.warning(f"获取模型({model_name})下载地址失败，请检查当前账号是否有下载权限")
-        else:
-            logger.warning("下载校验失败")
-    else:
-        logger.warning("模型不存在")
-    time.sleep(1)
+                scheduler.submit(model_uuid)
+        return scheduler.wait()
+    except SystemExit:
+        # 收到退出信号（或子线程调用 exit()）：取消排队的任务，中止正在进行的下载，
+        # 等待下载线程写完分片进度后再由 shutdown() 关闭数据库
+        scheduler.abort()
+        if not scheduler.drain(SHUTDOWN_TIMEOUT):
+            logger.warning(f"等待下载线程结束超时（{SHUTDOWN_TIMEOUT} 秒）")
+        raise
+    finally:
+        get_asset_pipeline().wait()
+        db.flush()
+        scheduler.log_summary()
+        metadata_cache.log_stats()
+        if http_client is not None:
+            http_client.log_stats()
+
+
+# 中止所有进行中的文件下载（已写入的分片进度保留，可断点续传）
+def abort_downloads():
+    from util.DownloadUtil import DownloadUtil
+    DownloadUtil.abort_all()
+
+
+# 读取批量输入文件：每行一个模型链接/UUID或搜索关键字，忽略空行和 # 开头的注释
+def read_batch_lines(file_paths):
+    lines = []
+    for file_path in file_paths or []:
+        with open(file_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if line and not line.startswith('#'):
+                    lines.append(line)
+    return lines
+
+
+# 任务结果转为清单记录
+def job_manifest_record(job):
+    payload = job.payload or {}
+    model_path = payload.get('model_path')
+    file_bytes = os.path.getsize(model_path) if model_path and os.path.exists(model_path) else 0
+    duration = job.duration()
+    return {
+        'uuid': job.key,
+        'name': payload.get('model_name'),
+        'path': model_path,
+        'bytes': file_bytes,
+        'duration': round(duration, 3) if duration is not None else None,
+        'status': job.status,
+        'error': str(job.error) if job.error is not None else None,
+    }
+
+
+# 无人值守批量下载
+def batch_download(urls=None, keywords=None, types=[], models=[], vipType=[], manifest_path=None, incremental=None):
+    '''
+    :param urls: 模型链接或UUID列表
+    :param keywords: 搜索关键字列表，搜索结果按 types、models、vipType 过滤（取值同 search_model）
+    :param manifest_path: 结果清单路径（JSON Lines），每个任务结束时追加一行
+    :param incremental: 搜索是否增量同步，None 时使用配置
+    :return: DownloadJob 列表
+    '''
+    model_uuids = []
+    for url in urls or []:
+        model_uuid = get_model_id_by_url(url)
+        if model_uuid is None:
+            logger.warning(f"无法获取模型编号，已跳过：{url}")
+            continue
+        model_uuids.append(model_uuid)
+    for keyword in keywords or []:
+        model_uuids.extend(search_model(keyword, types=types, models=models, vipType=vipType, incremental=incremental))
+    model_uuids = list(dict.fromkeys(model_uuids))
+    logger.info(f"批量下载：共 {len(model_uuids)} 个模型")
+    if not model_uuids:
+        return []
+
+    manifest = ManifestWriter(manifest_path) if manifest_path else None
+    try:
+        return download_models(model_uuids,
+                               on_finish=(lambda job: manifest.write(job_manifest_record(job))) if manifest else None)
+    finally:
+        if manifest:
+            manifest.close()
+            logger.info(f"结果清单已写入 {manifest_path}")
 
 
 # 使用wget下载文件
 def wget_download_model(download_url, model_path):
+    import subprocess
     logger.info(f"正在下载文件：{download_url} 至 {model_path}")
 
     os.makedirs(os.path.dirname(model_path), exist_ok=True)
@@ -362,8 +788,29 @@ def wget_download_model(download_url, model_path):
         logger.warning(f"❌ 下载失败: {e}")
 
 
+# 模型文件的下载参数：全局配置叠加该模型类型的覆盖配置
+def download_options(model_type=None):
+    options = {
+        'three_number': download_three_number,
+        'in_place': download_in_place,
+        'segment_size_mb': download_segment_size_mb,
+        'buffer_size_kb': download_buffer_size_kb,
+        'max_retries': download_max_retries,
+        'timeout': download_timeout,
+        'retry_wait': download_retry_wait,
+        'retry_interval': download_retry_interval,
+    }
+    if model_type is not None:
+        try:
+            options.update(download_type_overrides.get(ModelType(model_type), {}))
+        except ValueError:
+            pass
+    return options
+
+
 # 下载文件
-def download_model_file(download_url, model_path):
+def download_model_file(download_url, model_path, connection_limiter=None, expected_hashes=None, checkpoint=None,
+                        refresh_url=None, model_type=None):
     logger.info(f"正在下载文件：{download_url} 至 {model_path}")
 
     os.makedirs(os.path.dirname(model_path), exist_ok=True)
@@ -373,9 +820,30 @@ def download_model_file(download_url, model_path):
         logger.warning(f"⚠️ 文件已存在，跳过下载: {model_path}")
         return
     
-    downloader = DownloadUtil(max_retries=3, retry_wait=5)
-    # downloader.download_file(download_url, model_path)
-    downloader.download_file_multi_threaded(download_url, model_path, num_threads=download_three_number)
+    from util.DownloadUtil import DownloadUtil
+    options = download_options(model_type)
+    downloader = DownloadUtil(max_retries=max(1, options['max_retries']), retry_wait=options['retry_wait'],
+                              client=get_http_client(), connection_limiter=connection_limiter,
+                              segment_size=options['segment_size_mb'] * 1024 * 1024,
+                              chunk_size=options['buffer_size_kb'] * 1024,
+                              timeout=options['timeout'], retry_interval=options['retry_interval'])
+    num_threads = max(1, options['three_number'])
+    # 单线程且没有未完成的分片下载时单连接顺序下载，省去分片的额外请求
+    single_stream = num_threads == 1 and (checkpoint is None or not checkpoint.exists())
+    # 指纹探测与下载共用同一个可刷新的地址，签名过期时只刷新一次
+    signed = SignedUrl(download_url, refresh_url)
+
+    def download():
+        if single_stream:
+            return downloader.download_file(signed, model_path, expected_hashes=expected_hashes)
+        return downloader.download_file_multi_threaded(signed, model_path, num_threads=num_threads,
+                                                       in_place=options['in_place'], expected_hashes=expected_hashes,
+                                                       checkpoint=checkpoint)
+
+    if blob_store is None:
+        return download()
+    return blob_store.fetch(signed, model_path, download,
+                            expected_sha256=(expected_hashes or {}).get('sha256'))
 
 
 # 保存模型原始数据
@@ -390,6 +858,8 @@ def save_model_info(model_info):
         if os.path.exists(info_file_json):
             logger.warning(f"⚠️ 文件已存在，跳过下载: {info_file_json}")
             return
+        # 与模型文件并行保存，目录可能还未创建
+        os.makedirs(os.path.dirname(info_file_json), exist_ok=True)
         # 将文本写入文件
         with open(info_file_json, 'w', encoding='utf-8') as f:
             json.dump(model_info, f, ensure_ascii=False, indent=4)
@@ -412,36 +882,133 @@ def download_model_cover(model_info):
             return
         # 创建目录（如果不存在）
         os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        from requests.exceptions import RequestException
         # 下载图片
         try:
-            response = requests.get(cover_url, stream=True)
+            download_asset(cover_url, file_path)
+            logger.info(f"✅ 封面图片已成功下载至: {file_path}")
+        except RequestException as e:
+            logger.warning(f"❌ 下载封面图片失败: {e}")
+
+
+# 下载单个附属文件：复用共享连接池，先写临时文件，完成后再重命名
+def download_asset(url, file_path):
+    temp_file = file_path + ".tmp"
+    try:
+        with get_http_client().get(url, stream=True) as response:
             response.raise_for_status()  # 检查请求状态
-            with open(file_path, 'wb') as f:
-                for chunk in response.iter_content(chunk_size=1024):
+            with open(temp_file, 'wb') as f:
+                for chunk in response.iter_content(chunk_size=ASSET_CHUNK_SIZE):
                     if chunk:
                         f.write(chunk)
-            logger.info(f"✅ 封面图片已成功下载至: {file_path}")
-        except requests.exceptions.RequestException as e:
-            logger.warning(f"❌ 下载封面图片失败: {e}")
+    except Exception:
+        # 下载失败时删除不完整的临时文件，避免残留在模型目录中
+        if os.path.exists(temp_file):
+            os.remove(temp_file)
+        raise
+    os.replace(temp_file, file_path)
+
+
+# 从 imageGroup 中取出所有示例图片地址（封面除外）
+def get_image_urls(model_info):
+    image_group = model_info["versions"][0].get("imageGroup") or {}
+    urls = []
+    for key in ('images', 'imageList', 'imgs'):
+        for item in image_group.get(key) or []:
+            url = item if isinstance(item, str) else (item or {}).get('imageUrl') or (item or {}).get('url')
+            if url and url != image_group.get('coverUrl') and url not in urls:
+                urls.append(url)
+    return urls
+
+
+# 下载 imageGroup 中的全部示例图片，保存在与模型同名的 _images 目录下
+def download_model_images(model_info):
+    if not model_info:
+        return
+    model_name = model_info["name"]
+    model_type = model_info["modelType"]
+    model_version_name = model_info["versions"][0]["name"]
+    image_dir = f"{model_file_parent_dir}{ModelType(model_type).file_path()}/{model_name}({model_version_name})_images"
+    urls = get_image_urls(model_info)
+    if not urls:
+        return
+    from requests.exceptions import RequestException
+    os.makedirs(image_dir, exist_ok=True)
+    saved = 0
+    for i, url in enumerate(urls, start=1):
+        file_path = os.path.join(image_dir, f"{i}{get_url_suffix(url)}")
+        if os.path.exists(file_path):
+            continue
+        try:
+            download_asset(url, file_path)
+            saved += 1
+        except RequestException as e:
+            logger.warning(f"❌ 下载示例图片失败: {url} {e}")
+    logger.info(f"✅ 已下载 {saved} 张示例图片至: {image_dir}")
 
 
 # 初始化参数
 def init():
-    global TOKEN, CID, autoDownload, model_file_parent_dir
+    global TOKEN, CID, autoDownload, model_file_parent_dir, search_concurrency
+    global download_parallel_jobs, download_resolve_workers, download_max_connections, download_in_place
+    global download_segment_size_mb, recommend_batch_size, search_incremental, search_sort, search_known_run
+    global blob_store, asset_workers, asset_download_images, download_min_free_mb, download_buffer_size_kb
+    global download_three_number, download_max_retries, download_timeout, download_retry_wait
+    global download_retry_interval, download_type_overrides, save_search_list
+    from util.logger_utils import setup_global_logger
     setup_global_logger(log_level=logging.INFO)  # 初始化日志系统
     # setup_logging()  # 初始化日志系统
     logger.info("开始初始化程序...")
     # 获取 TOKEN
-    config = file_util.read_yml()
-
-    user_conf = config.get('user')
-    TOKEN = user_conf['token']
-    CID = user_conf['cid']
-
-    down_conf = config.get('download')
-    model_file_parent_dir = down_conf['model_parent_path']
-    autoDownload = down_conf['auto_download']
-    download_three_number = down_conf['three_number']
+    config = Config.shared()
+
+    TOKEN = config.user.token
+    CID = config.user.cid
+
+    down_conf = config.download
+    model_file_parent_dir = down_conf.model_parent_path
+    autoDownload = down_conf.auto_download
+    download_three_number = down_conf.three_number
+    download_parallel_jobs = down_conf.parallel_jobs
+    download_resolve_workers = down_conf.resolve_workers
+    download_max_connections = down_conf.max_connections
+    download_in_place = down_conf.in_place
+    download_segment_size_mb = down_conf.segment_size_mb
+    download_min_free_mb = down_conf.min_free_mb
+    download_buffer_size_kb = down_conf.buffer_size_kb
+    download_max_retries = down_conf.max_retries
+    download_timeout = down_conf.timeout
+    download_retry_wait = down_conf.retry_wait
+    download_retry_interval = down_conf.retry_interval
+    save_search_list = down_conf.save_search_list
+    download_type_overrides = {}
+    for model_type, options in down_conf.model_type_overrides().items():
+        download_type_overrides[parse_enum_values(ModelType, [model_type])[0]] = options
+
+    if down_conf.blob_store:
+        from util.BlobStore import BlobStore
+        blob_store = BlobStore(down_conf.blob_dir or os.path.join(model_file_parent_dir, '.blobs'), db,
+                               client=get_http_client())
+
+    asset_workers = config.assets.workers
+    asset_download_images = config.assets.download_images
+
+    cache_conf = config.cache
+    metadata_cache.ttl = cache_conf.ttl
+    metadata_cache.max_entries = cache_conf.max_entries
+    metadata_cache.max_disk_entries = cache_conf.max_disk_entries
+    metadata_cache.bypass = not cache_conf.enabled
+
+    recommend_batch_size = config.api.recommend_batch_size
+
+    search_conf = config.search
+    search_concurrency = search_conf.concurrency
+    search_incremental = search_conf.incremental
+    search_sort = search_conf.sort
+    search_known_run = search_conf.known_run
+
+    apply_rate_limits(config)
+    start_metrics(config)
 
     if TOKEN:
         logger.info(f"成功读取 TOKEN : {TOKEN}")
@@ -456,6 +1023,36 @@ def init():
         exit()
 
 
+# 按配置设置全局限速，运行中可重复调用（如收到 SIGHUP 时重新读取 conf.yml）
+def apply_rate_limits(config=None):
+    if config is None:
+        config = Config.reload()
+    api_rps = config.rate_limit.api_requests_per_second
+    bandwidth_mb = config.rate_limit.download_mb_per_second
+    rate_limiter.configure(api_requests_per_second=api_rps,
+                           download_bytes_per_second=bandwidth_mb * 1024 * 1024)
+    logger.info(f"限速设置：接口 {api_rps or '不限'} 次/秒，下载 {bandwidth_mb or '不限'} MB/s")
+
+
+# 按配置启动指标接口和定期快照
+def start_metrics(config):
+    metrics_conf = config.metrics
+    if metrics_conf.http_port:
+        metrics.start_http_server(metrics_conf.http_port, host=metrics_conf.http_host)
+    snapshot_path = metrics_conf.snapshot_path
+    if snapshot_path:
+        metrics.start_snapshot_writer(snapshot_path, interval=metrics_conf.snapshot_interval)
+        # 退出前再写一次，保证最后的统计不丢失
+        atexit.register(metrics.write_snapshot, snapshot_path)
+
+
+def reload_rate_limits(sig, frame):
+    try:
+        apply_rate_limits()
+    except Exception as e:
+        logger.warning(f"重新读取限速配置失败: {e}")
+
+
 # 菜单
 def menu():
     print("===============================")
@@ -480,7 +1077,7 @@ def download_model_menu():
     print(
         "样例：https://www.liblib.art/modelinfo/c4dbdde32eef41618b514b126aedb853?from=search&versionUuid=9248fef8f5074c3eb5f43d5f28838bef")
     while True:
-        url = input("粘贴在这里（输入 q 退出程序，输入 0 返回菜单）：")
+        url = input("粘贴在这里，多个链接用空格分隔（输入 q 退出程序，输入 0 返回菜单）：")
         if url == "0":
             menu()
             break
@@ -490,11 +1087,12 @@ def download_model_menu():
         if url == "":
             print("请输入模型链接：")
             continue
-        model_uuid = get_model_id_by_url(url)
-        if model_uuid is None:
+        # 支持一次粘贴多个链接（空格分隔），多个模型同时下载
+        model_uuids = [get_model_id_by_url(u) for u in url.split()]
+        if None in model_uuids:
             print("无法获取模型编号")
             continue
-        get_direct_link(model_uuid)
+        download_models(model_uuids)
 
 
 def search_model_download_menu():
@@ -513,8 +1111,7 @@ def search_model_download_menu():
             print("请输入搜索关键字：")
             continue
         uuids = search_model(order)
-        for uuid in uuids:
-            get_direct_link(uuid)
+        download_models(uuids)
 
 def keyboard_listener():
     global keyboard_interrupted
@@ -522,18 +1119,186 @@ def keyboard_listener():
     keyboard_interrupted = True
 
 
+# 解析枚举参数：支持名称（如 LORA、SD_F_1）或数值
+def parse_enum_values(enum_cls, values):
+    result = []
+    for value in values or []:
+        if str(value).isdigit():
+            result.append(enum_cls.from_value(value))
+        else:
+            try:
+                result.append(enum_cls[str(value).upper()])
+            except KeyError:
+                raise ValueError(f"无效的 {enum_cls.__name__}：{value}，可选 {', '.join(e.name for e in enum_cls)}")
+    return result
+
+
+# 查询本地模型目录（只读取本地数据库，不访问接口）
+def run_query(args):
+    try:
+        model_types = parse_enum_values(ModelType, args.model_type)
+        base_types = parse_enum_values(BaseModelType, args.base_type)
+    except ValueError as e:
+        print(e)
+        return 2
+    catalog = CatalogIndex(db)
+    catalog.sync(rebuild=args.reindex)
+    results = catalog.search(' '.join(args.keywords), model_types=model_types, base_types=base_types,
+                             limit=args.limit)
+    for item in results:
+        if args.json:
+            print(json.dumps(item, ensure_ascii=False))
+            continue
+        try:
+            model_type = ModelType(item['model_type']).desc()
+        except ValueError:
+            model_type = str(item['model_type'])
+        base_descs = []
+        for b in item['base_types']:
+            try:
+                base_descs.append(BaseModelType(b).desc())
+            except ValueError:
+                base_descs.append(str(b))
+        print(f"{item['model_uuid']}  {model_type}  {'/'.join(base_descs) or '-'}  {item['name']}")
+        if item['snippet']:
+            print(f"    {item['snippet']}")
+    if not args.json:
+        print(f"共 {len(results)} 条结果")
+    return 0
+
+
+# 检查本地模型文件与已下载记录是否一致（只读取本地文件和数据库，不访问接口）
+def run_scan(args):
+    from util.LibraryScanner import LibraryScanner, OK, MISSING, CORRUPT, ORPHANED, PARTIAL
+    root = Config.shared().download.model_parent_path
+    scanner = LibraryScanner(db, journal, root, {t.value: t.file_path() for t in ModelType}, workers=args.workers,
+                             expected_hashes=get_expected_hashes, blob_store=blob_store)
+    began = time.perf_counter()
+    results = scanner.scan(progress=not args.json)
+    for item in results:
+        if args.json:
+            print(json.dumps(item, ensure_ascii=False))
+        elif item['status'] != OK:
+            print(f"{item['status']:<8}  {item['model_uuid'] or '-'}  {item['path'] or item['name']}  {item['detail']}")
+    counts = {status: sum(1 for item in results if item['status'] == status)
+              for status in (OK, MISSING, CORRUPT, ORPHANED, PARTIAL)}
+    if not args.json:
+        print(f"正常 {counts[OK]}，缺失 {counts[MISSING]}，损坏 {counts[CORRUPT]}，无记录 {counts[ORPHANED]}，"
+              f"临时文件 {counts[PARTIAL]}；重新计算哈希 {scanner.hashed_files} 个文件"
+              f"（{scanner.hashed_bytes / 1024 / 1024:.1f} MB），耗时 {time.perf_counter() - began:.1f} 秒")
+    if args.fix:
+        fixed = scanner.fix(results)
+        if not args.json:
+            print(f"已修正 {fixed} 项")
+        return 0
+    return 1 if counts[MISSING] or counts[CORRUPT] else 0
+
+
+# 命令行参数，不带子命令时进入交互菜单
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='LiblibAi 模型下载')
+    subparsers = parser.add_subparsers(dest='command')
+
+    batch_parser = subparsers.add_parser('batch', help='无人值守批量下载')
+    batch_parser.add_argument('-u', '--url', nargs='+', default=[], help='模型链接或UUID')
+    batch_parser.add_argument('-U', '--url-file', nargs='+', default=[], help='模型链接/UUID 文件，每行一个')
+    batch_parser.add_argument('-k', '--keyword', nargs='+', default=[], help='搜索关键字')
+    batch_parser.add_argument('-K', '--keyword-file', nargs='+', default=[], help='搜索关键字文件，每行一个')
+    batch_parser.add_argument('--types', nargs='+', type=int, default=[], help='搜索的基模类型，如 1 3 19')
+    batch_parser.add_argument('--models', nargs='+', type=int, default=[], help='搜索的模型类型，如 1 5')
+    batch_parser.add_argument('--vip-type', nargs='+', type=int, default=[], help='会员专属：0 免费 1 会员专属 2 仅会员可下载')
+    batch_parser.add_argument('--incremental', action='store_true', default=None,
+                              help='增量搜索：遇到已见过的模型后停止翻页，默认使用 conf.yml 中的 search.incremental')
+    batch_parser.add_argument('-j', '--jobs', type=int, help='同时下载的模型数，默认使用 conf.yml 中的 parallel_jobs')
+    batch_parser.add_argument('-o', '--manifest', default='manifest.jsonl', help='结果清单文件（JSON Lines），默认 manifest.jsonl')
+
+    query_parser = subparsers.add_parser('query', help='离线查询已下载的模型（全文检索）')
+    query_parser.add_argument('keywords', nargs='*', help='关键字，多个关键字需同时匹配')
+    query_parser.add_argument('-t', '--model-type', nargs='+', default=[], help='模型类型，如 LORA 或 5')
+    query_parser.add_argument('-b', '--base-type', nargs='+', default=[], help='基模类型，如 SD_F_1 或 19')
+    query_parser.add_argument('-n', '--limit', type=int, default=50, help='最多返回条数，默认50')
+    query_parser.add_argument('--json', action='store_true', help='按 JSON Lines 输出')
+    query_parser.add_argument('--reindex', action='store_true', help='清空并重建索引')
+
+    resume_parser = subparsers.add_parser('resume', help='继续上次中断的下载任务')
+    resume_parser.add_argument('-j', '--jobs', type=int, help='同时下载的模型数，默认使用 conf.yml 中的 parallel_jobs')
+    resume_parser.add_argument('-o', '--manifest', default='manifest.jsonl', help='结果清单文件（JSON Lines），默认 manifest.jsonl')
+
+    scan_parser = subparsers.add_parser('scan', help='检查本地模型文件与已下载记录（缺失、损坏、无记录、临时文件）')
+    scan_parser.add_argument('-j', '--workers', type=int, help='计算哈希的进程数，默认 CPU 核数')
+    scan_parser.add_argument('--fix', action='store_true',
+                             help='删除缺失/损坏模型的下载记录以便重新下载，损坏文件改名为 .corrupt，删除残留的临时文件')
+    scan_parser.add_argument('--json', action='store_true', help='按 JSON Lines 输出全部结果')
+    return parser.parse_args(argv)
+
+
+# 执行批量下载子命令，有失败任务时返回非 0 退出码
+def run_batch(args):
+    global download_parallel_jobs
+    if args.jobs:
+        download_parallel_jobs = args.jobs
+    urls = args.url + read_batch_lines(args.url_file)
+    keywords = args.keyword + read_batch_lines(args.keyword_file)
+    if not urls and not keywords:
+        logger.warning("未指定模型链接或搜索关键字")
+        return 2
+    jobs = batch_download(urls=urls, keywords=keywords, types=args.types, models=args.models,
+                          vipType=args.vip_type, manifest_path=args.manifest, incremental=args.incremental)
+    return 1 if any(job.status == FAILED for job in jobs) else 0
+
+
+# 继续任务日志中未完成的下载，有失败任务时返回非 0 退出码
+def run_resume(args):
+    global download_parallel_jobs
+    if args.jobs:
+        download_parallel_jobs = args.jobs
+    model_uuids = journal.unfinished()
+    logger.info(f"继续未完成的下载：共 {len(model_uuids)} 个模型")
+    if not model_uuids:
+        return 0
+    manifest = ManifestWriter(args.manifest) if args.manifest else None
+    try:
+        jobs = download_models(model_uuids, plan=False,
+                               on_finish=(lambda job: manifest.write(job_manifest_record(job))) if manifest else None)
+    finally:
+        if manifest:
+            manifest.close()
+    return 1 if any(job.status == FAILED for job in jobs) else 0
+
+
 def signal_handler(sig, frame):
+    global exit_signal
+    if exit_signal is not None:
+        return
+    exit_signal = sig
     logger.info("\n\n检测到 Ctrl+C 或系统终止信号，正在安全退出...")
+    # 在主线程中抛出 SystemExit：download_models 中止调度并等待下载线程结束，最后由 shutdown() 保存进度。
+    # 被信号中断时按惯例以 128 + 信号值退出，便于调用方（如定时任务）区分
+    raise SystemExit(128 + sig)
+
+
+# 退出前在主线程中保存正在进行的下载的分片进度（下次运行时从断点继续），并关闭数据库
+def shutdown():
+    journal.flush()
+    db.close()
     for handler in logging.root.handlers:
         handler.flush()
-    db.close()
-    print("\n👋 程序已终止。感谢使用！")
-    exit(0)
+    if exit_signal is not None:
+        print("\n👋 程序已终止。感谢使用！")
 
 
 if __name__ == '__main__':
     signal.signal(signal.SIGINT, signal_handler)
     signal.signal(signal.SIGTERM, signal_handler)
+    # kill -HUP <pid> 在运行中重新读取 conf.yml 中的限速配置
+    if hasattr(signal, 'SIGHUP'):
+        signal.signal(signal.SIGHUP, reload_rate_limits)
+    args = parse_args()
+    if args.command == 'query':
+        # 离线查询不需要登录信息
+        sys.exit(run_query(args))
+    if args.command == 'scan':
+        sys.exit(run_scan(args))
     try:
         init()
 
@@ -541,8 +1306,14 @@ if __name__ == '__main__':
         # listener_thread = threading.Thread(target=keyboard_listener, daemon=True)
         # listener_thread.start()
 
+        if args.command == 'batch':
+            sys.exit(run_batch(args))
+        if args.command == 'resume':
+            sys.exit(run_resume(args))
         menu()
     except Exception as e:
         logger.error(f"发生未知异常: {e}", exc_info=True)
         print("❌ 程序因异常终止，请查看日志获取更多信息。")
         exit(1)
+    finally:
+        shutdown()
@@ -10,6 +10,7 @@ def test_db():
     db = SQLiteDB()
     db.init_db()
     db.insert_model_info(time.time(), model_info='{"da":1}')
+    db.close()
 
 
 def test_download():
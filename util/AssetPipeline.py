@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+"""
+附属文件下载队列
+
+封面图、模型信息 JSON、示例图片等小文件由独立的小线程池处理：
+模型解析完成后立即提交，与模型文件的传输同时进行，不必等大文件下载完成。
+"""
+
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+
+
+class AssetPipeline:
+    """
+    附属文件的后台线程池，失败只记录日志，不影响模型文件下载
+    """
+
+    def __init__(self, workers=4):
+        """
+        :param workers: 线程数，默认4
+        """
+        self.logger = logging.getLogger()
+        self._executor = ThreadPoolExecutor(max_workers=max(1, int(workers)), thread_name_prefix='asset')
+        self._lock = threading.Lock()
+        self._futures = {}
+
+    def submit(self, name, fn, *args, **kwargs):
+        """
+        提交一个附属文件任务
+
+        :param name: 任务名称（用于日志）
+        :param fn: 执行函数
+        :return: Future
+        """
+        future = self._executor.submit(fn, *args, **kwargs)
+        with self._lock:
+            self._futures[future] = name
+        future.add_done_callback(self._done)
+        return future
+
+    def _done(self, future):
+        with self._lock:
+            name = self._futures.pop(future, None)
+        if future.cancelled():
+            return
+        error = future.exception()
+        if error is not None:
+            self.logger.warning(f"附属文件下载失败（{name}）: {error}")
+
+    def pending(self):
+        """
+        尚未完成的任务数
+        """
+        with self._lock:
+            return len(self._futures)
+
+    def wait(self):
+        """
+        等待所有任务（包括等待期间新提交的任务）完成
+        """
+        while True:
+            with self._lock:
+                futures = [f for f in self._futures if not f.done()]
+            if not futures:
+                return
+            wait(futures)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
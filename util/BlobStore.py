@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+"""
+按内容寻址的模型文件存储
+
+同一份权重可能以不同的模型名、版本名发布，或作为配套模型被再次拉取。
+文件实体按 SHA-256 只保存一份（<根目录>/sha256/ab/<sha256>），
+模型目录下可读的文件名改为指向它的硬链接（不支持时使用符号链接），重复的模型既不重复下载也不重复占用磁盘。
+
+下载前先确定文件哈希：
+- 模型信息中带有 sha256 时直接使用
+- 否则请求文件开头和结尾各一小段，与文件大小一起计算探测指纹，
+  下载完成后记录“指纹 -> 完整 SHA-256”，以后遇到同样的文件即可识别
+
+链接已有的实体前先校验内容（大小与 SHA-256，按大小和修改时间缓存在 file_hashes 中），
+实体被改动过（如通过某个硬链接写入）时删除该实体和指向它的指纹，重新下载。
+"""
+
+import hashlib
+import logging
+import os
+import time
+
+from util.HttpClient import HttpClient
+from util.SignedUrl import SignedUrl
+from util.StreamHasher import StreamHasher
+
+# 探测时读取文件开头、结尾的字节数
+PROBE_SIZE = 64 * 1024
+
+
+class BlobStore:
+    """
+    内容寻址存储：SHA-256 -> 文件实体，模型路径为指向实体的链接
+    """
+
+    def __init__(self, root, db, client=None, probe_size=PROBE_SIZE):
+        """
+        :param root: 存储根目录，应与模型目录在同一文件系统上（硬链接不能跨文件系统）
+        :param db: SQLiteDB 实例，保存探测指纹与 SHA-256 的对应关系
+        :param client: HttpClient 实例，默认使用全局共享客户端
+        :param probe_size: 探测时读取开头、结尾的字节数
+        """
+        self.root = root
+        self.db = db
+        self.client = client or HttpClient.shared()
+        self.probe_size = probe_size
+        self.logger = logging.getLogger()
+
+    def blob_path(self, sha256):
+        sha256 = sha256.lower()
+        return os.path.join(self.root, 'sha256', sha256[:2], sha256)
+
+    def has(self, sha256):
+        return bool(sha256) and os.path.isfile(self.blob_path(sha256))
+
+    def _remember_hash(self, sha256):
+        # 记录实体当前的大小和修改时间对应的哈希，之后校验时无需重新计算
+        blob = self.blob_path(sha256)
+        st = os.stat(blob)
+        self.db.put_file_hashes([(blob, st.st_size, st.st_mtime_ns, sha256.lower(), None)], time.time())
+
+    def verify(self, sha256, size=None):
+        """
+        校验实体文件内容：大小（已知时）一致，且 SHA-256 与文件名一致。
+        大小和修改时间与上次校验时相同时使用缓存的哈希，否则重新计算
+
+        :param sha256: 实体的 SHA-256
+        :param size: 可选，期望的文件大小
+        :return: bool
+        """
+        blob = self.blob_path(sha256)
+        try:
+            st = os.stat(blob)
+        except OSError:
+            return False
+        if size and st.st_size != size:
+            self.logger.warning(f"存储中的文件大小不一致（{st.st_size}/{size}）: {blob}")
+            return False
+        cached = self.db.get_file_hash(blob)
+        if cached and cached[0] == st.st_size and cached[1] == st.st_mtime_ns and cached[2]:
+            actual = cached[2]
+        else:
+            hasher = StreamHasher(('sha256',))
+            hasher.update_from_file(blob)
+            actual = hasher.hexdigests()['sha256']
+            self.db.put_file_hashes([(blob, st.st_size, st.st_mtime_ns, actual, None)], time.time())
+        if actual != sha256.lower():
+            self.logger.warning(f"存储中的文件内容已改变（SHA-256 {actual[:12]}，应为 {sha256[:12]}）: {blob}")
+            return False
+        return True
+
+    def discard(self, sha256):
+        """
+        删除损坏的实体及指向它的探测指纹（其它指向该实体的硬链接保留，由 scan 检查）
+        """
+        blob = self.blob_path(sha256)
+        try:
+            os.remove(blob)
+        except FileNotFoundError:
+            pass
+        self.db.delete_blob_probes(sha256.lower())
+        self.db.delete_file_hashes([blob])
+        self.logger.warning(f"已从存储中删除损坏的文件: {blob}")
+
+    def probe(self, url):
+        """
+        计算远程文件的探测指纹：文件大小 + 开头、结尾各 probe_size 字节的 SHA-256
+
+        :param url: 文件地址（或 SignedUrl，签名过期时与下载共用同一个刷新回调）
+        :return: (指纹, 文件大小)，服务端不支持 Range 或请求失败时返回 (None, None)
+        """
+        signed = url if isinstance(url, SignedUrl) else SignedUrl(url)
+        try:
+            with signed.request(self.client, 'HEAD', timeout=10) as r:
+                r.raise_for_status()
+                size = int(r.headers.get('Content-Length', 0))
+            if not size:
+                return None, None
+            hasher = hashlib.sha256(str(size).encode('ascii'))
+            ranges = [(0, min(size, self.probe_size) - 1)]
+            if size > self.probe_size:
+                ranges.append((max(self.probe_size, size - self.probe_size), size - 1))
+            for start, end in ranges:
+                with signed.request(self.client, headers={'Range': f'bytes={start}-{end}'}, timeout=30) as r:
+                    r.raise_for_status()
+                    if r.status_code != 206 and not (start == 0 and end == size - 1):
+                        return None, None
+                    data = r.content
+                if len(data) != end - start + 1:
+                    return None, None
+                hasher.update(data)
+            return 'probe:' + hasher.hexdigest(), size
+        except Exception as e:
+            self.logger.warning(f"文件指纹探测失败: {e}")
+            return None, None
+
+    def link(self, sha256, path):
+        """
+        在 path 创建指向实体文件的链接：优先硬链接，失败时使用相对路径的符号链接
+        """
+        blob = self.blob_path(sha256)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        try:
+            os.link(blob, path)
+        except OSError:
+            os.symlink(os.path.relpath(blob, os.path.dirname(os.path.abspath(path))), path)
+
+    def ingest(self, path, sha256):
+        """
+        把刚下载完成的文件移入存储，原路径替换为链接；已有相同内容时删除新文件直接链接
+
+        :param path: 已下载的文件
+        :param sha256: 文件的 SHA-256
+        """
+        blob = self.blob_path(sha256)
+        os.makedirs(os.path.dirname(blob), exist_ok=True)
+        if os.path.exists(blob):
+            if self.verify(sha256, os.path.getsize(path)):
+                os.remove(path)
+                self.link(sha256, path)
+                self.logger.info(f"已存在相同内容的文件，已改为链接: {path}")
+                return
+            self.discard(sha256)
+        try:
+            os.replace(path, blob)
+        except OSError:
+            # 不在同一文件系统时无法硬链接，保留原文件不做去重
+            self.logger.warning(f"存储目录与模型目录不在同一文件系统，跳过去重: {path}")
+            return
+        try:
+            self.link(sha256, path)
+        except OSError as e:
+            os.replace(blob, path)
+            self.logger.warning(f"创建链接失败，跳过去重: {e}")
+            return
+        self._remember_hash(sha256)
+
+    def fetch(self, url, path, download_fn, expected_sha256=None):
+        """
+        获取文件到 path：内容已在存储中且校验一致时直接链接，否则调用 download_fn 下载后移入存储
+
+        :param url: 下载地址或 SignedUrl（用于探测指纹）
+        :param path: 模型路径
+        :param download_fn: 无参下载函数，下载到 path 并返回 {算法: 十六进制摘要}
+        :param expected_sha256: 可选，模型信息中的 SHA-256
+        :return: {算法: 十六进制摘要}（直接链接时只有校验过的 sha256）
+        """
+        sha256 = expected_sha256.lower() if expected_sha256 else None
+        probe_key = size = None
+        if not self.has(sha256):
+            probe_key, size = self.probe(url)
+            if probe_key:
+                sha256 = self.db.get_blob_probe(probe_key) or sha256
+        if self.has(sha256):
+            if self.verify(sha256, size):
+                self.link(sha256, path)
+                self.logger.info(f"♻️ 已有相同内容的文件（{sha256[:12]}），无需下载: {path}")
+                return {'sha256': sha256}
+            self.discard(sha256)
+
+        hashes = download_fn()
+        if not hashes or not hashes.get('sha256'):
+            return hashes
+        self.ingest(path, hashes['sha256'])
+        if probe_key:
+            self.db.put_blob_probe(probe_key, hashes['sha256'], size)
+        return hashes
@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+"""
+本地模型目录全文检索
+
+从数据库中保存的模型原始信息（model_info）提取名称、版本名、介绍和标签写入 SQLite FTS5 索引，支持：
+- 关键字全文检索（trigram 分词，中文可直接子串匹配）
+- 按模型类型（ModelType）、基模类型（BaseModelType）过滤
+- 增量同步：只索引尚未入库的模型
+"""
+
+import json
+import logging
+import re
+import time
+
+_HTML_TAG = re.compile(r'<[^>]+>')
+# trigram 分词要求关键字至少 3 个字符，更短的关键字改为模糊匹配
+_MIN_MATCH_LENGTH = 3
+
+
+def _text(value):
+    """
+    把接口返回的字段（字符串、HTML、列表或对象）转为纯文本
+    """
+    if value is None:
+        return ''
+    if isinstance(value, str):
+        return _HTML_TAG.sub(' ', value).strip()
+    if isinstance(value, (list, tuple)):
+        return ' '.join(t for t in (_text(v) for v in value) if t)
+    if isinstance(value, dict):
+        for key in ('name', 'label', 'tagName', 'title'):
+            if value.get(key):
+                return _text(value[key])
+        return ''
+    return str(value)
+
+
+class CatalogIndex:
+    """
+    本地模型目录：索引写入与查询，SQL 由 SQLiteDB 提供
+    """
+
+    def __init__(self, db):
+        """
+        :param db: SQLiteDB 实例（init_db 时已创建 model_catalog / model_catalog_fts 表）
+        """
+        self.db = db
+        self.logger = logging.getLogger()
+
+    @staticmethod
+    def extract(model_uuid, model_info):
+        """
+        从模型信息中提取索引字段
+
+        :return: (model_uuid, name, model_type, base_types, version_names, descriptions, tags)
+        """
+        versions = model_info.get('versions') or []
+        base_types = []
+        for version in versions:
+            base_type = version.get('baseType')
+            if base_type is not None and base_type not in base_types:
+                base_types.append(base_type)
+        version_names = _text([v.get('name') for v in versions])
+        descriptions = _text([model_info.get('intro'), model_info.get('description')] +
+                             [v.get('versionDesc') for v in versions])
+        tags = _text([model_info.get(key) for key in ('tags', 'tagsV2', 'tagList', 'labels') if model_info.get(key)])
+        return (
+            model_uuid,
+            model_info.get('name') or '',
+            model_info.get('modelType'),
+            ',' + ','.join(str(b) for b in base_types) + ',',
+            version_names,
+            descriptions,
+            tags,
+        )
+
+    def index_models(self, rows):
+        """
+        写入索引
+
+        :param rows: [(model_uuid, model_info), ...]，model_info 为 dict 或 JSON 字符串
+        :return: 写入的条数
+        """
+        entries = []
+        for model_uuid, model_info in rows:
+            if isinstance(model_info, str):
+                try:
+                    model_info = json.loads(model_info)
+                except ValueError:
+                    continue
+            if not isinstance(model_info, dict):
+                continue
+            entries.append(self.extract(model_uuid, model_info))
+        self.db.upsert_catalog_entries(entries, time.time())
+        return len(entries)
+
+    def sync(self, rebuild=False):
+        """
+        把数据库中尚未索引的已下载模型写入索引
+
+        :param rebuild: True 时清空后重建
+        :return: 本次写入的条数
+        """
+        if rebuild:
+            self.db.clear_catalog()
+        count = self.index_models(self.db.models_missing_from_catalog())
+        if count:
+            self.logger.info(f"本地模型目录已更新 {count} 条")
+        return count
+
+    def search(self, keywords='', model_types=(), base_types=(), limit=50):
+        """
+        查询本地模型目录
+
+        :param keywords: 关键字，多个关键字用空格分隔，需同时匹配
+        :param model_types: ModelType 列表
+        :param base_types: BaseModelType 列表，满足其一即可
+        :param limit: 最多返回条数
+        :return: [dict(model_uuid, name, model_type, base_types, snippet)]
+        """
+        terms = [t for t in (keywords or '').split() if t]
+        match_terms = [t for t in terms if len(t) >= _MIN_MATCH_LENGTH]
+        like_terms = [t for t in terms if len(t) < _MIN_MATCH_LENGTH]
+        # 每个关键字作为短语匹配，双引号转义，避免被解析为 FTS5 语法
+        match = ' AND '.join('"' + t.replace('"', '""') + '"' for t in match_terms) or None
+        rows = self.db.search_catalog(match=match, like_terms=like_terms, model_types=model_types,
+                                      base_types=base_types, limit=limit)
+        return [{
+            'model_uuid': row[0],
+            'name': row[1],
+            'model_type': row[2],
+            'base_types': [int(b) if b.isdigit() else b for b in (row[3] or '').split(',') if b],
+            'snippet': row[4],
+        } for row in rows]
@@ -0,0 +1,300 @@
+# -*- coding: utf-8 -*-
+"""
+配置文件 conf.yml
+
+整个进程只解析一次，file_util、SQLiteDB 和 main 共用同一个 Config 实例。
+各节按声明的类型和默认值读取，如 Config.shared().download.three_number 一定是 int。
+
+配置文件位置按以下顺序查找：
+- 环境变量 LIBLIB_CONF
+- 当前目录下的 conf/conf.yml（兼容原来在项目目录下运行的方式）
+- 项目目录下的 conf/conf.yml（在其它目录下运行，如定时任务）
+"""
+
+import os
+import threading
+
+import yaml
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CONFIG_ENV = 'LIBLIB_CONF'
+DEFAULT_CONFIG = os.path.join('conf', 'conf.yml')
+
+_TRUE = ('true', 'yes', 'on', '1')
+_FALSE = ('false', 'no', 'off', '0', '')
+
+
+def config_path():
+    """
+    配置文件路径
+    """
+    path = os.environ.get(CONFIG_ENV)
+    if path:
+        return os.path.abspath(path)
+    if os.path.exists(DEFAULT_CONFIG):
+        return os.path.abspath(DEFAULT_CONFIG)
+    return os.path.join(PROJECT_DIR, DEFAULT_CONFIG)
+
+
+def _convert(value_type, value, name):
+    if value_type is bool:
+        if isinstance(value, bool):
+            return value
+        text = str(value).strip().lower()
+        if text in _TRUE:
+            return True
+        if text in _FALSE:
+            return False
+        raise ValueError(f"配置项 {name} 应为 True/False，实际为 {value!r}")
+    try:
+        return value_type(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"配置项 {name} 应为 {value_type.__name__}，实际为 {value!r}")
+
+
+class Section:
+    """
+    配置中的一节：FIELDS 声明的键按类型转换，缺省或为空时使用默认值；未声明的键保留在 raw 中
+    """
+
+    NAME = ''
+    # 键 -> (类型, 默认值)
+    FIELDS = {}
+
+    def __init__(self, data=None):
+        self.raw = dict(data or {})
+        for key, (value_type, default) in self.FIELDS.items():
+            value = self.raw.get(key)
+            if value is None or (value == '' and value_type is not str):
+                setattr(self, key, default)
+            else:
+                setattr(self, key, _convert(value_type, value, f"{self.NAME}.{key}"))
+
+    def get(self, key, default=None):
+        """
+        按字典方式读取（兼容原来 config.get('download')['xxx'] 的写法）
+        """
+        if key in self.FIELDS:
+            return getattr(self, key)
+        return self.raw.get(key, default)
+
+    def __getitem__(self, key):
+        if key in self.FIELDS:
+            return getattr(self, key)
+        return self.raw[key]
+
+    def __repr__(self):
+        values = ', '.join(f"{key}={getattr(self, key)!r}" for key in self.FIELDS)
+        return f"{type(self).__name__}({values})"
+
+
+class UserConfig(Section):
+    NAME = 'user'
+    FIELDS = {
+        'token': (str, None),
+        'cid': (str, None),
+    }
+
+
+class ApiConfig(Section):
+    NAME = 'api'
+    FIELDS = {
+        'base_url': (str, 'https://api2.liblib.art/api/www'),
+        'recommend_batch_size': (int, 100),
+    }
+
+
+class HttpConfig(Section):
+    NAME = 'http'
+    FIELDS = {
+        'pool_connections': (int, 10),
+        'pool_maxsize': (int, 32),
+        'connect_timeout': (float, 10),
+        'read_timeout': (float, 60),
+    }
+
+
+class DbConfig(Section):
+    NAME = 'db'
+    FIELDS = {
+        'path': (str, 'db'),
+        'name': (str, 'db.sqlite3'),
+    }
+
+
+class DownloadConfig(Section):
+    NAME = 'download'
+    FIELDS = {
+        'model_parent_path': (str, ''),
+        'three_number': (int, 1),
+        'parallel_jobs': (int, 2),
+        'resolve_workers': (int, 2),
+        'max_connections': (int, 16),
+        'in_place': (bool, True),
+        'segment_size_mb': (int, 8),
+        'buffer_size_kb': (int, 1024),
+        'blob_store': (bool, False),
+        'blob_dir': (str, None),
+        'min_free_mb': (int, 1024),
+        'max_retries': (int, 3),
+        'timeout': (float, 60),
+        'retry_interval': (float, 5),
+        'retry_wait': (float, 5),
+        'auto_download': (bool, True),
+        'save_search_list': (bool, False),
+    }
+    # 可按模型类型覆盖的参数
+    MODEL_TYPE_FIELDS = ('three_number', 'in_place', 'segment_size_mb', 'buffer_size_kb', 'max_retries', 'timeout',
+                         'retry_interval', 'retry_wait')
+
+    def model_type_overrides(self):
+        """
+        按模型类型覆盖的下载参数（download.model_types）
+
+        :return: {模型类型（名称或数值，与配置中的写法一致）: {参数: 值}}，值已按类型转换
+        """
+        overrides = {}
+        for model_type, values in (self.raw.get('model_types') or {}).items():
+            options = {}
+            for key, value in (values or {}).items():
+                name = f"{self.NAME}.model_types.{model_type}.{key}"
+                if key not in self.MODEL_TYPE_FIELDS:
+                    raise ValueError(f"配置项 {name} 不支持按模型类型设置")
+                if value is not None:
+                    options[key] = _convert(self.FIELDS[key][0], value, name)
+            overrides[model_type] = options
+        return overrides
+
+
+class AssetsConfig(Section):
+    NAME = 'assets'
+    FIELDS = {
+        'workers': (int, 4),
+        'download_images': (bool, False),
+    }
+
+
+class CacheConfig(Section):
+    NAME = 'cache'
+    FIELDS = {
+        'enabled': (bool, True),
+        'ttl': (float, 86400),
+        'max_entries': (int, 1000),
+        'max_disk_entries': (int, 100000),
+    }
+
+
+class SearchConfig(Section):
+    NAME = 'search'
+    FIELDS = {
+        'concurrency': (int, 4),
+        'incremental': (bool, False),
+        'sort': (str, None),
+        'known_run': (int, 50),
+    }
+
+
+class RateLimitConfig(Section):
+    NAME = 'rate_limit'
+    FIELDS = {
+        'api_requests_per_second': (float, 0),
+        'download_mb_per_second': (float, 0),
+    }
+
+
+class MetricsConfig(Section):
+    NAME = 'metrics'
+    FIELDS = {
+        'http_port': (int, 0),
+        'http_host': (str, '127.0.0.1'),
+        'snapshot_path': (str, ''),
+        'snapshot_interval': (float, 60),
+    }
+
+
+class Config:
+    """
+    解析后的 conf.yml，通过 Config.shared() 获取进程内共享的实例
+    """
+
+    SECTIONS = {
+        'user': UserConfig,
+        'api': ApiConfig,
+        'http': HttpConfig,
+        'db': DbConfig,
+        'download': DownloadConfig,
+        'assets': AssetsConfig,
+        'cache': CacheConfig,
+        'search': SearchConfig,
+        'rate_limit': RateLimitConfig,
+        'metrics': MetricsConfig,
+    }
+
+    _shared = None
+    _shared_lock = threading.Lock()
+
+    def __init__(self, data=None, path=None):
+        """
+        :param data: conf.yml 解析得到的 dict
+        :param path: 配置文件路径（用于解析配置中的相对路径）
+        """
+        self.data = data or {}
+        self.path = path
+        # 节名不区分大小写（conf.yml 中用户信息一节写作 User）
+        keys = {str(key).lower(): key for key in self.data}
+        for name, section_cls in self.SECTIONS.items():
+            setattr(self, name, section_cls(self.data.get(name if name in self.data else keys.get(name))))
+
+    @classmethod
+    def load(cls, path=None):
+        """
+        读取并解析配置文件
+
+        :param path: 配置文件路径，默认按 config_path() 查找
+        """
+        path = path or config_path()
+        with open(path, 'r', encoding='utf-8') as f:
+            data = yaml.safe_load(f) or {}
+        return cls(data, path)
+
+    @classmethod
+    def shared(cls):
+        """
+        进程内共享的配置（首次调用时读取配置文件）
+        """
+        if cls._shared is None:
+            with cls._shared_lock:
+                if cls._shared is None:
+                    cls._shared = cls.load()
+        return cls._shared
+
+    @classmethod
+    def reload(cls):
+        """
+        重新读取配置文件并替换共享实例（如收到 SIGHUP 时）
+        """
+        config = cls.load(cls._shared.path if cls._shared is not None else None)
+        with cls._shared_lock:
+            cls._shared = config
+        return config
+
+    @classmethod
+    def set_shared(cls, config):
+        with cls._shared_lock:
+            cls._shared = config
+
+    def resolve_path(self, path):
+        """
+        配置中的相对路径按项目目录（配置文件 conf/ 的上一级）解析，与运行时的当前目录无关
+        """
+        if not path or os.path.isabs(path) or not self.path:
+            return path
+        return os.path.join(os.path.dirname(os.path.dirname(self.path)), path)
+
+    def get(self, name, default=None):
+        """
+        按字典方式读取一节（兼容原来 file_util.read_yml() 返回 dict 的写法）
+        """
+        if name in self.SECTIONS:
+            return getattr(self, name)
+        return self.data.get(name, default)
@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+"""
+配套模型依赖解析
+
+在下载前先构建一批模型的完整依赖图（模型 -> 推荐的底模 ckpt），支持：
+- 按层并发获取模型详情
+- 版本 ID 去重后批量查询配套模型
+- 已访问集合去重，依赖环不会无限递归
+- 单个模型获取详情或配套模型出错时只跳过该模型，不影响其它模型
+- 输出依赖在前的拓扑序下载计划，无法展开的输入模型保留在计划中并记录原因（failed / skipped）
+"""
+
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+
+class DependencyResolver:
+    """
+    依赖图解析器：通过注入的接口函数获取模型详情与配套模型，本身不直接访问网络
+    """
+
+    def __init__(self, get_model_info, get_compatible_models, filter_done=None, workers=4):
+        """
+        初始化依赖解析器
+
+        :param get_model_info: 获取模型详情的函数，参数为模型 uuid
+        :param get_compatible_models: 批量获取配套模型的函数，参数为版本 ID 列表，返回包含 id、modelUuid 的列表
+        :param filter_done: 可选，参数为 uuid 列表，返回其中已下载（无需再展开）的 uuid 集合
+        :param workers: 并发获取模型详情的线程数，默认4
+        """
+        self.get_model_info = get_model_info
+        self.get_compatible_models = get_compatible_models
+        self.filter_done = filter_done
+        self.workers = max(1, int(workers))
+        self.logger = logging.getLogger()
+        # 模型 uuid -> 模型详情
+        self.model_infos = {}
+        # 模型 uuid -> 依赖的模型 uuid 列表
+        self.dependencies = {}
+        # 无法获取详情的模型 uuid -> 异常（接口出错或模型不存在）
+        self.failed = {}
+        # 已下载、未展开依赖的模型 uuid
+        self.skipped = set()
+        # 最近一次 resolve() 的下载计划
+        self.plan = []
+
+    @staticmethod
+    def base_version_ids(model_info):
+        """
+        从模型最新版本的 versionIntro 中取出推荐底模的版本 ID 列表
+        """
+        try:
+            version_intro = model_info["versions"][0]["versionIntro"]
+            if not version_intro:
+                return []
+            ckpt = json.loads(version_intro).get('ckpt') or []
+        except (KeyError, IndexError, TypeError, ValueError, AttributeError):
+            return []
+        return ckpt if isinstance(ckpt, list) else [ckpt]
+
+    def _fetch_model_info(self, uuid):
+        """
+        获取单个模型的详情，出错或模型不存在时记入 failed 并返回 None
+        """
+        try:
+            info = self.get_model_info(uuid)
+        except Exception as e:
+            self.logger.warning(f"获取模型详情失败，已跳过：{uuid}，{e}")
+            self.failed[uuid] = e
+            return None
+        if not info:
+            self.logger.warning(f"模型不存在，已跳过：{uuid}")
+            self.failed[uuid] = LookupError(f"模型不存在：{uuid}")
+        return info
+
+    def _fetch_compatible_models(self, version_ids):
+        """
+        批量获取配套模型，批量请求出错时逐个版本重试，仍出错的版本忽略（不展开其依赖）
+        """
+        try:
+            return self.get_compatible_models(version_ids) or []
+        except Exception as e:
+            if len(version_ids) == 1:
+                self.logger.warning(f"获取配套模型失败，已忽略版本 {version_ids[0]}：{e}")
+                return []
+            self.logger.warning(f"批量获取配套模型失败，改为逐个版本查询：{e}")
+        compatible_models = []
+        for version_id in version_ids:
+            compatible_models.extend(self._fetch_compatible_models([version_id]))
+        return compatible_models
+
+    def resolve(self, model_uuids):
+        """
+        构建依赖图并返回下载计划
+
+        :param model_uuids: 待下载的模型 uuid 列表
+        :return: 去重后的 uuid 列表，依赖的模型排在依赖它的模型之前；
+                 已下载（skipped）或无法获取详情（failed）的输入模型也保留在计划中，由调用方按状态处理
+        """
+        roots = [u for u in dict.fromkeys(model_uuids) if u is not None]
+        visited = set()
+        frontier = roots
+        version_map = {}
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            while frontier:
+                frontier = [u for u in dict.fromkeys(frontier) if u not in visited]
+                visited.update(frontier)
+                if self.filter_done:
+                    done = self.filter_done(frontier)
+                    self.skipped.update(done)
+                    frontier = [u for u in frontier if u not in done]
+                if not frontier:
+                    break
+
+                infos = dict(zip(frontier, executor.map(self._fetch_model_info, frontier)))
+                level_versions = {}
+                for uuid, info in infos.items():
+                    if not info:
+                        continue
+                    self.model_infos[uuid] = info
+                    level_versions[uuid] = self.base_version_ids(info)
+
+                # 本层所有模型的版本 ID 去重后一次性批量查询（保留接口原始的 ID 类型）
+                missing = {}
+                for version_ids in level_versions.values():
+                    for v in version_ids:
+                        if str(v) not in version_map:
+                            missing.setdefault(str(v), v)
+                if missing:
+                    for compatible_model in self._fetch_compatible_models(list(missing.values())):
+                        if compatible_model.get('id') is not None and compatible_model.get('modelUuid'):
+                            version_map[str(compatible_model['id'])] = compatible_model['modelUuid']
+
+                next_frontier = []
+                for uuid, version_ids in level_versions.items():
+                    deps = list(dict.fromkeys(version_map[str(v)] for v in version_ids
+                                              if str(v) in version_map and version_map[str(v)] != uuid))
+                    self.dependencies[uuid] = deps
+                    next_frontier.extend(deps)
+                frontier = next_frontier
+
+        self.plan = self._topological_order(roots)
+        self.logger.info(f"依赖解析完成：输入 {len(roots)} 个模型，下载计划共 {len(self.plan)} 个模型"
+                         f"（已下载 {len([u for u in roots if u in self.skipped])} 个，"
+                         f"无法解析 {len([u for u in roots if u in self.failed])} 个）")
+        return self.plan
+
+    def _topological_order(self, roots):
+        """
+        深度优先后序遍历，依赖排在前面；遇到依赖环时跳过回边。
+        没有详情的输入模型（已下载或解析失败）按输入顺序保留
+        """
+        order = []
+        state = {}  # uuid -> 1 访问中，2 已完成
+
+        for root in roots:
+            if root in state:
+                continue
+            if root not in self.model_infos:
+                state[root] = 2
+                order.append(root)
+                continue
+            stack = [(root, iter(self.dependencies.get(root, [])))]
+            state[root] = 1
+            while stack:
+                node, children = stack[-1]
+                child = next(children, None)
+                if child is None:
+                    stack.pop()
+                    state[node] = 2
+                    order.append(node)
+                    continue
+                if child not in self.model_infos:
+                    continue
+                if state.get(child) == 1:
+                    self.logger.warning(f"检测到模型依赖环：{node} -> {child}，已忽略")
+                    continue
+                if child not in state:
+                    state[child] = 1
+                    stack.append((child, iter(self.dependencies.get(child, []))))
+        return order
@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+"""
+磁盘空间预留
+
+下载开始前按文件大小预留磁盘空间，调度器只在预留总量不超过剩余空间时放行任务，
+避免大文件下载到一半才发现磁盘已满：
+- 按卷（st_dev）统计预留量
+- 下载开始后临时文件已预分配（fallocate）的部分已经反映在剩余空间中，不再重复计算
+- preallocate：为文件一次性分配完整的磁盘空间，空间不足时立即报错
+"""
+
+import errno
+import logging
+import os
+import shutil
+import threading
+
+from util.Metrics import Metrics
+
+metrics = Metrics.shared()
+metrics.describe('liblib_disk_reserved_bytes', 'gauge', '已预留但尚未分配的磁盘空间（字节）')
+
+
+def preallocate(fd, size):
+    """
+    为文件分配 size 字节的磁盘空间（已有数据保持不变）。
+    支持 posix_fallocate 的平台真正占用磁盘块，空间不足时抛出 IOError；
+    其它平台或文件系统不支持时退化为 ftruncate（稀疏文件）。
+    posix_fallocate 不会缩小文件，已有文件比 size 大时（如远端文件变小后残留的临时文件）先截断到 size
+
+    :param fd: 文件描述符
+    :param size: 文件大小（字节）
+    """
+    if os.fstat(fd).st_size > size:
+        os.ftruncate(fd, size)
+    if hasattr(os, 'posix_fallocate'):
+        try:
+            os.posix_fallocate(fd, 0, size)
+            return
+        except OSError as e:
+            if e.errno == errno.ENOSPC:
+                raise IOError(f"磁盘空间不足，无法预分配 {size} 字节") from e
+            if e.errno not in (errno.EINVAL, errno.EOPNOTSUPP, getattr(errno, 'ENOTSUP', errno.EOPNOTSUPP)):
+                raise
+    os.ftruncate(fd, size)
+
+
+def _existing_dir(path):
+    """
+    path 所在的已存在的目录（目标目录可能还未创建）
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    while not os.path.isdir(directory):
+        parent = os.path.dirname(directory)
+        if parent == directory:
+            break
+        directory = parent
+    return directory
+
+
+def allocated_bytes(path):
+    """
+    文件实际占用的磁盘空间（字节），文件不存在时为 0
+    """
+    try:
+        st = os.stat(path)
+    except OSError:
+        return 0
+    blocks = getattr(st, 'st_blocks', None)
+    return blocks * 512 if blocks is not None else st.st_size
+
+
+class DiskSpace:
+    """
+    按卷统计的磁盘空间预留，线程安全
+    """
+
+    def __init__(self, min_free_bytes=0):
+        """
+        :param min_free_bytes: 预留后至少保留的剩余空间（字节）
+        """
+        self.min_free_bytes = max(0, int(min_free_bytes))
+        self.logger = logging.getLogger()
+        self._lock = threading.Lock()
+        # key -> (卷, 写入路径, 文件大小)
+        self._reservations = {}
+
+    @staticmethod
+    def _volume(path):
+        directory = _existing_dir(path)
+        return os.stat(directory).st_dev, directory
+
+    def _outstanding(self, device):
+        # 已预留但临时文件尚未分配的字节数（持锁调用）
+        return sum(max(0, size - allocated_bytes(path))
+                   for dev, path, size in self._reservations.values() if dev == device)
+
+    def try_reserve(self, key, path, size):
+        """
+        预留空间
+
+        :param key: 预留标识（如模型 uuid）
+        :param path: 下载写入的文件路径（临时文件），用于确定所在卷和已分配的大小
+        :param size: 文件大小（字节）
+        :return: 剩余空间足够时预留并返回 True，否则返回 False
+        """
+        device, directory = self._volume(path)
+        with self._lock:
+            need = max(0, size - allocated_bytes(path))
+            free = shutil.disk_usage(directory).free
+            outstanding = self._outstanding(device)
+            if need and need + outstanding + self.min_free_bytes > free:
+                self.logger.debug(f"磁盘剩余空间不足，暂缓下载：需要 {need / 1024 / 1024:.1f} MB，"
+                                 f"剩余 {free / 1024 / 1024:.1f} MB，已预留 {outstanding / 1024 / 1024:.1f} MB")
+                return False
+            self._reservations[key] = (device, path, size)
+            metrics.set('liblib_disk_reserved_bytes', outstanding + need)
+            return True
+
+    def release(self, key):
+        """
+        释放预留（下载结束后调用）
+        """
+        with self._lock:
+            reservation = self._reservations.pop(key, None)
+            if reservation is not None:
+                metrics.set('liblib_disk_reserved_bytes', self._outstanding(reservation[0]))
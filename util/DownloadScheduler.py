@@ -0,0 +1,343 @@
+# -*- coding: utf-8 -*-
+"""
+模型下载调度器
+
+将“解析模型信息/下载地址”和“下载文件”拆分到两个线程池中执行，支持：
+- 同时下载多个模型
+- 解析与下载流水线并行（后续模型的解析与前面模型的传输重叠）
+- 全局限制所有分片下载的连接总数
+- 按文件大小预留磁盘空间，空间不足时暂缓下载，优先放行放得下的较小任务
+- 记录每个任务的状态
+"""
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from util.Metrics import Metrics
+from util.DiskSpace import DiskSpace
+
+PENDING = 'pending'
+RESOLVING = 'resolving'
+QUEUED = 'queued'
+WAITING_SPACE = 'waiting_space'
+DOWNLOADING = 'downloading'
+DONE = 'done'
+SKIPPED = 'skipped'
+FAILED = 'failed'
+
+Metrics.shared().describe('liblib_scheduler_jobs', 'gauge', '下载队列中各状态的任务数')
+
+
+class DownloadJob:
+    """
+    单个模型的下载任务
+    """
+
+    def __init__(self, key):
+        self.key = key
+        self.status = PENDING
+        self.payload = None
+        self.error = None
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        # 需要预留的磁盘空间：(写入路径, 字节数)，不需要时为 None
+        self.space = None
+
+    def duration(self):
+        """
+        下载耗时（秒），未开始下载时返回 None
+        """
+        if self.started_at is None:
+            return None
+        return (self.finished_at or time.time()) - self.started_at
+
+    def __repr__(self):
+        return f"DownloadJob({self.key}, {self.status})"
+
+
+class DownloadScheduler:
+    """
+    跨模型的下载队列：resolve_fn 负责把任务键（如模型 uuid）解析为下载信息，
+    download_fn 负责执行实际下载，两者分别在独立的线程池中运行。
+    """
+
+    def __init__(self, resolve_fn, download_fn, max_jobs=2, resolve_workers=2, max_connections=16, on_finish=None,
+                 space_fn=None, disk_space=None, abort_fn=None):
+        """
+        初始化下载调度器
+
+        :param resolve_fn: 解析函数，参数为任务键，返回下载信息；返回 None 表示跳过
+        :param download_fn: 下载函数，参数为 resolve_fn 返回的下载信息
+        :param max_jobs: 同时下载的模型数，默认2
+        :param resolve_workers: 同时解析的模型数，默认2
+        :param max_connections: 所有下载任务共享的最大连接数，默认16
+        :param on_finish: 可选，任务结束（完成、跳过或失败）时调用，参数为 DownloadJob
+        :param space_fn: 可选，参数为下载信息，返回 (写入路径, 文件大小) 或 None（无需预留），
+                         设置后只在磁盘剩余空间足够时开始下载
+        :param disk_space: DiskSpace 实例，默认新建（不额外保留剩余空间）
+        :param abort_fn: 可选，abort() 时调用，用于中止正在进行的下载（如各下载的分片队列）
+        """
+        self.resolve_fn = resolve_fn
+        self.download_fn = download_fn
+        self.on_finish = on_finish
+        self.space_fn = space_fn
+        self.disk_space = disk_space or DiskSpace()
+        self.abort_fn = abort_fn
+        self.connection_limiter = threading.BoundedSemaphore(max(1, int(max_connections)))
+        self.jobs = OrderedDict()
+        self.logger = logging.getLogger()
+
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        self._active = 0
+        self._fatal = None
+        self._aborted = False
+        # 已提交到线程池、尚未结束的任务：future -> DownloadJob，中止时据此结束被取消的任务
+        self._futures = {}
+        # 等待磁盘空间的任务（按解析完成顺序），以及已放行、尚未结束的下载数
+        self._waiting = []
+        self._admitted = 0
+        self._resolve_pool = ThreadPoolExecutor(max_workers=max(1, int(resolve_workers)),
+                                                thread_name_prefix='resolve')
+        self._download_pool = ThreadPoolExecutor(max_workers=max(1, int(max_jobs)),
+                                                 thread_name_prefix='download')
+        # 队列深度：各状态的任务数
+        self.metrics = Metrics.shared()
+        self.metrics.register_collector(self._collect_metrics)
+
+    def submit(self, key):
+        """
+        提交一个任务，相同的键只会处理一次
+
+        :param key: 任务键（模型 uuid）
+        :return: DownloadJob
+        """
+        with self._lock:
+            if key in self.jobs:
+                return self.jobs[key]
+            job = DownloadJob(key)
+            self.jobs[key] = job
+            fatal = self._fatal is not None or self._aborted
+            if fatal:
+                job.status = SKIPPED
+            else:
+                self._active += 1
+        if fatal:
+            self._notify(job)
+            return job
+        self._submit(self._resolve_pool, self._resolve, job)
+        return job
+
+    def report(self, key, status, error=None):
+        """
+        记录一个无需执行的任务（如依赖解析时已下载或无法获取详情的模型），同样通知 on_finish 并计入汇总
+
+        :param key: 任务键（模型 uuid）
+        :param status: 任务状态，如 SKIPPED、FAILED
+        :param error: 可选，失败原因
+        :return: DownloadJob
+        """
+        with self._lock:
+            if key in self.jobs:
+                return self.jobs[key]
+            job = DownloadJob(key)
+            self.jobs[key] = job
+        job.finished_at = time.time()
+        job.status = status
+        job.error = error
+        if status == FAILED:
+            self.logger.error(f"【任务 {job.key}】失败: {error}")
+        self._notify(job)
+        return job
+
+    def _submit(self, pool, fn, job):
+        with self._lock:
+            future = None if self._aborted else pool.submit(fn, job)
+            if future is not None:
+                self._futures[future] = job
+        if future is None:
+            self._finish(job, SKIPPED)
+            return
+        # 任务结束（或被取消）后移除；已结束时回调在当前线程中立即执行，登记一定早于移除
+        future.add_done_callback(self._forget)
+
+    def _forget(self, future):
+        with self._lock:
+            self._futures.pop(future, None)
+
+    def _resolve(self, job):
+        if self._fatal is not None or self._aborted:
+            self._finish(job, SKIPPED)
+            return
+        job.status = RESOLVING
+        try:
+            payload = self.resolve_fn(job.key)
+        except BaseException as e:
+            self._finish(job, FAILED, e)
+            return
+        if payload is None:
+            self._finish(job, SKIPPED)
+            return
+        job.payload = payload
+        if self.space_fn is not None:
+            try:
+                job.space = self.space_fn(payload)
+            except Exception as e:
+                self.logger.warning(f"【任务 {job.key}】获取文件大小失败，不预留磁盘空间: {e}")
+        job.status = WAITING_SPACE if job.space else QUEUED
+        with self._lock:
+            self._waiting.append(job)
+        self._admit()
+        if job.status == WAITING_SPACE:
+            self.logger.info(f"【任务 {job.key}】磁盘剩余空间不足，等待其它下载完成")
+
+    def _admit(self):
+        """
+        按顺序放行剩余空间放得下的任务：前面的大文件放不下时，后面较小的文件可以先下载。
+        没有正在下载的任务（不会再有空间释放）时，仍然放不下的任务记为失败
+        """
+        admitted = []
+        rejected = []
+        with self._lock:
+            for job in list(self._waiting):
+                if job.space is None or self.disk_space.try_reserve(job.key, *job.space):
+                    self._waiting.remove(job)
+                    admitted.append(job)
+            self._admitted += len(admitted)
+            if self._waiting and self._admitted == 0:
+                rejected, self._waiting = self._waiting, []
+        for job in admitted:
+            job.status = QUEUED
+            self._submit(self._download_pool, self._download, job)
+        for job in rejected:
+            path, size = job.space
+            self._finish(job, FAILED, IOError(f"磁盘空间不足：需要 {size / 1024 / 1024:.1f} MB（{path}）"))
+
+    def _download(self, job):
+        try:
+            if self._fatal is not None or self._aborted:
+                self._finish(job, SKIPPED)
+                return
+            job.status = DOWNLOADING
+            job.started_at = time.time()
+            self.logger.info(f"【任务 {job.key}】开始下载")
+            try:
+                self.download_fn(job.payload)
+            except BaseException as e:
+                self._finish(job, FAILED, e)
+                return
+            self._finish(job, DONE)
+        finally:
+            # 释放预留后重新检查等待空间的任务
+            self.disk_space.release(job.key)
+            with self._lock:
+                self._admitted -= 1
+            if not self._aborted:
+                self._admit()
+
+    def abort(self):
+        """
+        中止调度（如收到退出信号时）：取消尚未开始的解析和下载，通知正在进行的下载尽快停止，
+        不再开始新的任务。已取消和等待磁盘空间的任务记为跳过
+        """
+        with self._lock:
+            if self._aborted:
+                return
+            self._aborted = True
+            waiting, self._waiting = self._waiting, []
+            # 中止后不再提交新任务；取消时的回调会移除登记，先取快照
+            submitted = dict(self._futures)
+        self._resolve_pool.shutdown(wait=False, cancel_futures=True)
+        self._download_pool.shutdown(wait=False, cancel_futures=True)
+        cancelled = [job for future, job in submitted.items() if future.cancelled()]
+        for job in waiting + cancelled:
+            self.disk_space.release(job.key)
+            self._finish(job, SKIPPED)
+        if self.abort_fn is not None:
+            try:
+                self.abort_fn()
+            except Exception as e:
+                self.logger.warning(f"中止下载失败: {e}")
+        self.logger.warning(f"下载已中止，取消了 {len(waiting) + len(cancelled)} 个未开始的任务")
+
+    def _finish(self, job, status, error=None):
+        job.finished_at = time.time()
+        job.status = status
+        job.error = error
+        if status == FAILED:
+            self.logger.error(f"【任务 {job.key}】失败: {error}")
+        elif status == DONE:
+            self.logger.info(f"【任务 {job.key}】完成，耗时 {job.duration():.1f} 秒")
+        self._notify(job)
+        with self._lock:
+            # 子线程中调用 exit() 时停止调度，并在 wait() 中向调用方抛出
+            if isinstance(error, SystemExit) and self._fatal is None:
+                self._fatal = error
+            self._active -= 1
+            if self._active == 0:
+                self._idle.notify_all()
+
+    def _notify(self, job):
+        if self.on_finish is None:
+            return
+        try:
+            self.on_finish(job)
+        except Exception as e:
+            self.logger.warning(f"【任务 {job.key}】结束回调失败: {e}")
+
+    def drain(self, timeout):
+        """
+        中止后等待正在执行的任务结束，最多等待 timeout 秒
+
+        :return: 所有任务是否已结束
+        """
+        deadline = time.monotonic() + timeout
+        with self._lock:
+            while self._active > 0:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._idle.wait(remaining)
+        return True
+
+    def wait(self):
+        """
+        阻塞直到所有任务（包括执行过程中新提交的任务）完成
+
+        :return: 所有任务列表
+        """
+        with self._lock:
+            while self._active > 0:
+                self._idle.wait()
+        self._resolve_pool.shutdown(wait=True)
+        self._download_pool.shutdown(wait=True)
+        self.metrics.unregister_collector(self._collect_metrics)
+        if self._fatal is not None:
+            raise self._fatal
+        return list(self.jobs.values())
+
+    def status(self):
+        """
+        各状态的任务数量
+
+        :return: dict，键为状态，值为数量
+        """
+        counts = {}
+        for job in list(self.jobs.values()):
+            counts[job.status] = counts.get(job.status, 0) + 1
+        return counts
+
+    def _collect_metrics(self):
+        counts = self.status()
+        return [('liblib_scheduler_jobs', {'status': status}, counts.get(status, 0))
+                for status in (PENDING, RESOLVING, WAITING_SPACE, QUEUED, DOWNLOADING, DONE, SKIPPED, FAILED)]
+
+    def log_summary(self):
+        counts = self.status()
+        self.logger.info("下载任务统计：" + "，".join(f"{k} {v} 个" for k, v in counts.items()))
+        for job in self.jobs.values():
+            if job.status == FAILED:
+                self.logger.warning(f"【任务 {job.key}】失败原因: {job.error}")
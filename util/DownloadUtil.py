@@ -3,20 +3,113 @@
 文件下载工具类
 
 提供统一的文件下载功能，支持：
-- 断点续传
+- 断点续传（多线程下载定期保存各分片的写入进度，进程中断后从断点继续）
+- 多线程分片按偏移直接写入（无需合并分片文件）
+- 自适应分片：空闲线程拆分慢分片
 - 失败重试
+- 中止：退出时停止所有进行中的下载（已写入的进度保留，可断点续传）
+- 下载地址签名过期（401/403）时自动重新获取地址，继续下载剩余部分
+- 全局带宽限速
+- 下载字节数、速度、重试次数等指标统计
 - 下载进度条显示
-- MD5 校验
+- 下载过程中同步计算 SHA-256 / MD5 并校验
+- 每个下载线程复用固定的接收缓冲区，响应数据直接读入缓冲区再写入文件，不为每个数据块分配新对象
 """
 
 import os
-import requests
 from tqdm import tqdm
-from tenacity import retry, stop_after_attempt, wait_fixed
+from tenacity import retry, retry_if_exception, stop_after_attempt, wait_fixed
 import logging
 import hashlib
+import threading
+import time
+import weakref
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from util.AtomicCounter import AtomicCounter
+from util.DiskSpace import preallocate
+from util.ProgressReporter import ProgressReporter
+from util.HttpClient import HttpClient
+from util.RateLimiter import RateLimiter
+from util.Metrics import Metrics, THROUGHPUT_BUCKETS
+from util.SegmentQueue import SegmentQueue
+from util.SignedUrl import SignedUrl
+from util.StreamHasher import StreamHasher, OrderedHasher, verify_hashes
+
+_seek_write_lock = threading.Lock()
+
+metrics = Metrics.shared()
+metrics.describe('liblib_download_bytes_total', 'counter', '已下载的字节数')
+metrics.describe('liblib_download_retries_total', 'counter', '下载失败后的重试次数')
+metrics.describe('liblib_download_files_total', 'counter', '下载结束的文件数（按结果）')
+metrics.describe('liblib_download_throughput_bytes_per_second', 'histogram', '单个文件的整体下载速度',
+                 THROUGHPUT_BUCKETS)
+metrics.describe('liblib_segment_throughput_bytes_per_second', 'histogram', '单个分片的下载速度',
+                 THROUGHPUT_BUCKETS)
+metrics.describe('liblib_download_active_connections', 'gauge', '正在传输的下载连接数')
+
+
+def _pread(fd, length, offset):
+    """
+    按偏移读取文件，不支持 os.pread 的平台（Windows）退化为加锁的 seek + read
+    """
+    if hasattr(os, 'pread'):
+        return os.pread(fd, length, offset)
+    with _seek_write_lock:
+        os.lseek(fd, offset, os.SEEK_SET)
+        return os.read(fd, length)
+
+
+def _pwrite(fd, data, offset):
+    """
+    按偏移写入文件，不支持 os.pwrite 的平台（Windows）退化为加锁的 seek + write
+    """
+    if hasattr(os, 'pwrite'):
+        while data:
+            written = os.pwrite(fd, data, offset)
+            data = data[written:]
+            offset += written
+        return
+    with _seek_write_lock:
+        os.lseek(fd, offset, os.SEEK_SET)
+        while data:
+            written = os.write(fd, data)
+            data = data[written:]
+
+
+def _content_range_size(r):
+    """
+    416 响应 Content-Range（bytes */<大小>）中的远程文件大小，没有时返回 None
+    """
+    value = r.headers.get('Content-Range', '')
+    total = value.rsplit('/', 1)[-1] if '/' in value else ''
+    return int(total) if total.isdigit() else None
+
+
+def _iter_into(r, buffer):
+    """
+    把响应体依次读入 buffer，每次返回本次读到的 memoryview（下次读取时会被覆盖，调用方不能保留）。
+    响应未压缩时直接从底层 HTTP 响应 readinto，不分配新的数据块；否则退化为 iter_content
+
+    :param r: requests 的流式响应（stream=True）
+    :param buffer: 可复用的 bytearray
+    """
+    raw = r.raw
+    fp = getattr(raw, '_fp', None)
+    if fp is None or not hasattr(fp, 'readinto') or r.headers.get('Content-Encoding', 'identity') != 'identity':
+        for chunk in r.iter_content(chunk_size=len(buffer)):
+            if chunk:
+                yield memoryview(chunk)
+        return
+    view = memoryview(buffer)
+    while True:
+        n = fp.readinto(view)
+        if not n:
+            break
+        yield view[:n]
+    # 响应已读完时把连接归还连接池（绕过 urllib3 读取，需要手动归还）
+    if fp.isclosed():
+        raw.release_conn()
+
 
 class DownloadUtil:
     """
@@ -24,74 +117,209 @@ class DownloadUtil:
     支持断点续传、失败自动重试、下载进度可视化等功能。
     """
 
-    def __init__(self, max_retries=3, retry_wait=5, chunk_size=1024 * 1024):
+    # 进程内所有下载工具实例，abort_all() 时统一中止
+    _instances = weakref.WeakSet()
+    _instances_lock = threading.Lock()
+
+    def __init__(self, max_retries=3, retry_wait=5, chunk_size=1024 * 1024, client=None, connection_limiter=None,
+                 segment_size=8 * 1024 * 1024, min_split_size=1024 * 1024, rate_limiter=None,
+                 checkpoint_interval=5, timeout=30, retry_interval=5):
         """
         初始化下载工具类
 
         :param max_retries: 最大重试次数，默认为3次
         :param retry_wait: 每次重试之间的等待时间（秒），默认5秒
-        :param chunk_size: 下载块大小（字节），默认1MB
+        :param chunk_size: 每个下载线程的接收缓冲区大小（字节），默认1MB
+        :param client: HttpClient 实例，默认使用全局共享客户端
+        :param connection_limiter: 可选，限制同时打开的下载连接数的信号量（多个下载任务共享）
+        :param segment_size: 多线程下载时的初始分片大小（字节），默认8MB
+        :param min_split_size: 拆分慢分片时每一半的最小大小（字节），默认1MB
+        :param rate_limiter: RateLimiter 实例，默认使用全局共享限速器（所有下载共用带宽上限）
+        :param checkpoint_interval: 多线程下载时保存分片进度的间隔（秒），默认5秒
+        :param timeout: 下载请求的连接/读取超时时间（秒），默认30秒
+        :param retry_interval: 多线程下载时单个分片失败后重试的间隔（秒），默认5秒；分片重试只请求该分片剩余的部分
         """
+        self.client = client or HttpClient.shared()
+        self.rate_limiter = rate_limiter or RateLimiter.shared()
+        self.connection_limiter = connection_limiter
         self.max_retries = max_retries
         self.retry_wait = retry_wait
         self.chunk_size = chunk_size
+        self.segment_size = segment_size
+        self.min_split_size = min_split_size
+        self.checkpoint_interval = checkpoint_interval
+        self.timeout = timeout
+        self.retry_interval = retry_interval
+        # 最近一次多线程下载的分片吞吐量统计
+        self.segment_stats = []
         self.logger = logging.getLogger()
+        self._aborted = threading.Event()
+        # 进行中的按偏移写入下载的分片队列
+        self._queues = set()
+        with DownloadUtil._instances_lock:
+            DownloadUtil._instances.add(self)
 
-    def download_file(self, url, path):
+    def abort(self):
         """
-        下载文件并保存到指定路径，支持断点续传
+        中止该实例所有进行中的下载：分片队列不再分配和写入数据，顺序下载在收到下一块数据时停止，不再重试
+        """
+        self._aborted.set()
+        for queue in list(self._queues):
+            queue.abort()
 
-        :param url: 要下载的文件 URL
+    @classmethod
+    def abort_all(cls):
+        """
+        中止进程内所有进行中的下载（如收到退出信号时）
+        """
+        with cls._instances_lock:
+            instances = list(cls._instances)
+        for instance in instances:
+            instance.abort()
+
+    def _check_aborted(self):
+        if self._aborted.is_set():
+            raise IOError("下载已中止")
+
+    def download_file(self, url, path, expected_hashes=None, refresh_url=None):
+        """
+        下载文件并保存到指定路径，支持断点续传，下载的同时计算 SHA-256 / MD5
+
+        :param url: 要下载的文件 URL（或 SignedUrl）
         :param path: 本地保存路径（含文件名）
+        :param expected_hashes: 可选，期望的哈希值，如 {'sha256': '...'}，不一致时下载失败
+        :param refresh_url: 可选，无参回调，下载地址过期（401/403）时返回新的下载地址
+        :return: {算法: 十六进制摘要}
         """
-        self.logger.info(f"准备下载文件：{url} 至 {path}")
+        signed = url if isinstance(url, SignedUrl) else SignedUrl(url, refresh_url)
+        self.logger.info(f"准备下载文件：{signed.url} 至 {path}")
 
         # 创建目标目录（如果不存在）
         os.makedirs(os.path.dirname(path), exist_ok=True)
 
         temp_file = path + ".tmp"
-        mode = 'ab' if os.path.exists(temp_file) else 'wb'
-        headers = {}
+        began = time.perf_counter()
+        transferred = AtomicCounter(0)
 
-        downloaded_size = 0
-        if os.path.exists(temp_file):
-            downloaded_size = os.path.getsize(temp_file)
-            headers['Range'] = f'bytes={downloaded_size}-'
-
-        @retry(stop=stop_after_attempt(self.max_retries), wait=wait_fixed(self.retry_wait))
+        @retry(stop=stop_after_attempt(self.max_retries), wait=wait_fixed(self.retry_wait),
+               retry=retry_if_exception(lambda e: not self._aborted.is_set()),
+               before_sleep=lambda retry_state: metrics.inc('liblib_download_retries_total'))
         def do_download():
             """
             实际执行下载的方法，使用装饰器添加重试机制
             """
-            with requests.get(url, stream=True, headers=headers, timeout=30) as r:
-                r.raise_for_status()
-                total_size = int(r.headers.get('Content-Length', 0)) + downloaded_size
-
-                with open(temp_file, mode) as f, tqdm(
-                        desc=os.path.basename(path),
-                        total=total_size,
-                        unit='B',
-                        unit_scale=True,
-                        unit_divisor=1024,
-                        initial=downloaded_size,
-                        colour='green'
-                ) as bar:
-                    for chunk in r.iter_content(chunk_size=self.chunk_size):
-                        if chunk:
-                            f.write(chunk)
-                            bar.update(len(chunk))
-
-            # 下载完成后重命名临时文件为目标文件
-            if os.path.exists(temp_file):
-                os.rename(temp_file, path)
-            self.logger.info("✅ 下载完成")
+            # 每次尝试都按临时文件的实际大小续传
+            downloaded_size = os.path.getsize(temp_file) if os.path.exists(temp_file) else 0
+            headers = {'Range': f'bytes={downloaded_size}-'} if downloaded_size else {}
+
+            with self._connection_slot():
+                r = self._open(signed, stream=True, headers=headers, timeout=self.timeout)
+                if downloaded_size and r.status_code == 416:
+                    # 临时文件不小于远程文件（如多线程下载预分配的文件）：与期望哈希一致时已是完整文件，
+                    # 否则删除后在本次尝试中从头下载，不占用重试次数
+                    remote_size = _content_range_size(r)
+                    r.close()
+                    if expected_hashes and remote_size in (None, downloaded_size):
+                        hasher = StreamHasher()
+                        hasher.update_from_file(temp_file)
+                        hashes = hasher.hexdigests()
+                        if not verify_hashes(hashes, expected_hashes) and any(n in hashes for n in expected_hashes):
+                            self.logger.info(f"临时文件已完整且校验一致，无需重新下载: {temp_file}")
+                            return hashes
+                    os.remove(temp_file)
+                    self.logger.warning(f"临时文件无法续传，已删除后重新下载: {temp_file}")
+                    downloaded_size = 0
+                    r = self._open(signed, stream=True, timeout=self.timeout)
+                with r:
+                    r.raise_for_status()
+                    # 服务端不支持续传时返回完整文件，从头写入
+                    if downloaded_size and r.status_code != 206:
+                        downloaded_size = 0
+                    mode = 'ab' if downloaded_size else 'wb'
+                    total_size = int(r.headers.get('Content-Length', 0)) + downloaded_size
+
+                    hasher = StreamHasher()
+                    if downloaded_size:
+                        # 续传时补算已下载部分的哈希
+                        hasher.update_from_file(temp_file, downloaded_size)
+
+                    with open(temp_file, mode) as f, tqdm(
+                            desc=os.path.basename(path),
+                            total=total_size,
+                            unit='B',
+                            unit_scale=True,
+                            unit_divisor=1024,
+                            initial=downloaded_size,
+                            colour='green'
+                    ) as bar, self._progress_reporter(bar) as reporter:
+                        counter = reporter.counter()
+                        try:
+                            for data in _iter_into(r, bytearray(self.chunk_size)):
+                                self._check_aborted()
+                                f.write(data)
+                                hasher.update(data)
+                                counter.value += len(data)
+                                self.rate_limiter.acquire_bytes(len(data))
+                        finally:
+                            transferred.add(counter.value)
+            return hasher.hexdigests()
 
         try:
-            do_download()
+            hashes = do_download()
+            self._check_hashes(hashes, expected_hashes, temp_file)
         except Exception as e:
             self.logger.error(f"❌ 下载失败: {e}")
+            metrics.inc('liblib_download_files_total', status='failed')
             raise
 
+        # 下载完成后重命名临时文件为目标文件
+        if os.path.exists(temp_file):
+            os.replace(temp_file, path)
+        self._record_throughput(transferred.value, began)
+        self.logger.info("✅ 下载完成")
+        return hashes
+
+    def _progress_reporter(self, progress_bar):
+        """
+        创建进度汇报器：下载线程只累加本地计数，由汇报线程统一更新进度条和已下载字节数指标
+        """
+        return ProgressReporter(progress_bar,
+                                on_progress=lambda delta: metrics.inc('liblib_download_bytes_total', delta))
+
+    def _record_throughput(self, transferred, began):
+        """
+        记录一个文件下载完成及其整体速度
+        """
+        metrics.inc('liblib_download_files_total', status='done')
+        seconds = time.perf_counter() - began
+        if transferred and seconds > 0:
+            metrics.observe('liblib_download_throughput_bytes_per_second', transferred / seconds)
+
+    def _check_hashes(self, hashes, expected_hashes, temp_file):
+        """
+        校验下载结果的哈希值，不一致时删除临时文件并抛出异常
+        """
+        mismatched = verify_hashes(hashes, expected_hashes)
+        if mismatched:
+            os.remove(temp_file)
+            raise IOError(f"文件校验失败（{', '.join(mismatched)}），期望 {expected_hashes}，实际 {hashes}")
+        self.logger.info(f"文件 SHA-256: {hashes.get('sha256')}")
+
+    def _open(self, signed, method='GET', **kwargs):
+        """
+        请求下载地址，签名过期（401/403）时重新获取地址后重试
+
+        :param signed: SignedUrl
+        :return: Response（由调用方关闭）
+        """
+        return signed.request(self.client, method, **kwargs)
+
+    def _connection_slot(self):
+        """
+        占用一个下载连接名额，未设置连接限制时不做限制
+        """
+        return _ConnectionSlot(self.connection_limiter)
+
     def verify_md5(self, file_path, expected_md5=None):
         """
         校验文件 MD5 值是否与预期一致
@@ -122,11 +350,12 @@ class DownloadUtil:
         """
         获取远程文件的 Content-Length
 
-        :param url: 文件地址
+        :param url: 文件地址（或 SignedUrl）
         :return: 文件大小（字节）或 None
         """
+        signed = url if isinstance(url, SignedUrl) else SignedUrl(url)
         try:
-            with requests.head(url, timeout=10) as r:
+            with self._open(signed, 'HEAD', allow_redirects=False, timeout=10) as r:
                 r.raise_for_status()
                 return int(r.headers.get('Content-Length', 0))
         except Exception as e:
@@ -147,21 +376,55 @@ class DownloadUtil:
             return self.verify_md5(path, expected_md5)
         return True
 
-    def download_file_multi_threaded(self, url, path, num_threads=4):
-        self.logger.info(f"【多线程下载】准备下载文件：{url} 至 {path}")
+    def download_file_multi_threaded(self, url, path, num_threads=4, in_place=True, expected_hashes=None,
+                                     checkpoint=None, refresh_url=None):
+        """
+        多线程分片下载文件
+
+        :param url: 要下载的文件 URL
+        :param path: 本地保存路径（含文件名）
+        :param num_threads: 分片（线程）数
+        :param in_place: True 时预分配目标临时文件，把文件切成小分片由各线程从队列领取并按偏移直接写入，
+                         空闲线程会拆分剩余最多的分片接手，完成后原子重命名；
+                         False 时按线程数均分为固定分片，各分片写入独立的 part 文件，最后合并
+        :param expected_hashes: 可选，期望的哈希值，如 {'sha256': '...'}，不一致时下载失败
+        :param checkpoint: 可选，SegmentCheckpoint，in_place 时定期保存尚未写入的区间，
+                           临时文件与记录一致时只下载剩余区间
+        :param refresh_url: 可选，无参回调，下载地址过期（401/403）时返回新的下载地址，
+                            所有分片共用，只刷新一次后继续下载各自剩余的区间
+        :return: {算法: 十六进制摘要}
+        """
+        signed = url if isinstance(url, SignedUrl) else SignedUrl(url, refresh_url)
+        self.logger.info(f"【多线程下载】准备下载文件：{signed.url} 至 {path}")
         os.makedirs(os.path.dirname(path), exist_ok=True)
 
-        total_size = self.get_remote_file_size(url)
+        total_size = self.get_remote_file_size(signed)
         if not total_size:
             self.logger.warning("无法获取文件大小，切换为单线程下载")
-            self.download_file(url, path)
-            return
+            return self.download_file(signed, path, expected_hashes=expected_hashes)
+        # 中止后不再为排队的下载预分配临时文件
+        self._check_aborted()
 
         temp_file = path + ".tmp"
+        began = time.perf_counter()
         part_files = [f"{temp_file}.part{i}" for i in range(num_threads)]
         ranges = self._split_ranges(total_size, num_threads)
 
-        # 初始化全局进度条和计数器
+        fd = None
+        resume_ranges = None
+        if in_place:
+            if checkpoint is not None and os.path.exists(temp_file) and os.path.getsize(temp_file) == total_size:
+                resume_ranges = checkpoint.load(total_size)
+            fd = os.open(temp_file, os.O_RDWR | os.O_CREAT | getattr(os, 'O_BINARY', 0), 0o644)
+            # 预分配：开始传输前一次性为临时文件分配完整的磁盘空间，空间不足时立即失败，文件也不易产生碎片
+            try:
+                preallocate(fd, total_size)
+            except Exception:
+                os.close(fd)
+                metrics.inc('liblib_download_files_total', status='failed')
+                raise
+
+        # 初始化全局进度条，各线程只累加本地计数，由汇报线程定时汇总更新
         progress_bar = tqdm(
             total=total_size,
             unit='B',
@@ -171,26 +434,153 @@ class DownloadUtil:
             leave=True,
             colour='blue'
         )
-        counter = AtomicCounter(0)
+        reporter = self._progress_reporter(progress_bar).start()
+
+        queue = None
+        hasher = None
+        checkpointer = None
+        if in_place:
+            # 切成较小的分片放入共享队列，至少保证每个线程都有分片可领
+            segment_size = max(self.min_split_size, min(self.segment_size, -(-total_size // num_threads)))
+            queue = SegmentQueue(total_size, segment_size=segment_size, min_split_size=self.min_split_size,
+                                 ranges=resume_ranges)
+            self._queues.add(queue)
+            if self._aborted.is_set():
+                queue.abort()
+            # 分片乱序写入，哈希由后台线程按文件顺序计算
+            hasher = OrderedHasher(lambda offset, length: _pread(fd, length, offset), total_size)
+            if resume_ranges is not None:
+                # 续传：已写入的区间由哈希线程从文件读取补算
+                written = self._complement_ranges(resume_ranges, total_size)
+                for start, end in written:
+                    hasher.mark_written(start, end - start + 1)
+                resumed = sum(end - start + 1 for start, end in written)
+                reporter.counter().resumed += resumed
+                self.logger.info(f"从断点继续下载，已完成 {resumed}/{total_size} 字节，"
+                                 f"剩余 {len(resume_ranges)} 个区间")
+            if checkpoint is not None:
+                def save_checkpoint():
+                    # 先取区间再落盘：保存的区间之外的数据一定已写入磁盘
+                    ranges = queue.remaining_ranges()
+                    os.fsync(fd)
+                    checkpoint.save(total_size, ranges)
+
+                checkpointer = _Checkpointer(save_checkpoint, self.checkpoint_interval).start()
+                checkpoint.register(save_checkpoint)
 
         def task(i, start, end):
-            self._download_segment(start, end, url, part_files[i], i, total_size, progress_bar, counter)
-
-        with ThreadPoolExecutor(max_workers=num_threads) as executor:
-            futures = [
-                executor.submit(task, i, start, end)
-                for i, (start, end) in enumerate(ranges)
-            ]
-            for future in as_completed(futures):
+            attempts = 0
+
+            def download():
+                nonlocal attempts
+                attempts += 1
+                # 分片文件按已有大小续传，重试时分片文件中已有的数据已计入进度
+                self._download_segment(start, end, signed, part_files[i], i, total_size, reporter,
+                                       count_resumed=attempts == 1)
+
+            self._retry_segment(f"分片 {i}", download)
+
+        def worker():
+            try:
+                self._segment_worker(queue, signed, fd, total_size, reporter, hasher)
+            except Exception:
+                queue.abort()
+                raise
+
+        try:
+            with ThreadPoolExecutor(max_workers=num_threads) as executor:
+                if in_place:
+                    futures = [executor.submit(worker) for _ in range(num_threads)]
+                else:
+                    futures = [
+                        executor.submit(task, i, start, end)
+                        for i, (start, end) in enumerate(ranges)
+                    ]
                 try:
-                    future.result()
-                except Exception as e:
-                    self.logger.error(f"❌ 分片下载异常: {e}")
+                    for future in as_completed(futures):
+                        try:
+                            future.result()
+                        except Exception as e:
+                            self.logger.error(f"❌ 分片下载异常: {e}")
+                            raise
+                except (SystemExit, KeyboardInterrupt):
+                    # 调用线程收到退出信号时让分片线程尽快停止，线程池退出时不必等待下载完成
+                    self.abort()
                     raise
+            if in_place:
+                if not queue.is_complete():
+                    raise IOError("分片下载未完成")
+                hashes = hasher.finish()
+                os.fsync(fd)
+        except Exception:
+            metrics.inc('liblib_download_files_total', status='failed')
+            raise
+        finally:
+            if checkpointer is not None:
+                checkpoint.unregister()
+                checkpointer.stop()
+            if hasher is not None:
+                hasher.close()
+            if queue is not None:
+                self._queues.discard(queue)
+            if fd is not None:
+                os.close(fd)
+            reporter.stop()
+            progress_bar.close()
+
+        if in_place:
+            if checkpoint is not None:
+                checkpoint.clear()
+            self._check_hashes(hashes, expected_hashes, temp_file)
+            os.replace(temp_file, path)
+            self.segment_stats = queue.stats()
+            self._log_segment_stats(self.segment_stats)
+            for s in self.segment_stats:
+                if s['bytes'] > 0 and s['bytes_per_second']:
+                    metrics.observe('liblib_segment_throughput_bytes_per_second', s['bytes_per_second'])
+            self._record_throughput(reporter.transferred, began)
+            self.logger.info("✅ 多线程下载完成")
+        else:
+            # 合并分片时顺序读取，顺带计算哈希
+            hashes = self._merge_parts(part_files, temp_file)
+            self._check_hashes(hashes, expected_hashes, temp_file)
+            os.replace(temp_file, path)
+            self._record_throughput(reporter.transferred, began)
+            self.logger.info("✅ 多线程下载完成，并已合并文件")
+        return hashes
+
+    @staticmethod
+    def _complement_ranges(ranges, total_size):
+        """
+        文件中不在 ranges 内的区间
 
-        progress_bar.close()
-        self._merge_parts(part_files, path)
-        self.logger.info("✅ 多线程下载完成，并已合并文件")
+        :param ranges: 已排序、互不重叠的 [(start, end), ...]
+        :return: [(start, end), ...]
+        """
+        result = []
+        pos = 0
+        for start, end in sorted(ranges):
+            if start > pos:
+                result.append((pos, start - 1))
+            pos = max(pos, end + 1)
+        if pos < total_size:
+            result.append((pos, total_size - 1))
+        return result
+
+    def _log_segment_stats(self, stats):
+        """
+        输出分片吞吐量统计：每个分片的速度记为 DEBUG，汇总记为 INFO
+        """
+        speeds = [s['bytes_per_second'] for s in stats if s['bytes'] > 0]
+        for s in stats:
+            self.logger.debug(
+                f"【分片 {s['index']}】{s['start']}-{s['end']}，{s['bytes']} 字节，"
+                f"{s['seconds']} 秒，{s['bytes_per_second'] / 1024 / 1024:.2f} MB/s")
+        if speeds:
+            splits = sum(1 for s in stats if s['split_from'] is not None)
+            self.logger.info(
+                f"分片统计：共 {len(stats)} 个分片（拆分 {splits} 次），"
+                f"速度 {min(speeds) / 1024 / 1024:.2f} ~ {max(speeds) / 1024 / 1024:.2f} MB/s")
 
     def _split_ranges(self, total_size, num_parts):
         """
@@ -210,58 +600,204 @@ class DownloadUtil:
 
         return ranges
 
-    def _download_segment(self, start_byte, end_byte, url, part_file, part_num, total_size, progress_bar, counter):
+    def _download_segment(self, start_byte, end_byte, signed, part_file, part_num, total_size, reporter,
+                          count_resumed=True):
         """
         下载指定范围的文件内容，并更新全局进度条
 
         :param start_byte: 开始位置
         :param end_byte: 结束位置
-        :param url: 文件地址
+        :param signed: 文件地址（SignedUrl）
         :param part_file: 临时文件路径
         :param part_num: 分片编号
         :param total_size: 文件总大小
-        :param progress_bar: 全局进度条对象
-        :param counter: 原子计数器
+        :param reporter: 进度汇报器，只累加当前线程的本地计数
+        :param count_resumed: 是否把分片文件中已有的数据计入进度（重试时已计入）
         """
-        headers = {'Range': f'bytes={start_byte}-{end_byte}'}
+        counter = reporter.counter()
 
         downloaded = 0
         if os.path.exists(part_file):
             downloaded = os.path.getsize(part_file)
-            counter.add(downloaded)
-            progress_bar.update(downloaded)
+            if downloaded > end_byte - start_byte + 1:
+                # 分片划分已变化（如线程数不同），旧分片文件不可用
+                os.remove(part_file)
+                downloaded = 0
+            if count_resumed:
+                counter.resumed += downloaded
             if downloaded == end_byte - start_byte + 1:
                 self.logger.info(f"【分片 {part_num}】文件已存在，跳过下载")
                 return
+        # 已下载的部分保留在分片文件中，只请求剩余部分并追加写入
+        headers = {'Range': f'bytes={start_byte + downloaded}-{end_byte}'}
 
-        with requests.get(url, stream=True, headers=headers, timeout=30) as r:
+        with self._connection_slot(), self._open(signed, stream=True, headers=headers, timeout=self.timeout) as r:
             r.raise_for_status()
-            with open(part_file, 'wb') as f:
-                for chunk in r.iter_content(chunk_size=self.chunk_size):
-                    if chunk:
-                        f.write(chunk)
-                        chunk_len = len(chunk)
-                        counter.add(chunk_len)
-                        progress_bar.update(chunk_len)
+            if r.status_code != 206 and not (start_byte + downloaded == 0 and end_byte == total_size - 1):
+                raise IOError(f"服务端不支持分段下载，状态码: {r.status_code}")
+            with open(part_file, 'ab') as f:
+                for data in _iter_into(r, bytearray(self.chunk_size)):
+                    self._check_aborted()
+                    f.write(data)
+                    counter.value += len(data)
+                    self.rate_limiter.acquire_bytes(len(data))
 
         self.logger.info(f"【分片 {part_num}】下载完成: {start_byte}-{end_byte}")
 
+    def _segment_worker(self, queue, signed, fd, total_size, reporter, hasher=None):
+        """
+        下载线程：循环从分片队列领取分片，按偏移直接写入共享的文件描述符
+
+        :param queue: 分片队列
+        :param signed: 文件地址（SignedUrl），过期时由任一线程刷新，其它线程随后领取的分片使用新地址
+        :param fd: 已预分配的目标临时文件描述符
+        :param total_size: 文件总大小
+        :param reporter: 进度汇报器，只累加当前线程的本地计数
+        :param hasher: 可选，OrderedHasher，写入后登记已写入的区间
+        """
+        counter = reporter.counter()
+        # 线程内所有分片复用同一个接收缓冲区
+        buffer = bytearray(self.chunk_size)
+        while True:
+            segment = queue.next_segment()
+            if segment is None:
+                return
+            try:
+                # 重试时从分片已写入的位置继续；其它线程已出错中止时不再重试
+                self._retry_segment(f"分片 {segment.index}",
+                                    lambda: self._download_queued_segment(segment, queue, signed, fd, total_size,
+                                                                          counter, hasher, buffer),
+                                    stop=queue.is_aborted)
+            finally:
+                queue.finish(segment)
+
+    def _retry_segment(self, name, download, stop=None):
+        """
+        下载单个分片，失败后间隔 retry_interval 秒重试，最多尝试 max_retries 次
+
+        :param name: 分片名称（用于日志）
+        :param download: 下载函数
+        :param stop: 可选，返回 True 时不再重试
+        """
+        attempt = 1
+        while True:
+            try:
+                return download()
+            except Exception as e:
+                if attempt >= self.max_retries or self._aborted.is_set() or (stop is not None and stop()):
+                    raise
+                self.logger.warning(f"【{name}】下载失败（第 {attempt} 次）: {e}，{self.retry_interval} 秒后重试")
+                metrics.inc('liblib_download_retries_total')
+                attempt += 1
+                time.sleep(self.retry_interval)
+
+    def _download_queued_segment(self, segment, queue, signed, fd, total_size, counter, hasher, buffer):
+        # 请求到领取时的 end 为止；下载过程中 end 可能被其它线程拆分缩短，以 queue.advance 的返回为准
+        headers = {'Range': f'bytes={segment.pos}-{segment.end}'}
+
+        with self._connection_slot(), self._open(signed, stream=True, headers=headers, timeout=self.timeout) as r:
+            r.raise_for_status()
+            # 服务端忽略 Range 时返回的是整个文件，不能写入到分片偏移处
+            if r.status_code != 206 and not (segment.pos == 0 and segment.end == total_size - 1):
+                raise IOError(f"服务端不支持分段下载，状态码: {r.status_code}")
+            for data in _iter_into(r, buffer):
+                offset = segment.pos
+                allowed = queue.advance(segment, len(data))
+                if allowed:
+                    _pwrite(fd, data[:allowed], offset)
+                    queue.commit(segment, offset + allowed)
+                    if hasher is not None:
+                        # 缓冲区会被下一次读取覆盖，哈希线程从文件（页缓存）读取这段数据
+                        hasher.mark_written(offset, allowed)
+                    counter.value += allowed
+                    self.rate_limiter.acquire_bytes(allowed)
+                if allowed < len(data) or segment.remaining() <= 0:
+                    break
+
+        if segment.remaining() > 0:
+            raise IOError(f"【分片 {segment.index}】数据不完整: {segment.pos}-{segment.end}")
+        self.logger.debug(f"【分片 {segment.index}】下载完成: {segment.start}-{segment.end}")
+
     def _merge_parts(self, part_files, final_path):
         """
-        合并所有分片文件为完整文件
+        合并所有分片文件为完整文件，合并的同时计算哈希
 
         :param part_files: 所有分片文件路径列表
         :param final_path: 最终输出路径
+        :return: {算法: 十六进制摘要}
         """
+        hasher = StreamHasher()
+        view = memoryview(bytearray(1024 * 1024))
         with open(final_path, 'wb') as final_file:
             for idx, part_file in enumerate(part_files):
                 self.logger.info(f"正在合并分片 {idx + 1}/{len(part_files)}: {part_file}")
                 with open(part_file, 'rb') as pf:
                     while True:
-                        chunk = pf.read(1024 * 1024)
-                        if not chunk:
+                        n = pf.readinto(view)
+                        if not n:
                             break
-                        final_file.write(chunk)
+                        final_file.write(view[:n])
+                        hasher.update(view[:n])
                 os.remove(part_file)  # 删除临时分片文件
         self.logger.info("✅ 所有分片已合并")
+        return hasher.hexdigests()
+
+
+class _Checkpointer:
+    """
+    定时保存下载进度的后台线程
+    """
+
+    def __init__(self, save, interval):
+        self.save = save
+        self.interval = interval
+        self.logger = logging.getLogger()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._save()
+
+    def _save(self):
+        try:
+            self.save()
+        except Exception as e:
+            self.logger.warning(f"保存下载进度失败: {e}")
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='download-checkpoint', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """
+        停止定时保存，并保存最后一次进度
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self._save()
+
+
+class _ConnectionSlot:
+    """
+    下载连接名额：可选的全局连接数限制，同时统计正在传输的连接数
+    """
+
+    _active = AtomicCounter(0)
+
+    def __init__(self, limiter=None):
+        self.limiter = limiter
+
+    def __enter__(self):
+        if self.limiter is not None:
+            self.limiter.acquire()
+        metrics.set('liblib_download_active_connections', self._active.add(1))
+        return self
 
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        metrics.set('liblib_download_active_connections', self._active.add(-1))
+        if self.limiter is not None:
+            self.limiter.release()
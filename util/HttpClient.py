@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+"""
+HTTP 客户端工具类
+
+对 requests.Session 做统一封装，供接口调用和文件下载共用，支持：
+- keep-alive 连接池复用
+- 按主机限制连接数
+- 默认请求头与默认超时
+- 连接池命中/未命中统计
+"""
+
+import logging
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from util.AtomicCounter import AtomicCounter
+
+DEFAULT_USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/89.0.4389.90 Safari/537.36'
+
+
+class _PoolStatsAdapter(HTTPAdapter):
+    """
+    统计连接复用情况的 HTTPAdapter：
+    从连接池取出的连接已建立 socket 记为命中，需要重新握手记为未命中
+    """
+
+    def __init__(self, hits, misses, **kwargs):
+        self.hits = hits
+        self.misses = misses
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        adapter = self
+
+        def counting(pool_cls):
+            class CountingPool(pool_cls):
+                def _get_conn(self, timeout=None):
+                    conn = super()._get_conn(timeout=timeout)
+                    if getattr(conn, 'sock', None) is not None:
+                        adapter.hits.add(1)
+                    else:
+                        adapter.misses.add(1)
+                    return conn
+
+            return CountingPool
+
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': counting(HTTPConnectionPool),
+            'https': counting(HTTPSConnectionPool),
+        }
+
+
+class HttpClient:
+    """
+    共享的 HTTP 客户端，所有 liblib 接口请求与模型下载都应通过同一个实例发出，
+    以便复用 TCP/TLS 连接。
+    """
+
+    _shared = None
+    _shared_lock = threading.Lock()
+
+    def __init__(self, pool_connections=10, pool_maxsize=32, connect_timeout=10, read_timeout=60, headers=None):
+        """
+        初始化 HTTP 客户端
+
+        :param pool_connections: 缓存连接池的主机数，默认10
+        :param pool_maxsize: 每个主机最多保持的连接数，默认32
+        :param connect_timeout: 默认连接超时时间（秒）
+        :param read_timeout: 默认读取超时时间（秒）
+        :param headers: 额外的默认请求头
+        """
+        self.timeout = (connect_timeout, read_timeout)
+        self.requests_count = AtomicCounter(0)
+        self.pool_hits = AtomicCounter(0)
+        self.pool_misses = AtomicCounter(0)
+        self.logger = logging.getLogger()
+
+        self.session = requests.Session()
+        self.session.headers.update({'User-Agent': DEFAULT_USER_AGENT})
+        if headers:
+            self.session.headers.update(headers)
+        # pool_block=True：同一主机的连接数达到上限时等待空闲连接，而不是额外新建
+        adapter = _PoolStatsAdapter(self.pool_hits, self.pool_misses, pool_connections=pool_connections,
+                                    pool_maxsize=pool_maxsize, pool_block=True)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    @classmethod
+    def shared(cls):
+        """
+        获取全局共享的客户端实例，未设置时使用默认参数创建
+        """
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls()
+            return cls._shared
+
+    @classmethod
+    def set_shared(cls, client):
+        """
+        设置全局共享的客户端实例
+        """
+        with cls._shared_lock:
+            cls._shared = client
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        self.requests_count.add(1)
+        return self.session.request(method, url, **kwargs)
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def head(self, url, **kwargs):
+        kwargs.setdefault('allow_redirects', False)
+        return self.request('HEAD', url, **kwargs)
+
+    def stats(self):
+        """
+        连接池统计信息
+
+        :return: dict，包含请求数、连接复用次数（命中）和新建连接次数（未命中）
+        """
+        return {
+            'requests': self.requests_count.value,
+            'pool_hits': self.pool_hits.value,
+            'pool_misses': self.pool_misses.value,
+        }
+
+    def log_stats(self):
+        stats = self.stats()
+        self.logger.info(
+            f"连接池统计：请求 {stats['requests']} 次，复用连接 {stats['pool_hits']} 次，新建连接 {stats['pool_misses']} 次")
+
+    def close(self):
+        self.session.close()
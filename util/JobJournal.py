@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+"""
+下载任务日志
+
+在 SQLite 中记录每个模型的下载阶段，进程中断后重新运行可从中断处继续：
+- resolved：已获取模型信息
+- url：已获取下载地址（保存完整的下载信息，恢复时无需再次请求接口）
+- downloading：下载中，定期记录各分片尚未写入的字节区间
+- verified：文件已下载并通过校验
+- done：已写入已下载记录
+- unavailable：无法下载（没有附件、下载校验失败或没有下载权限），不再自动继续，重新提交该模型时再次解析
+"""
+
+import json
+import logging
+import threading
+import time
+
+RESOLVED = 'resolved'
+URL_OBTAINED = 'url'
+DOWNLOADING = 'downloading'
+VERIFIED = 'verified'
+DONE = 'done'
+UNAVAILABLE = 'unavailable'
+
+# 恢复时可以直接复用下载信息的阶段
+RESUMABLE_STAGES = (URL_OBTAINED, DOWNLOADING, VERIFIED)
+# 已结束的阶段，继续未完成的任务时不再处理
+FINISHED_STAGES = (DONE, UNAVAILABLE)
+
+
+class SegmentCheckpoint:
+    """
+    单个模型文件的分片进度：保存尚未写入的字节区间
+    """
+
+    def __init__(self, journal, model_uuid):
+        self.journal = journal
+        self.model_uuid = model_uuid
+
+    def load(self, total_size):
+        """
+        读取上次记录的未完成区间
+
+        :param total_size: 文件总大小，与记录不一致时（文件已变化）视为没有记录
+        :return: [(start, end), ...]，没有记录时返回 None
+        """
+        row = self.journal.db.get_job_segments(self.model_uuid)
+        if row is None or row[0] != total_size:
+            return None
+        return [tuple(r) for r in json.loads(row[1])]
+
+    def exists(self):
+        """
+        是否有上次多线程下载留下的分片进度
+        """
+        return self.journal.db.get_job_segments(self.model_uuid) is not None
+
+    def save(self, total_size, ranges):
+        """
+        记录未完成区间（调用前应保证区间以外的数据已经落盘）
+        """
+        self.journal.db.put_job_segments(self.model_uuid, total_size, json.dumps(ranges), time.time())
+
+    def clear(self):
+        self.journal.db.delete_job_segments(self.model_uuid)
+
+    def register(self, flush_fn):
+        """
+        登记正在进行的下载，收到退出信号时由 JobJournal.flush 调用 flush_fn 立即保存进度
+        """
+        self.journal.register_active(self.model_uuid, flush_fn)
+
+    def unregister(self):
+        self.journal.unregister_active(self.model_uuid)
+
+
+class JobJournal:
+    """
+    任务日志：阶段与下载信息持久化在 download_jobs 表，分片进度在 download_segments 表
+    """
+
+    def __init__(self, db):
+        """
+        :param db: SQLiteDB 实例
+        """
+        self.db = db
+        self.logger = logging.getLogger()
+        self._lock = threading.Lock()
+        self._active = {}
+
+    def get(self, model_uuid):
+        """
+        读取任务记录
+
+        :return: dict(stage, payload, error)，没有记录时返回 None
+        """
+        row = self.db.get_job(model_uuid)
+        if row is None:
+            return None
+        return {'stage': row[0], 'payload': json.loads(row[1]) if row[1] else None, 'error': row[2]}
+
+    def resumable_payload(self, model_uuid):
+        """
+        已获取下载地址但尚未完成的任务的下载信息，可直接用于继续下载
+
+        :return: 下载信息 dict，不可恢复时返回 None
+        """
+        job = self.get(model_uuid)
+        if job and job['stage'] in RESUMABLE_STAGES and job['payload']:
+            return job['payload']
+        return None
+
+    def record(self, model_uuid, stage, payload=None):
+        """
+        记录任务进入某个阶段；payload 为 None 时保留已有的下载信息
+        """
+        self.db.put_job(model_uuid, stage, json.dumps(payload, ensure_ascii=False) if payload is not None else None,
+                        time.time())
+
+    def fail(self, model_uuid, error):
+        """
+        记录失败原因，保留当前阶段以便下次继续
+        """
+        self.db.set_job_error(model_uuid, str(error), time.time())
+
+    def unavailable(self, model_uuid, reason):
+        """
+        记录模型无法下载及原因，结束该任务
+        """
+        self.record(model_uuid, UNAVAILABLE)
+        self.fail(model_uuid, reason)
+
+    def unfinished(self):
+        """
+        所有未完成的任务（不含已完成和无法下载的任务）
+
+        :return: 模型 uuid 列表，按最近更新时间排序
+        """
+        return self.db.get_unfinished_jobs(FINISHED_STAGES)
+
+    def model_paths(self):
+        """
+        所有任务记录的模型文件路径
+
+        :return: {model_uuid: (stage, model_path)}，尚未获取下载地址的任务没有路径
+        """
+        paths = {}
+        for model_uuid, stage, payload in self.db.get_jobs():
+            model_path = (json.loads(payload) or {}).get('model_path') if payload else None
+            if model_path:
+                paths[model_uuid] = (stage, model_path)
+        return paths
+
+    def segment_checkpoint(self, model_uuid):
+        return SegmentCheckpoint(self, model_uuid)
+
+    def register_active(self, model_uuid, flush_fn):
+        with self._lock:
+            self._active[model_uuid] = flush_fn
+
+    def unregister_active(self, model_uuid):
+        with self._lock:
+            self._active.pop(model_uuid, None)
+
+    def flush(self):
+        """
+        立即保存所有正在进行的下载的分片进度（退出前调用）
+        """
+        with self._lock:
+            active = list(self._active.items())
+        for model_uuid, flush_fn in active:
+            try:
+                flush_fn()
+            except Exception as e:
+                self.logger.warning(f"保存下载进度失败（{model_uuid}）: {e}")
+        if active:
+            self.logger.info(f"已保存 {len(active)} 个下载任务的进度")
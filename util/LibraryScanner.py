@@ -0,0 +1,346 @@
+# -*- coding: utf-8 -*-
+"""
+本地模型库完整性检查
+
+遍历各模型类型目录，在多个进程中用内存映射读取文件计算哈希，并与数据库中的已下载记录对照：
+- ok：记录与文件一致（有期望哈希时已校验）
+- missing：已记为下载完成，但文件不存在
+- corrupt：文件哈希与下载时记录或模型信息中的哈希不一致
+- orphaned：目录中的模型文件没有对应的下载记录
+- partial：未完成下载留下的临时文件（.tmp / .tmp.partN），有未完成的任务时可继续下载，否则为残留文件
+
+文件哈希按 (路径, 大小, 修改时间) 缓存在数据库中，之后的检查只重新计算有变化的文件。
+启用内容寻址存储（BlobStore）时，与损坏文件为同一文件（硬链接）的其它路径同样记为损坏，
+修正时连同存储中的实体一起删除，下次下载不会再链接到损坏的内容。
+"""
+
+import json
+import logging
+import mmap
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from util.StreamHasher import StreamHasher, verify_hashes
+
+OK = 'ok'
+MISSING = 'missing'
+CORRUPT = 'corrupt'
+ORPHANED = 'orphaned'
+PARTIAL = 'partial'
+
+# 下载中的临时文件：单线程/按偏移写入的 .tmp，分片文件 .tmp.partN
+TEMP_FILE_PATTERN = re.compile(r'\.tmp(\.part\d+)?$')
+# 与模型文件同名的附属文件（模型信息、封面）以及检查时移开的损坏文件，不作为模型文件
+SIDECAR_SUFFIXES = ('.json', '.png', '.jpg', '.jpeg', '.webp', '.gif', '.corrupt')
+# 示例图片目录的后缀
+IMAGE_DIR_SUFFIX = '_images'
+
+
+def hash_file(path, algorithms=('sha256',), block_size=8 * 1024 * 1024):
+    """
+    用内存映射读取文件计算哈希（在进程池中执行）
+
+    :param path: 文件路径
+    :param algorithms: 哈希算法
+    :param block_size: 每次交给哈希函数的字节数
+    :return: (路径, 大小, 修改时间（纳秒）, {算法: 十六进制摘要})
+    """
+    hasher = StreamHasher(algorithms)
+    with open(path, 'rb') as f:
+        st = os.fstat(f.fileno())
+        if st.st_size:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                if hasattr(mm, 'madvise') and hasattr(mmap, 'MADV_SEQUENTIAL'):
+                    mm.madvise(mmap.MADV_SEQUENTIAL)
+                # 按块取 memoryview 切片，不复制文件数据
+                with memoryview(mm) as view:
+                    for offset in range(0, st.st_size, block_size):
+                        with view[offset:offset + block_size] as block:
+                            hasher.update(block)
+    return path, st.st_size, st.st_mtime_ns, hasher.hexdigests()
+
+
+class LibraryScanner:
+    """
+    模型目录与已下载记录的对照检查
+    """
+
+    def __init__(self, db, journal, root, directories, workers=None, expected_hashes=None, blob_store=None):
+        """
+        :param db: SQLiteDB 实例
+        :param journal: JobJournal 实例，用于判断临时文件是否属于未完成的任务
+        :param root: 模型存放父级路径（model_parent_path，与下载时一样直接拼接目录名）
+        :param directories: {模型类型值: 目录名}，即各 ModelType 的 file_path()
+        :param workers: 计算哈希的进程数，默认 CPU 核数
+        :param expected_hashes: 可选，函数，从模型信息中取出期望的哈希 {'sha256': ..., 'md5': ...}
+        :param blob_store: 可选，BlobStore 实例，模型文件为指向存储实体的链接时使用
+        """
+        self.db = db
+        self.journal = journal
+        self.root = root or ''
+        self.directories = directories
+        self.workers = workers or os.cpu_count() or 1
+        self.expected_hashes = expected_hashes
+        self.blob_store = blob_store
+        self.logger = logging.getLogger()
+        # 本次重新计算（未使用缓存）的文件数与字节数
+        self.hashed_files = 0
+        self.hashed_bytes = 0
+
+    def _walk(self):
+        """
+        :return: (模型文件路径列表, 临时文件路径列表)
+        """
+        model_files = []
+        temp_files = []
+        for directory in sorted(set(self.directories.values())):
+            top = f"{self.root}{directory}"
+            for dir_path, dir_names, file_names in os.walk(top):
+                dir_names[:] = [d for d in dir_names if not d.endswith(IMAGE_DIR_SUFFIX) and not d.startswith('.')]
+                for file_name in file_names:
+                    path = os.path.join(dir_path, file_name)
+                    if TEMP_FILE_PATTERN.search(file_name):
+                        temp_files.append(path)
+                    elif not file_name.lower().endswith(SIDECAR_SUFFIXES) and not file_name.startswith('.'):
+                        model_files.append(path)
+        return model_files, temp_files
+
+    def _expected_stem(self, model_info):
+        # 与下载时的文件名一致：<目录>/<模型名>(<版本名>)<扩展名>
+        directory = self.directories.get(model_info.get('modelType'))
+        if directory is None:
+            return None
+        version_name = model_info['versions'][0]['name']
+        return os.path.normpath(f"{self.root}{directory}/{model_info['name']}({version_name})")
+
+    def _expected_hashes(self, model_info, sha256=None, md5=None):
+        """
+        期望的哈希：下载时记录的哈希优先，其次为模型信息中的哈希
+        """
+        hashes = {}
+        if self.expected_hashes is not None and model_info:
+            try:
+                hashes.update(self.expected_hashes(model_info))
+            except (KeyError, IndexError, TypeError, AttributeError):
+                pass
+        if sha256:
+            hashes['sha256'] = sha256
+        if md5:
+            hashes['md5'] = md5
+        return hashes
+
+    def _hash_all(self, paths, algorithms_for, progress=True):
+        """
+        计算文件哈希，大小和修改时间未变且已有所需算法的文件直接使用缓存
+
+        :param paths: 文件路径列表
+        :param algorithms_for: 函数，返回某个文件需要计算的算法
+        :return: {path: {算法: 摘要}}
+        """
+        cache = self.db.get_file_hashes()
+        results = {}
+        todo = []
+        for path in paths:
+            algorithms = algorithms_for(path)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            cached = cache.get(path)
+            if cached and cached[0] == st.st_size and cached[1] == st.st_mtime_ns:
+                hashes = {name: value for name, value in (('sha256', cached[2]), ('md5', cached[3])) if value}
+                if all(name in hashes for name in algorithms):
+                    results[path] = hashes
+                    continue
+            todo.append((path, algorithms, st.st_size))
+
+        if todo:
+            from tqdm import tqdm
+            rows = []
+            total = sum(size for _, _, size in todo)
+            self.logger.info(f"需要计算哈希的文件 {len(todo)} 个，共 {total / 1024 / 1024:.1f} MB，"
+                             f"已缓存 {len(results)} 个")
+            with ProcessPoolExecutor(max_workers=min(self.workers, len(todo))) as executor, \
+                    tqdm(total=total, unit='B', unit_scale=True, unit_divisor=1024, desc='计算哈希',
+                         disable=not progress) as bar:
+                # 大文件先提交，避免最后只剩一个进程在算大文件
+                futures = {executor.submit(hash_file, path, algorithms): size
+                           for path, algorithms, size in sorted(todo, key=lambda item: -item[2])}
+                for future in as_completed(futures):
+                    bar.update(futures[future])
+                    try:
+                        path, size, mtime_ns, hashes = future.result()
+                    except OSError as e:
+                        self.logger.warning(f"读取文件失败: {e}")
+                        continue
+                    results[path] = hashes
+                    rows.append((path, size, mtime_ns, hashes.get('sha256'), hashes.get('md5')))
+                    self.hashed_files += 1
+                    self.hashed_bytes += size
+            self.db.put_file_hashes(rows, time.time())
+
+        # 扫描目录中已不存在的文件不再保留缓存
+        tops = tuple(os.path.normpath(f"{self.root}{d}") + os.sep for d in set(self.directories.values()))
+        self.db.delete_file_hashes([path for path in cache if path not in results and path.startswith(tops)])
+        return results
+
+    def scan(self, progress=True):
+        """
+        检查模型目录与已下载记录
+
+        :param progress: 是否显示哈希计算进度条
+        :return: 结果列表，每项为 dict(status, model_uuid, name, path, size, detail, sha256)
+        """
+        model_files, temp_files = self._walk()
+        by_stem = {}
+        for path in model_files:
+            path = os.path.normpath(path)
+            by_stem.setdefault(os.path.splitext(path)[0], path)
+            by_stem.setdefault(path, path)
+        job_paths = self.journal.model_paths()
+
+        # 已下载记录对应的文件
+        records = []
+        for model_uuid, model_name, model_info, sha256, md5 in self.db.get_downloaded_models():
+            try:
+                model_info = json.loads(model_info) if model_info else {}
+                stem = self._expected_stem(model_info)
+            except (ValueError, KeyError, IndexError, TypeError):
+                model_info, stem = {}, None
+            path = None
+            job = job_paths.get(model_uuid)
+            if job and os.path.exists(job[1]):
+                path = os.path.normpath(job[1])
+            elif stem is not None:
+                path = by_stem.get(stem)
+            records.append((model_uuid, model_name, path, self._expected_hashes(model_info, sha256, md5)))
+
+        expected_by_path = {path: hashes for _, _, path, hashes in records if path}
+
+        def algorithms_for(path):
+            # 只有 MD5 可对照时才额外计算 MD5
+            hashes = expected_by_path.get(path) or {}
+            return ('sha256', 'md5') if 'md5' in hashes and 'sha256' not in hashes else ('sha256',)
+
+        hashes_by_path = self._hash_all([os.path.normpath(p) for p in model_files], algorithms_for, progress)
+
+        results = []
+        matched = set()
+        for model_uuid, model_name, path, expected in records:
+            item = {'model_uuid': model_uuid, 'name': model_name, 'path': path, 'size': None, 'detail': None,
+                    'sha256': None}
+            if path is None or not os.path.exists(path):
+                item.update(status=MISSING, detail='已记为下载完成，但未找到模型文件')
+                results.append(item)
+                continue
+            matched.add(path)
+            actual = hashes_by_path.get(path) or {}
+            item['size'] = os.path.getsize(path)
+            item['sha256'] = actual.get('sha256')
+            mismatched = verify_hashes(actual, expected)
+            if mismatched:
+                item.update(status=CORRUPT, detail=f"{'/'.join(mismatched)} 不一致")
+            elif any(name in actual for name in expected):
+                item.update(status=OK, detail='已校验')
+            else:
+                item.update(status=OK, detail='无期望哈希，未校验')
+            item['expected'] = expected
+            results.append(item)
+
+        for path in sorted(set(hashes_by_path) - matched):
+            results.append({'status': ORPHANED, 'model_uuid': None, 'name': None, 'path': path,
+                            'size': os.path.getsize(path), 'detail': '没有对应的下载记录',
+                            'sha256': hashes_by_path[path].get('sha256')})
+        self._mark_shared_corrupt(results)
+
+        # 临时文件属于未完成的任务时可以继续下载，否则是残留文件
+        unfinished_uuids = set(self.journal.unfinished())
+        unfinished = {os.path.normpath(model_path): model_uuid for model_uuid, (stage, model_path) in job_paths.items()
+                      if model_uuid in unfinished_uuids}
+        for path in sorted(temp_files):
+            owner = unfinished.get(os.path.normpath(TEMP_FILE_PATTERN.sub('', path)))
+            try:
+                size = os.path.getsize(path)
+            except OSError:
+                continue
+            results.append({'status': PARTIAL, 'model_uuid': owner, 'name': None, 'path': path, 'size': size,
+                            'detail': '未完成的下载，可继续' if owner else '残留的临时文件', 'sha256': None})
+        return results
+
+    @staticmethod
+    def _file_id(path):
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return st.st_dev, st.st_ino
+
+    def _mark_shared_corrupt(self, results):
+        """
+        与损坏文件为同一文件（硬链接或指向同一实体的链接）的其它路径内容同样损坏，一并记为损坏
+        """
+        corrupt = {}
+        for item in results:
+            if item['status'] == CORRUPT:
+                file_id = self._file_id(item['path'])
+                if file_id is not None:
+                    corrupt.setdefault(file_id, item['path'])
+        if not corrupt:
+            return
+        for item in results:
+            if item['status'] in (OK, ORPHANED) and item['path']:
+                source = corrupt.get(self._file_id(item['path']))
+                if source is not None:
+                    item.update(status=CORRUPT, detail=f"与损坏的文件为同一文件: {source}")
+
+    def _blob_of(self, item):
+        """
+        损坏的文件对应的存储实体路径（文件不是指向存储实体的链接时返回 None）
+        """
+        if self.blob_store is None:
+            return None, None
+        file_id = self._file_id(item['path'])
+        for sha256 in dict.fromkeys(h for h in ((item.get('expected') or {}).get('sha256'), item.get('sha256')) if h):
+            blob = self.blob_store.blob_path(sha256)
+            if file_id is not None and self._file_id(blob) == file_id:
+                return sha256, blob
+        return None, None
+
+    def fix(self, results):
+        """
+        按检查结果修正数据库与目录：
+        - 缺失、损坏的模型删除已下载记录（下次运行会重新下载），损坏的文件重命名为 .corrupt，
+          损坏的文件是指向存储实体的链接时同时删除该实体及其探测指纹
+        - 已校验一致但没有记录哈希的模型补写哈希
+        - 删除不属于未完成任务的残留临时文件
+
+        :return: 修正的条目数
+        """
+        fixed = 0
+        removed = []
+        for item in results:
+            status = item['status']
+            if status in (MISSING, CORRUPT):
+                if item['model_uuid'] is not None:
+                    removed.append(item['model_uuid'])
+                if status == CORRUPT:
+                    sha256, blob = self._blob_of(item)
+                    os.replace(item['path'], item['path'] + '.corrupt')
+                    self.logger.warning(f"已移开损坏的文件: {item['path']}")
+                    if blob is not None:
+                        self.blob_store.discard(sha256)
+                fixed += 1
+            elif status == OK and item['sha256'] and not item.get('expected', {}).get('sha256'):
+                self.db.update_model_hashes(item['model_uuid'], sha256=item['sha256'],
+                                            md5=item.get('expected', {}).get('md5'))
+                fixed += 1
+            elif status == PARTIAL and item['model_uuid'] is None:
+                os.remove(item['path'])
+                self.logger.info(f"已删除残留的临时文件: {item['path']}")
+                fixed += 1
+        if removed:
+            self.db.delete_downloaded_models(removed)
+            self.logger.warning(f"已删除 {len(removed)} 条缺失或损坏的下载记录，下次运行时重新下载")
+        return fixed
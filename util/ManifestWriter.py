@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+"""
+批量下载结果清单
+
+每个任务结束时立即向清单文件追加一行 JSON（JSON Lines），
+无人值守运行时可随时查看进度，进程中断也不会丢失已完成任务的记录。
+"""
+
+import json
+import os
+import threading
+import time
+
+
+class ManifestWriter:
+    """
+    线程安全的 JSON Lines 结果清单
+    """
+
+    def __init__(self, path):
+        """
+        :param path: 清单文件路径，已存在时追加写入
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._file = open(path, 'a', encoding='utf-8')
+
+    def write(self, record):
+        """
+        追加一条记录并立即刷新到磁盘
+
+        :param record: 可 JSON 序列化的 dict，自动补充 finished_at 时间戳
+        """
+        record = dict(record)
+        record.setdefault('finished_at', time.strftime('%Y-%m-%d %H:%M:%S'))
+        line = json.dumps(record, ensure_ascii=False)
+        with self._lock:
+            if self._file is None:
+                return
+            self._file.write(line + '\n')
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+"""
+模型元数据缓存
+
+对 getByUuid / listByIds 等接口的返回结果做两级缓存，支持：
+- 内存 LRU 缓存
+- SQLite 持久化缓存（跨进程、跨次运行复用）
+- 过期时间（TTL）与最大条目数淘汰
+- 跳过缓存强制刷新
+- 命中率统计
+"""
+
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from util.AtomicCounter import AtomicCounter
+from util.Metrics import Metrics
+
+metrics = Metrics.shared()
+metrics.describe('liblib_cache_lookups_total', 'counter', '元数据缓存查询次数（按结果：memory/disk/miss）')
+
+
+class MetadataCache:
+    """
+    两级元数据缓存：先查内存 LRU，再查 SQLite，都未命中时调用加载函数并写回两级缓存
+    """
+
+    def __init__(self, db=None, ttl=86400, max_entries=1000, max_disk_entries=100000, bypass=False):
+        """
+        初始化元数据缓存
+
+        :param db: SQLiteDB 实例，为 None 时只使用内存缓存
+        :param ttl: 缓存有效期（秒），默认1天
+        :param max_entries: 内存中最多缓存的条目数，默认1000
+        :param max_disk_entries: SQLite 中最多缓存的条目数，默认100000
+        :param bypass: True 时不读取缓存（仍会用新结果刷新缓存）
+        """
+        self.db = db
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_disk_entries = max_disk_entries
+        self.bypass = bypass
+        self.logger = logging.getLogger()
+
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()
+        self.memory_hits = AtomicCounter(0)
+        self.disk_hits = AtomicCounter(0)
+        self.misses = AtomicCounter(0)
+        self._writes = AtomicCounter(0)
+
+    def _fresh(self, updated_at):
+        return self.ttl is None or self.ttl <= 0 or time.time() - updated_at < self.ttl
+
+    def _remember(self, key, value, updated_at):
+        with self._lock:
+            self._memory[key] = (value, updated_at)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+
+    def get(self, key, bypass=False):
+        """
+        读取缓存
+
+        :param key: 缓存键
+        :param bypass: True 时跳过缓存
+        :return: 缓存的值，未命中或已过期时返回 None
+        """
+        if self.bypass or bypass:
+            self.misses.add(1)
+            metrics.inc('liblib_cache_lookups_total', result='miss')
+            return None
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if self._fresh(entry[1]):
+                    self._memory.move_to_end(key)
+                    self.memory_hits.add(1)
+                    metrics.inc('liblib_cache_lookups_total', result='memory')
+                    return entry[0]
+                del self._memory[key]
+        if self.db is not None:
+            row = self.db.get_cache(key)
+            if row is not None and self._fresh(row[1]):
+                value = json.loads(row[0])
+                self._remember(key, value, row[1])
+                self.disk_hits.add(1)
+                metrics.inc('liblib_cache_lookups_total', result='disk')
+                return value
+        self.misses.add(1)
+        metrics.inc('liblib_cache_lookups_total', result='miss')
+        return None
+
+    def put(self, key, value):
+        """
+        写入缓存，值为 None 时不缓存
+
+        :param key: 缓存键
+        :param value: 可 JSON 序列化的值
+        """
+        if value is None:
+            return
+        updated_at = time.time()
+        self._remember(key, value, updated_at)
+        if self.db is not None:
+            self.db.put_cache(key, json.dumps(value, ensure_ascii=False), updated_at)
+            # 每写入一定次数清理一次磁盘缓存
+            if self._writes.add(1) % 100 == 0:
+                self.db.prune_cache(self.max_disk_entries)
+
+    def get_or_load(self, key, loader, bypass=False):
+        """
+        读取缓存，未命中时调用 loader 加载并写入缓存
+
+        :param key: 缓存键
+        :param loader: 无参加载函数
+        :param bypass: True 时跳过缓存直接加载
+        :return: 缓存或加载的值
+        """
+        value = self.get(key, bypass=bypass)
+        if value is None:
+            value = loader()
+            self.put(key, value)
+        return value
+
+    def stats(self):
+        """
+        缓存命中统计
+
+        :return: dict，包含内存命中、磁盘命中、未命中次数和命中率
+        """
+        memory_hits = self.memory_hits.value
+        disk_hits = self.disk_hits.value
+        misses = self.misses.value
+        total = memory_hits + disk_hits + misses
+        return {
+            'memory_hits': memory_hits,
+            'disk_hits': disk_hits,
+            'misses': misses,
+            'hit_rate': round((memory_hits + disk_hits) / total, 4) if total else 0.0,
+        }
+
+    def log_stats(self):
+        stats = self.stats()
+        self.logger.info(
+            f"元数据缓存统计：内存命中 {stats['memory_hits']} 次，磁盘命中 {stats['disk_hits']} 次，"
+            f"未命中 {stats['misses']} 次，命中率 {stats['hit_rate']:.1%}")
@@ -0,0 +1,296 @@
+# -*- coding: utf-8 -*-
+"""
+运行指标统计
+
+进程内共享的计数器、仪表和直方图，支持：
+- Prometheus 文本格式输出，可选启动本地 HTTP 服务供抓取（/metrics）
+- 定期把快照写入 JSON 文件，便于长时间采集后画图分析
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+
+# 接口耗时（秒）
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+# 下载速度（字节/秒）：64KB/s ~ 512MB/s
+THROUGHPUT_BUCKETS = tuple(64 * 1024 * 4 ** i for i in range(8))
+
+
+def _label_key(labels):
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(label_key, extra=None):
+    items = list(label_key) + list(extra or [])
+    if not items:
+        return ''
+    return '{' + ','.join(f'{k}="{v}"' for k, v in items) + '}'
+
+
+class _Histogram:
+    def __init__(self, buckets):
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * len(self.buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+
+    def cumulative(self):
+        total = 0
+        result = []
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            result.append((bound, total))
+        return result
+
+
+class Metrics:
+    """
+    指标注册表：名称 + 标签确定一条时间序列
+    """
+
+    _shared = None
+    _shared_lock = threading.Lock()
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # 名称 -> (类型, 说明, 直方图分桶)
+        self._meta = {}
+        # 名称 -> {标签: 值}
+        self._values = {}
+        # 采集时调用的函数，返回 [(名称, 标签 dict, 值), ...]，作为仪表输出
+        self._collectors = []
+
+    @classmethod
+    def shared(cls):
+        """
+        获取全局共享的指标注册表
+        """
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls()
+            return cls._shared
+
+    def _series(self, name, kind, labels, buckets=None):
+        if name not in self._meta:
+            self._meta[name] = (kind, '', buckets)
+            self._values[name] = {}
+        return self._values[name], _label_key(labels)
+
+    def describe(self, name, kind, help_text, buckets=None):
+        """
+        声明指标的类型和说明
+
+        :param name: 指标名
+        :param kind: counter / gauge / histogram
+        :param help_text: 说明
+        :param buckets: 直方图分桶上界
+        """
+        with self._lock:
+            self._meta[name] = (kind, help_text, buckets)
+            self._values.setdefault(name, {})
+
+    def inc(self, name, value=1, **labels):
+        """
+        计数器增加 value
+        """
+        with self._lock:
+            series, key = self._series(name, 'counter', labels)
+            series[key] = series.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        """
+        设置仪表的当前值
+        """
+        with self._lock:
+            series, key = self._series(name, 'gauge', labels)
+            series[key] = value
+
+    def observe(self, name, value, **labels):
+        """
+        直方图记录一个观测值
+        """
+        with self._lock:
+            series, key = self._series(name, 'histogram', labels, LATENCY_BUCKETS)
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = _Histogram(self._meta[name][2] or LATENCY_BUCKETS)
+            histogram.observe(value)
+
+    def time(self, name, **labels):
+        """
+        计时上下文：with metrics.time('xxx_seconds', endpoint='a'): ...
+        """
+        return _Timer(self, name, labels)
+
+    def register_collector(self, collector):
+        """
+        注册采集函数，每次输出时调用，返回 [(名称, 标签 dict, 值), ...]
+        """
+        with self._lock:
+            self._collectors.append(collector)
+
+    def unregister_collector(self, collector):
+        with self._lock:
+            if collector in self._collectors:
+                self._collectors.remove(collector)
+
+    def _collect(self):
+        """
+        合并注册的指标和采集函数的结果
+
+        :return: [(名称, 类型, 说明, [(标签, 值)])]
+        """
+        with self._lock:
+            meta = dict(self._meta)
+            values = {}
+            for name, series in self._values.items():
+                values[name] = [(key, v if not isinstance(v, _Histogram) else _copy_histogram(v))
+                                for key, v in series.items()]
+            collectors = list(self._collectors)
+
+        for collector in collectors:
+            try:
+                samples = collector() or []
+            except Exception as e:
+                logging.getLogger().warning(f"指标采集失败: {e}")
+                continue
+            for name, labels, value in samples:
+                meta.setdefault(name, ('gauge', '', None))
+                values.setdefault(name, []).append((_label_key(labels), value))
+
+        return [(name, meta[name][0], meta[name][1], values.get(name, [])) for name in sorted(meta)]
+
+    def to_prometheus(self):
+        """
+        Prometheus 文本格式
+        """
+        lines = []
+        for name, kind, help_text, series in self._collect():
+            if not series:
+                continue
+            if help_text:
+                lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for key, value in series:
+                if isinstance(value, _Histogram):
+                    for bound, count in value.cumulative():
+                        lines.append(f"{name}_bucket{_format_labels(key, [('le', bound)])} {count}")
+                    lines.append(f"{name}_bucket{_format_labels(key, [('le', '+Inf')])} {value.count}")
+                    lines.append(f"{name}_sum{_format_labels(key)} {value.sum}")
+                    lines.append(f"{name}_count{_format_labels(key)} {value.count}")
+                else:
+                    lines.append(f"{name}{_format_labels(key)} {value}")
+        return '\n'.join(lines) + '\n'
+
+    def snapshot(self):
+        """
+        当前所有指标的快照
+
+        :return: {名称: [{labels, value} 或 {labels, count, sum, buckets}]}
+        """
+        result = {'timestamp': time.time(), 'metrics': {}}
+        for name, kind, _, series in self._collect():
+            items = []
+            for key, value in series:
+                if isinstance(value, _Histogram):
+                    items.append({'labels': dict(key), 'count': value.count, 'sum': value.sum,
+                                  'buckets': {str(b): c for b, c in value.cumulative()}})
+                else:
+                    items.append({'labels': dict(key), 'value': value})
+            if items:
+                result['metrics'][name] = items
+        return result
+
+    def write_snapshot(self, path):
+        """
+        把快照写入 JSON 文件（先写临时文件再替换，读取方不会读到半个文件）
+        """
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        temp_path = path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.snapshot(), f, ensure_ascii=False, indent=2)
+        os.replace(temp_path, path)
+
+    def start_http_server(self, port, host='127.0.0.1'):
+        """
+        启动 Prometheus 抓取接口 http://host:port/metrics
+
+        :return: ThreadingHTTPServer
+        """
+        # 只有启用指标接口时才需要 http.server
+        from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] not in ('/', '/metrics'):
+                    self.send_error(404)
+                    return
+                body = metrics.to_prometheus().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, name='metrics-http', daemon=True).start()
+        logging.getLogger().info(f"指标接口已启动：http://{host}:{server.server_address[1]}/metrics")
+        return server
+
+    def start_snapshot_writer(self, path, interval=60):
+        """
+        后台线程每隔 interval 秒写一次 JSON 快照
+
+        :return: threading.Event，set() 后停止
+        """
+        stop = threading.Event()
+
+        def run():
+            while not stop.wait(interval):
+                try:
+                    self.write_snapshot(path)
+                except Exception as e:
+                    logging.getLogger().warning(f"写入指标快照失败: {e}")
+
+        threading.Thread(target=run, name='metrics-snapshot', daemon=True).start()
+        return stop
+
+
+def _copy_histogram(histogram):
+    copy = _Histogram(histogram.buckets)
+    copy.counts = list(histogram.counts)
+    copy.count = histogram.count
+    copy.sum = histogram.sum
+    return copy
+
+
+class _Timer:
+    def __init__(self, metrics, name, labels):
+        self.metrics = metrics
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.began = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.metrics.observe(self.name, time.perf_counter() - self.began, **self.labels)
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+"""
+分页并发抓取工具
+
+提供分页接口的并发抓取功能，支持：
+- 多页并发请求
+- 通过共享的令牌桶限速
+- 遇到最后一页（hasMore 为 False）后停止继续派发
+- 按页码顺序检查结果，满足停止条件（如增量同步遇到已知数据）后提前结束
+- 结果按页码顺序返回
+"""
+
+import logging
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+
+class PageCrawler:
+    """
+    封装分页接口的并发抓取逻辑，适用于搜索列表等按页返回且带 hasMore 标记的接口。
+    """
+
+    def __init__(self, fetch_page, concurrency=4, limiter=None):
+        """
+        初始化分页抓取器
+
+        :param fetch_page: 抓取单页的函数，参数为页码，返回 (items, has_more)
+        :param concurrency: 同时请求的页数，默认4
+        :param limiter: 可选，TokenBucket，每页请求前取一个令牌；
+                        fetch_page 内部已经通过全局限速器限速时无需传入
+        """
+        self.fetch_page = fetch_page
+        self.concurrency = max(1, int(concurrency))
+        self.limiter = limiter
+        self.logger = logging.getLogger()
+
+    def _fetch(self, page):
+        if self.limiter is not None:
+            self.limiter.acquire()
+        return self.fetch_page(page)
+
+    def crawl(self, start_page=1, stop_when=None):
+        """
+        并发抓取所有分页，直到某一页返回 hasMore 为 False
+
+        :param start_page: 起始页码，默认1
+        :param stop_when: 可选，参数为一页的条目列表，严格按页码顺序调用；返回 True 时该页作为最后一页
+        :return: 按页码排序的所有条目列表（包含最后一页的条目）
+        """
+        results = {}
+        last_page = None
+        next_page = start_page
+        # 下一个按顺序交给 stop_when 检查的页码
+        next_checked = start_page
+
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            pending = {}
+
+            def submit_more():
+                nonlocal next_page
+                while len(pending) < self.concurrency and (last_page is None or next_page <= last_page):
+                    pending[executor.submit(self._fetch, next_page)] = next_page
+                    next_page += 1
+
+            submit_more()
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    page = pending.pop(future)
+                    try:
+                        items, has_more = future.result()
+                    except Exception as e:
+                        # 记录出错的页码，取消其余未开始的请求后抛出
+                        self.logger.error(f"第 {page} 页数据获取失败: {e}")
+                        for other in pending:
+                            other.cancel()
+                        raise
+                    if last_page is not None and page > last_page:
+                        # 已知的最后一页之后的请求，结果直接丢弃
+                        continue
+                    results[page] = items
+                    if not has_more:
+                        last_page = page
+                    while stop_when is not None and next_checked in results and \
+                            (last_page is None or next_checked <= last_page):
+                        if stop_when(results[next_checked]):
+                            last_page = next_checked
+                        next_checked += 1
+                    if last_page is not None:
+                        for other, other_page in list(pending.items()):
+                            if other_page > last_page and other.cancel():
+                                pending.pop(other)
+                submit_more()
+
+        datas = []
+        for page in sorted(results):
+            if last_page is not None and page > last_page:
+                continue
+            datas.extend(results[page])
+        return datas
@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+"""
+下载进度汇总
+
+多线程下载时，各线程只累加自己的本地计数（无锁），
+由单独的汇报线程定时采样汇总，只有汇报线程更新进度条和指标，数据块循环中不再争用锁。
+"""
+
+import threading
+
+
+class LocalCounter:
+    """
+    单个线程的字节计数，只由所属线程写入，汇报线程只读：
+    value 为本次下载的字节数，resumed 为断点续传时已存在、无需下载的字节数（只计入进度）
+    """
+
+    __slots__ = ('value', 'resumed')
+
+    def __init__(self):
+        self.value = 0
+        self.resumed = 0
+
+
+class ProgressReporter:
+    """
+    定时采样各线程的本地计数，把增量交给进度条和回调
+    """
+
+    def __init__(self, progress_bar=None, on_progress=None, interval=0.5):
+        """
+        :param progress_bar: 可选，tqdm 进度条，只在汇报线程中更新
+        :param on_progress: 可选，参数为本次新下载的字节数（如写入指标）
+        :param interval: 采样间隔（秒），默认0.5秒
+        """
+        self.progress_bar = progress_bar
+        self.on_progress = on_progress
+        self.interval = interval
+        self._counters = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._reported = 0
+        self._resumed = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def counter(self):
+        """
+        当前线程的本地计数器，每个线程首次调用时创建（仅此时加锁）
+
+        :return: LocalCounter，调用方直接累加 counter.value
+        """
+        counter = getattr(self._local, 'counter', None)
+        if counter is None:
+            counter = LocalCounter()
+            with self._lock:
+                self._counters.append(counter)
+            self._local.counter = counter
+        return counter
+
+    @property
+    def transferred(self):
+        """
+        当前已下载的总字节数（不含断点续传已存在的部分）
+        """
+        with self._lock:
+            counters = list(self._counters)
+        return sum(c.value for c in counters)
+
+    def _report(self):
+        with self._lock:
+            counters = list(self._counters)
+        # 只在汇报线程中（以及汇报线程结束后的 stop 中）调用，_reported 无需加锁
+        transferred = sum(c.value for c in counters)
+        resumed = sum(c.resumed for c in counters)
+        delta = transferred - self._reported
+        resumed_delta = resumed - self._resumed
+        self._reported = transferred
+        self._resumed = resumed
+        if self.progress_bar is not None and delta + resumed_delta > 0:
+            self.progress_bar.update(delta + resumed_delta)
+        if self.on_progress is not None and delta > 0:
+            self.on_progress(delta)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._report()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='progress-reporter', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """
+        停止汇报线程，并汇报最后一次增量
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self._report()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+"""
+全局限速器
+
+所有线程共享的令牌桶限速，支持：
+- 接口请求数限速（所有接口共用一个令牌桶）
+- 下载带宽限速（所有下载任务、所有分片共用一个令牌桶）
+- 运行时调整速率，正在等待的线程在下一次取令牌时按新速率计算
+"""
+
+import threading
+import time
+
+
+class TokenBucket:
+    """
+    令牌桶：按 rate 每秒补充令牌，最多积攒 capacity 个；
+    一次取走的令牌数可以超过桶内余量（如一个下载块），超出部分记为欠账，由调用线程等待补齐。
+    """
+
+    def __init__(self, rate=0, capacity=None):
+        """
+        :param rate: 每秒补充的令牌数，<= 0 表示不限速
+        :param capacity: 桶容量（允许的突发量），默认等于 1 秒的令牌数
+        """
+        self._lock = threading.Lock()
+        self._rate = 0
+        self._capacity = 0
+        self._tokens = 0.0
+        self._updated_at = time.monotonic()
+        self.set_rate(rate, capacity)
+
+    @property
+    def rate(self):
+        return self._rate
+
+    def _refill(self, now):
+        if self._rate > 0:
+            self._tokens = min(self._capacity, self._tokens + (now - self._updated_at) * self._rate)
+        self._updated_at = now
+
+    def set_rate(self, rate, capacity=None):
+        """
+        调整速率
+
+        :param rate: 每秒补充的令牌数，<= 0 表示不限速
+        :param capacity: 桶容量，默认等于 1 秒的令牌数
+        """
+        rate = float(rate or 0)
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            was_unlimited = self._rate <= 0
+            self._rate = rate
+            self._capacity = float(capacity) if capacity else max(1.0, rate)
+            if rate <= 0:
+                self._tokens = 0.0
+            elif was_unlimited:
+                # 从不限速切换为限速时桶是满的
+                self._tokens = self._capacity
+            else:
+                self._tokens = min(self._tokens, self._capacity)
+
+    def acquire(self, amount=1):
+        """
+        取走 amount 个令牌，令牌不足时阻塞等待
+
+        :param amount: 令牌数（请求数或字节数）
+        :return: 等待的秒数
+        """
+        # 不限速时不加锁，避免下载线程在每个数据块上争用
+        if self._rate <= 0:
+            return 0.0
+        with self._lock:
+            if self._rate <= 0:
+                return 0.0
+            self._refill(time.monotonic())
+            self._tokens -= amount
+            wait_time = -self._tokens / self._rate if self._tokens < 0 else 0.0
+        if wait_time > 0:
+            time.sleep(wait_time)
+        return wait_time
+
+
+class RateLimiter:
+    """
+    全局限速配置：api 为接口请求数（次/秒），bandwidth 为下载带宽（字节/秒）
+    """
+
+    _shared = None
+    _shared_lock = threading.Lock()
+
+    def __init__(self, api_requests_per_second=0, download_bytes_per_second=0):
+        """
+        :param api_requests_per_second: 所有接口合计每秒最多请求数，<= 0 表示不限
+        :param download_bytes_per_second: 所有下载合计每秒最多字节数，<= 0 表示不限
+        """
+        self.api = TokenBucket(api_requests_per_second)
+        self.bandwidth = TokenBucket(download_bytes_per_second)
+
+    @classmethod
+    def shared(cls):
+        """
+        获取全局共享的限速器（默认不限速）
+        """
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls()
+            return cls._shared
+
+    def configure(self, api_requests_per_second=None, download_bytes_per_second=None):
+        """
+        运行时调整速率，参数为 None 时保持不变
+        """
+        if api_requests_per_second is not None:
+            self.api.set_rate(api_requests_per_second)
+        if download_bytes_per_second is not None:
+            self.bandwidth.set_rate(download_bytes_per_second)
+
+    def acquire_api(self):
+        """
+        发起一次接口请求前调用
+        """
+        return self.api.acquire(1)
+
+    def acquire_bytes(self, amount):
+        """
+        接收 amount 字节的下载数据后调用
+        """
+        return self.bandwidth.acquire(amount)
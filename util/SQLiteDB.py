@@ -1,54 +1,577 @@
 import sqlite3
 import os
-from util.file_util import file_util
+import threading
+import time
+from util.Config import Config
 
 
 class SQLiteDB:
-    # 初始化数据库
-    def __init__(self):
-        conf = file_util.read_yml()
-        self.db_path = os.path.join(conf.get('db')['path'], conf.get('db')['name'])
+    # 初始化数据库：只确定文件路径，首次访问时才打开连接并建表
+    def __init__(self, batch_size=20, db_path=None):
+        if db_path is None:
+            config = Config.shared()
+            db_path = os.path.join(config.resolve_path(config.db.path), config.db.name)
+        self.db_path = db_path
+        # 每个线程持有一个长连接，避免每次查询都重新打开数据库；
+        # 线程结束后其连接在下次打开新连接时关闭，短生命周期的工作线程不会累积连接
+        self._local = threading.local()
+        # [(线程, 连接)]
+        self._connections = []
+        self._lock = threading.Lock()
+        self._schema_lock = threading.Lock()
+        self._schema_ready = False
+        self._closed = False
+        # 待批量写入的已下载记录（含文件哈希和任务完成阶段），达到 batch_size 条后在一个事务中提交
+        self.batch_size = batch_size
+        # model_uuid -> ((model_uuid, model_name, model_info, sha256, md5), 任务阶段, 更新时间)
+        self._pending = {}
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            # 关闭后（进程退出时）不再为仍在结束中的线程重新打开连接
+            if self._closed:
+                raise sqlite3.ProgrammingError("数据库已关闭")
+            conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+            # WAL 模式下读写互不阻塞，适合多线程同时访问
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            with self._lock:
+                finished = [c for thread, c in self._connections if not thread.is_alive()]
+                self._connections = [(thread, c) for thread, c in self._connections if thread.is_alive()]
+                self._connections.append((threading.current_thread(), conn))
+            for c in finished:
+                c.close()
+            if not self._schema_ready:
+                with self._schema_lock:
+                    if not self._schema_ready:
+                        self._create_tables(conn)
+                        self._schema_ready = True
+        return conn
 
     def init_db(self):
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute('''
-                       CREATE TABLE IF NOT EXISTS downloaded_models
-                       (
-                           model_uuid
-                           TEXT
-                           PRIMARY
-                           KEY,
-                           model_name
-                           TEXT,
-                           model_info
-                           TEXT,
-                           download_time
-                           TIMESTAMP
-                           DEFAULT
-                           CURRENT_TIMESTAMP
-                       )
-                       ''')
-        conn.commit()
-        conn.close()
+        # 建表在首次访问数据库时自动完成，显式调用时立即打开数据库
+        self._conn()
+
+    def _create_tables(self, conn):
+        with conn:
+            conn.execute('''
+                         CREATE TABLE IF NOT EXISTS downloaded_models
+                         (
+                             model_uuid
+                             TEXT
+                             PRIMARY
+                             KEY,
+                             model_name
+                             TEXT,
+                             model_info
+                             TEXT,
+                             download_time
+                             TIMESTAMP
+                             DEFAULT
+                             CURRENT_TIMESTAMP
+                         )
+                         ''')
+            conn.execute('''
+                         CREATE TABLE IF NOT EXISTS metadata_cache
+                         (
+                             cache_key  TEXT PRIMARY KEY,
+                             value      TEXT,
+                             updated_at REAL
+                         )
+                         ''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_metadata_cache_updated_at ON metadata_cache (updated_at)')
+            # 增量搜索：每个查询条件见过的模型及首次/最近出现时间
+            conn.execute('''
+                         CREATE TABLE IF NOT EXISTS search_queries
+                         (
+                             query_key   TEXT PRIMARY KEY,
+                             query       TEXT,
+                             last_synced REAL
+                         )
+                         ''')
+            conn.execute('''
+                         CREATE TABLE IF NOT EXISTS search_index
+                         (
+                             query_key  TEXT,
+                             model_uuid TEXT,
+                             first_seen REAL,
+                             last_seen  REAL,
+                             PRIMARY KEY (query_key, model_uuid)
+                         )
+                         ''')
+            # 内容寻址存储：文件探测指纹 -> 完整 SHA-256
+            conn.execute('''
+                         CREATE TABLE IF NOT EXISTS blob_probes
+                         (
+                             probe_key TEXT PRIMARY KEY,
+                             sha256    TEXT,
+                             size      INTEGER
+                         )
+                         ''')
+            # 本地模型目录：结构化字段用于过滤，全文索引用于关键字搜索
+            conn.execute('''
+                         CREATE TABLE IF NOT EXISTS model_catalog
+                         (
+                             model_uuid TEXT PRIMARY KEY,
+                             name       TEXT,
+                             model_type INTEGER,
+                             base_types TEXT,
+                             indexed_at REAL
+                         )
+                         ''')
+            if not conn.execute("SELECT 1 FROM sqlite_master WHERE name='model_catalog_fts'").fetchone():
+                columns = 'model_uuid UNINDEXED, name, version_names, descriptions, tags'
+                try:
+                    # trigram 分词支持中文等无空格文本的子串匹配（SQLite 3.34+）
+                    conn.execute(f"CREATE VIRTUAL TABLE model_catalog_fts USING fts5({columns}, tokenize='trigram')")
+                except sqlite3.OperationalError:
+                    conn.execute(f"CREATE VIRTUAL TABLE model_catalog_fts USING fts5({columns})")
+            # 下载任务日志：每个模型的下载阶段与下载信息，以及多线程下载尚未写入的区间
+            conn.execute('''
+                         CREATE TABLE IF NOT EXISTS download_jobs
+                         (
+                             model_uuid TEXT PRIMARY KEY,
+                             stage      TEXT,
+                             payload    TEXT,
+                             error      TEXT,
+                             updated_at REAL
+                         )
+                         ''')
+            conn.execute('''
+                         CREATE TABLE IF NOT EXISTS download_segments
+                         (
+                             model_uuid TEXT PRIMARY KEY,
+                             total_size INTEGER,
+                             ranges     TEXT,
+                             updated_at REAL
+                         )
+                         ''')
+            # 本地模型文件的哈希缓存：大小和修改时间不变时不再重新计算
+            conn.execute('''
+                         CREATE TABLE IF NOT EXISTS file_hashes
+                         (
+                             path      TEXT PRIMARY KEY,
+                             size      INTEGER,
+                             mtime_ns  INTEGER,
+                             sha256    TEXT,
+                             md5       TEXT,
+                             hashed_at REAL
+                         )
+                         ''')
+            # 旧版本数据库补充文件哈希字段
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(downloaded_models)")}
+            for column in ('sha256', 'md5'):
+                if column not in columns:
+                    conn.execute(f"ALTER TABLE downloaded_models ADD COLUMN {column} TEXT")
 
     def is_model_downloaded(self, model_uuid):
         if model_uuid is None:
             return True
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM downloaded_models WHERE model_uuid=?", (model_uuid,))
+        with self._lock:
+            if model_uuid in self._pending:
+                return True
+        cursor = self._conn().execute("SELECT 1 FROM downloaded_models WHERE model_uuid=?", (model_uuid,))
         result = cursor.fetchone()
         # print("查询结果：", result)
-        conn.close()
         return result is not None
 
-    def insert_model_info(self, model_uuid, model_name=None, model_info=None):
+    def which_downloaded(self, model_uuids):
+        """
+        批量查询已下载的模型
+
+        :param model_uuids: 模型 uuid 列表
+        :return: 其中已下载的 uuid 集合
+        """
+        model_uuids = [u for u in dict.fromkeys(model_uuids) if u is not None]
+        with self._lock:
+            downloaded = {u for u in model_uuids if u in self._pending}
+        conn = self._conn()
+        # SQLite 单条语句的参数个数有限制，分批查询
+        for i in range(0, len(model_uuids), 500):
+            batch = model_uuids[i:i + 500]
+            placeholders = ','.join('?' * len(batch))
+            cursor = conn.execute(f"SELECT model_uuid FROM downloaded_models WHERE model_uuid IN ({placeholders})",
+                                  batch)
+            downloaded.update(row[0] for row in cursor.fetchall())
+        return downloaded
+
+    def insert_model_info(self, model_uuid, model_name=None, model_info=None, sha256=None, md5=None, job_stage=None):
+        """
+        写入已下载记录（先放入缓冲区，达到 batch_size 条或调用 flush 时批量提交）
+
+        :param sha256: 可选，模型文件的 SHA-256
+        :param md5: 可选，模型文件的 MD5
+        :param job_stage: 可选，同一事务中把下载任务记为该阶段（如完成），保证两者同时落盘
+        """
         if model_uuid is None:
             return
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute("INSERT INTO downloaded_models (model_uuid, model_name,model_info) VALUES (?, ?,?)",
-                       (model_uuid, model_name, model_info,))
-        conn.commit()
-        conn.close()
+        with self._lock:
+            self._pending[model_uuid] = ((model_uuid, model_name, model_info, sha256, md5), job_stage, time.time())
+            should_flush = len(self._pending) >= self.batch_size
+        if should_flush:
+            self.flush()
+
+    def insert_model_infos(self, rows, jobs=()):
+        """
+        在一个事务中批量写入已下载记录
+
+        :param rows: [(model_uuid, model_name, model_info, sha256, md5), ...]
+        :param jobs: 可选，同时更新的下载任务阶段 [(model_uuid, stage, updated_at), ...]
+        """
+        rows = [row for row in rows if row[0] is not None]
+        if not rows and not jobs:
+            return
+        conn = self._conn()
+        with conn:
+            conn.executemany(
+                "INSERT INTO downloaded_models (model_uuid, model_name, model_info, sha256, md5) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT (model_uuid) DO UPDATE SET sha256=COALESCE(excluded.sha256, downloaded_models.sha256), "
+                "md5=COALESCE(excluded.md5, downloaded_models.md5)", rows)
+            conn.executemany(
+                "INSERT INTO download_jobs (model_uuid, stage, payload, error, updated_at) VALUES (?, ?, NULL, NULL, ?) "
+                "ON CONFLICT (model_uuid) DO UPDATE SET stage=excluded.stage, error=NULL, "
+                "updated_at=excluded.updated_at", jobs)
+
+    def flush(self):
+        """
+        提交所有待写入的已下载记录及对应的任务阶段
+        """
+        with self._lock:
+            pending = list(self._pending.values())
+        self.insert_model_infos([row for row, _, _ in pending],
+                                [(row[0], stage, updated_at) for row, stage, updated_at in pending if stage])
+        # 写入成功后再移出缓冲区，保证期间的查询仍能看到这些记录
+        with self._lock:
+            for item in pending:
+                if self._pending.get(item[0][0]) is item:
+                    del self._pending[item[0][0]]
+
+    def update_model_hashes(self, model_uuid, sha256=None, md5=None):
+        """
+        记录模型文件的哈希值
+        """
+        if model_uuid is None:
+            return
+        # 模型信息可能还在写入缓冲区中，先提交
+        self.flush()
+        conn = self._conn()
+        with conn:
+            conn.execute("UPDATE downloaded_models SET sha256=?, md5=? WHERE model_uuid=?", (sha256, md5, model_uuid))
+
+    def get_downloaded_models(self):
+        """
+        所有已下载记录
+
+        :return: [(model_uuid, model_name, model_info, sha256, md5), ...]
+        """
+        self.flush()
+        return self._conn().execute(
+            "SELECT model_uuid, model_name, model_info, sha256, md5 FROM downloaded_models").fetchall()
+
+    def delete_downloaded_models(self, model_uuids):
+        """
+        删除已下载记录（文件缺失或损坏，需要重新下载），同时移出本地模型目录
+        """
+        rows = [(model_uuid,) for model_uuid in model_uuids]
+        if not rows:
+            return
+        self.flush()
+        conn = self._conn()
+        with conn:
+            conn.executemany("DELETE FROM downloaded_models WHERE model_uuid=?", rows)
+            conn.executemany("DELETE FROM model_catalog WHERE model_uuid=?", rows)
+            conn.executemany("DELETE FROM model_catalog_fts WHERE model_uuid=?", rows)
+
+    def get_file_hashes(self):
+        """
+        :return: {path: (size, mtime_ns, sha256, md5)}
+        """
+        cursor = self._conn().execute("SELECT path, size, mtime_ns, sha256, md5 FROM file_hashes")
+        return {row[0]: tuple(row[1:]) for row in cursor}
+
+    def get_file_hash(self, path):
+        """
+        :return: (size, mtime_ns, sha256, md5)，未缓存时返回 None
+        """
+        return self._conn().execute("SELECT size, mtime_ns, sha256, md5 FROM file_hashes WHERE path=?",
+                                    (path,)).fetchone()
+
+    def put_file_hashes(self, rows, hashed_at):
+        """
+        :param rows: [(path, size, mtime_ns, sha256, md5), ...]
+        """
+        if not rows:
+            return
+        conn = self._conn()
+        with conn:
+            conn.executemany("INSERT OR REPLACE INTO file_hashes (path, size, mtime_ns, sha256, md5, hashed_at) "
+                             "VALUES (?, ?, ?, ?, ?, ?)", [tuple(row) + (hashed_at,) for row in rows])
+
+    def delete_file_hashes(self, paths):
+        rows = [(path,) for path in paths]
+        if not rows:
+            return
+        conn = self._conn()
+        with conn:
+            conn.executemany("DELETE FROM file_hashes WHERE path=?", rows)
+
+    def get_cache(self, cache_key):
+        """
+        读取元数据缓存
+
+        :return: (value, updated_at)，不存在时返回 None
+        """
+        cursor = self._conn().execute("SELECT value, updated_at FROM metadata_cache WHERE cache_key=?", (cache_key,))
+        return cursor.fetchone()
+
+    def put_cache(self, cache_key, value, updated_at):
+        conn = self._conn()
+        with conn:
+            conn.execute("INSERT OR REPLACE INTO metadata_cache (cache_key, value, updated_at) VALUES (?, ?, ?)",
+                         (cache_key, value, updated_at))
+
+    def prune_cache(self, max_entries):
+        """
+        只保留最近更新的 max_entries 条元数据缓存
+        """
+        conn = self._conn()
+        with conn:
+            conn.execute("DELETE FROM metadata_cache WHERE cache_key NOT IN "
+                         "(SELECT cache_key FROM metadata_cache ORDER BY updated_at DESC LIMIT ?)", (max_entries,))
+
+    def which_known_in_search(self, query_key, model_uuids):
+        """
+        查询某个搜索条件下已经见过的模型
+
+        :param query_key: 搜索条件键
+        :param model_uuids: 模型 uuid 列表
+        :return: 其中已见过的 uuid 集合
+        """
+        model_uuids = [u for u in dict.fromkeys(model_uuids) if u is not None]
+        known = set()
+        conn = self._conn()
+        for i in range(0, len(model_uuids), 500):
+            batch = model_uuids[i:i + 500]
+            placeholders = ','.join('?' * len(batch))
+            cursor = conn.execute(f"SELECT model_uuid FROM search_index WHERE query_key=? AND model_uuid IN ({placeholders})",
+                                  [query_key] + batch)
+            known.update(row[0] for row in cursor.fetchall())
+        return known
+
+    def get_search_uuids(self, query_key):
+        """
+        某个搜索条件下见过的所有模型，最新出现的在前
+
+        :return: uuid 列表
+        """
+        cursor = self._conn().execute("SELECT model_uuid FROM search_index WHERE query_key=? "
+                                      "ORDER BY first_seen DESC, rowid DESC", (query_key,))
+        return [row[0] for row in cursor.fetchall()]
+
+    def get_search_synced_at(self, query_key):
+        """
+        某个搜索条件上次同步的时间，从未同步时返回 None
+        """
+        row = self._conn().execute("SELECT last_synced FROM search_queries WHERE query_key=?", (query_key,)).fetchone()
+        return row[0] if row else None
+
+    def record_search_results(self, query_key, query, model_uuids, synced_at):
+        """
+        记录一次搜索同步的结果：新模型写入首次出现时间，已有模型更新最近出现时间
+
+        :param query_key: 搜索条件键
+        :param query: 搜索条件（JSON 字符串）
+        :param model_uuids: 本次抓取到的 uuid 列表（最新的在前）
+        :param synced_at: 同步时间戳
+        """
+        conn = self._conn()
+        with conn:
+            conn.execute("INSERT OR REPLACE INTO search_queries (query_key, query, last_synced) VALUES (?, ?, ?)",
+                         (query_key, query, synced_at))
+            # 倒序插入，同一次同步中越新的模型 rowid 越大
+            conn.executemany(
+                "INSERT INTO search_index (query_key, model_uuid, first_seen, last_seen) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (query_key, model_uuid) DO UPDATE SET last_seen=excluded.last_seen",
+                [(query_key, u, synced_at, synced_at) for u in reversed(list(dict.fromkeys(model_uuids)))])
+
+    def get_blob_probe(self, probe_key):
+        """
+        根据探测指纹查询文件的 SHA-256，未记录时返回 None
+        """
+        row = self._conn().execute("SELECT sha256 FROM blob_probes WHERE probe_key=?", (probe_key,)).fetchone()
+        return row[0] if row else None
+
+    def put_blob_probe(self, probe_key, sha256, size):
+        conn = self._conn()
+        with conn:
+            conn.execute("INSERT OR REPLACE INTO blob_probes (probe_key, sha256, size) VALUES (?, ?, ?)",
+                         (probe_key, sha256, size))
+
+    def delete_blob_probes(self, sha256):
+        """
+        删除指向某个 SHA-256 的所有探测指纹
+        """
+        conn = self._conn()
+        with conn:
+            conn.execute("DELETE FROM blob_probes WHERE sha256=?", (sha256,))
+
+    def get_job(self, model_uuid):
+        """
+        读取下载任务记录
+
+        :return: (stage, payload, error)，不存在时返回 None
+        """
+        row = self._conn().execute("SELECT stage, payload, error FROM download_jobs WHERE model_uuid=?",
+                                   (model_uuid,)).fetchone()
+        with self._lock:
+            pending = self._pending.get(model_uuid)
+        # 缓冲区中尚未提交的任务阶段
+        if pending is not None and pending[1]:
+            return pending[1], row[1] if row else None, None
+        return row
+
+    def put_job(self, model_uuid, stage, payload, updated_at):
+        """
+        记录下载任务阶段，payload 为 None 时保留原有的下载信息，并清除上次的失败原因
+        """
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                "INSERT INTO download_jobs (model_uuid, stage, payload, error, updated_at) VALUES (?, ?, ?, NULL, ?) "
+                "ON CONFLICT (model_uuid) DO UPDATE SET stage=excluded.stage, "
+                "payload=COALESCE(excluded.payload, download_jobs.payload), error=NULL, updated_at=excluded.updated_at",
+                (model_uuid, stage, payload, updated_at))
+
+    def set_job_error(self, model_uuid, error, updated_at):
+        conn = self._conn()
+        with conn:
+            conn.execute("UPDATE download_jobs SET error=?, updated_at=? WHERE model_uuid=?",
+                         (error, updated_at, model_uuid))
+
+    def get_jobs(self):
+        """
+        :return: [(model_uuid, stage, payload), ...]
+        """
+        self.flush()
+        return self._conn().execute("SELECT model_uuid, stage, payload FROM download_jobs").fetchall()
+
+    def get_unfinished_jobs(self, finished_stages):
+        """
+        未完成的下载任务
+
+        :param finished_stages: 已结束的阶段列表
+        :return: 模型 uuid 列表，按最近更新时间排序
+        """
+        self.flush()
+        placeholders = ', '.join('?' * len(finished_stages))
+        cursor = self._conn().execute(f"SELECT model_uuid FROM download_jobs WHERE stage NOT IN ({placeholders}) "
+                                      f"ORDER BY updated_at", tuple(finished_stages))
+        return [row[0] for row in cursor.fetchall()]
+
+    def get_job_segments(self, model_uuid):
+        """
+        读取多线程下载尚未写入的区间
+
+        :return: (total_size, ranges JSON)，不存在时返回 None
+        """
+        return self._conn().execute("SELECT total_size, ranges FROM download_segments WHERE model_uuid=?",
+                                    (model_uuid,)).fetchone()
+
+    def put_job_segments(self, model_uuid, total_size, ranges, updated_at):
+        conn = self._conn()
+        with conn:
+            conn.execute("INSERT OR REPLACE INTO download_segments (model_uuid, total_size, ranges, updated_at) "
+                         "VALUES (?, ?, ?, ?)", (model_uuid, total_size, ranges, updated_at))
+
+    def delete_job_segments(self, model_uuid):
+        conn = self._conn()
+        with conn:
+            conn.execute("DELETE FROM download_segments WHERE model_uuid=?", (model_uuid,))
+
+    def models_missing_from_catalog(self):
+        """
+        已下载但尚未写入本地模型目录的模型
+
+        :return: [(model_uuid, model_info), ...]
+        """
+        self.flush()
+        cursor = self._conn().execute(
+            "SELECT d.model_uuid, d.model_info FROM downloaded_models d "
+            "LEFT JOIN model_catalog c ON c.model_uuid = d.model_uuid WHERE c.model_uuid IS NULL")
+        return cursor.fetchall()
+
+    def upsert_catalog_entries(self, entries, indexed_at):
+        """
+        写入本地模型目录及全文索引
+
+        :param entries: [(model_uuid, name, model_type, base_types, version_names, descriptions, tags), ...]，
+                        base_types 为 ',19,3,' 形式的字符串
+        :param indexed_at: 写入时间戳
+        """
+        if not entries:
+            return
+        conn = self._conn()
+        with conn:
+            uuids = [(e[0],) for e in entries]
+            conn.executemany("DELETE FROM model_catalog_fts WHERE model_uuid=?", uuids)
+            conn.executemany(
+                "INSERT OR REPLACE INTO model_catalog (model_uuid, name, model_type, base_types, indexed_at) "
+                "VALUES (?, ?, ?, ?, ?)", [(e[0], e[1], e[2], e[3], indexed_at) for e in entries])
+            conn.executemany(
+                "INSERT INTO model_catalog_fts (model_uuid, name, version_names, descriptions, tags) "
+                "VALUES (?, ?, ?, ?, ?)", [(e[0], e[1], e[4], e[5], e[6]) for e in entries])
+
+    def clear_catalog(self):
+        conn = self._conn()
+        with conn:
+            conn.execute("DELETE FROM model_catalog")
+            conn.execute("DELETE FROM model_catalog_fts")
+
+    def search_catalog(self, match=None, like_terms=(), model_types=(), base_types=(), limit=50):
+        """
+        查询本地模型目录
+
+        :param match: FTS5 MATCH 表达式，None 表示不做全文匹配
+        :param like_terms: 需要逐列模糊匹配的短关键字（trigram 分词不支持少于 3 个字符的关键字）
+        :param model_types: 模型类型过滤（ModelType 值）
+        :param base_types: 基模类型过滤（BaseModelType 值），满足其一即可
+        :param limit: 最多返回条数
+        :return: [(model_uuid, name, model_type, base_types, snippet), ...]，有全文匹配时按相关度排序
+        """
+        where = []
+        params = []
+        if match:
+            where.append("model_catalog_fts MATCH ?")
+            params.append(match)
+        for term in like_terms:
+            where.append("(model_catalog_fts.name LIKE ? OR version_names LIKE ? OR descriptions LIKE ? OR tags LIKE ?)")
+            params.extend([f"%{term}%"] * 4)
+        if model_types:
+            where.append(f"c.model_type IN ({','.join('?' * len(model_types))})")
+            params.extend(int(t) for t in model_types)
+        if base_types:
+            where.append("(" + " OR ".join("c.base_types LIKE ?" for _ in base_types) + ")")
+            params.extend(f"%,{int(t)},%" for t in base_types)
+        snippet = "snippet(model_catalog_fts, -1, '[', ']', '…', 12)" if match else "''"
+        sql = (f"SELECT c.model_uuid, c.name, c.model_type, c.base_types, {snippet} "
+               f"FROM model_catalog_fts JOIN model_catalog c ON c.model_uuid = model_catalog_fts.model_uuid")
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY bm25(model_catalog_fts)" if match else " ORDER BY c.name"
+        sql += " LIMIT ?"
+        params.append(int(limit))
+        return self._conn().execute(sql, params).fetchall()
+
+    def close(self):
+        if self._closed:
+            return
+        self.flush()
+        self._closed = True
+        with self._lock:
+            connections = self._connections
+            self._connections = []
+        for _, conn in connections:
+            conn.close()
+        self._local = threading.local()
@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+"""
+自适应分片队列
+
+将文件切分为较小的分片放入共享队列，下载线程按需领取，支持：
+- 快的连接多领分片，慢的连接少领分片
+- 队列取空后，空闲线程把剩余最多的分片对半拆分接手（work stealing）
+- 记录每个分片的吞吐量
+- 只下载指定的剩余区间（断点续传），并随时给出尚未写入的区间
+"""
+
+import threading
+import time
+from collections import deque
+
+
+class Segment:
+    """
+    一个下载分片，覆盖 [start, end] 字节区间（含两端），pos 为下一个待写入的字节位置，
+    committed 为已实际写入文件的末尾位置（只由领取该分片的线程在写入后更新）
+    """
+
+    def __init__(self, index, start, end, parent=None):
+        self.index = index
+        self.start = start
+        self.end = end
+        self.pos = start
+        self.committed = start
+        self.parent = parent
+        self.downloaded = 0
+        self.started_at = None
+        self.finished_at = None
+
+    def remaining(self):
+        return self.end - self.pos + 1
+
+    def throughput(self):
+        """
+        分片下载速度（字节/秒）
+        """
+        if self.started_at is None:
+            return 0.0
+        elapsed = (self.finished_at or time.time()) - self.started_at
+        return self.downloaded / elapsed if elapsed > 0 else 0.0
+
+    def __repr__(self):
+        return f"Segment({self.index}, {self.start}-{self.end}, pos={self.pos})"
+
+
+class SegmentQueue:
+    """
+    线程安全的分片队列，所有分片的起止位置只在持锁时修改
+    """
+
+    def __init__(self, total_size, segment_size=8 * 1024 * 1024, min_split_size=1024 * 1024, ranges=None):
+        """
+        初始化分片队列
+
+        :param total_size: 文件总大小（字节）
+        :param segment_size: 初始分片大小（字节），默认8MB
+        :param min_split_size: 拆分后每一半的最小大小（字节），默认1MB
+        :param ranges: 可选，只下载这些 [(start, end), ...] 区间（断点续传时的剩余区间），默认整个文件
+        """
+        self.total_size = total_size
+        self.min_split_size = max(1, min_split_size)
+        self._lock = threading.Lock()
+        self._pending = deque()
+        self._active = set()
+        self._segments = []
+        self._aborted = False
+
+        segment_size = max(1, segment_size)
+        for range_start, range_end in (ranges if ranges is not None else [(0, total_size - 1)]):
+            starts = list(range(range_start, range_end + 1, segment_size))
+            # 末尾不足 min_split_size 的零头并入前一个分片
+            if len(starts) > 1 and range_end + 1 - starts[-1] < self.min_split_size:
+                starts.pop()
+            for i, start in enumerate(starts):
+                end = starts[i + 1] - 1 if i + 1 < len(starts) else range_end
+                self._add_pending(start, end)
+
+    def _add_pending(self, start, end, parent=None):
+        segment = Segment(len(self._segments), start, end, parent)
+        self._segments.append(segment)
+        self._pending.append(segment)
+        return segment
+
+    def next_segment(self):
+        """
+        领取一个分片；队列为空时拆分剩余最多的进行中分片
+
+        :return: Segment，没有可领取的分片时返回 None
+        """
+        with self._lock:
+            if self._aborted:
+                return None
+            if not self._pending:
+                self._steal()
+            if not self._pending:
+                return None
+            segment = self._pending.popleft()
+            segment.started_at = time.time()
+            self._active.add(segment)
+            return segment
+
+    def _steal(self):
+        if not self._active:
+            return
+        victim = max(self._active, key=lambda s: s.remaining())
+        remaining = victim.remaining()
+        if remaining < 2 * self.min_split_size:
+            return
+        middle = victim.pos + remaining // 2
+        self._add_pending(middle, victim.end, parent=victim.index)
+        victim.end = middle - 1
+
+    def advance(self, segment, length):
+        """
+        记录分片写入进度。分片可能已被拆分，超出当前 end 的部分不应写入
+
+        :param segment: 分片
+        :param length: 本次收到的字节数
+        :return: 本次允许写入的字节数，为 0 时应停止该分片的下载
+        """
+        with self._lock:
+            if self._aborted:
+                return 0
+            allowed = max(0, min(length, segment.end - segment.pos + 1))
+            segment.pos += allowed
+            segment.downloaded += allowed
+            return allowed
+
+    def commit(self, segment, end):
+        """
+        记录分片已写入文件至 end（不含），由领取该分片的线程在写入后调用
+        """
+        segment.committed = end
+
+    def remaining_ranges(self):
+        """
+        尚未写入文件的区间（用于保存断点），进行中的分片从已写入的位置算起
+
+        :return: [(start, end), ...]，按起始位置排序
+        """
+        with self._lock:
+            ranges = [(s.committed, s.end) for s in self._segments if s.committed <= s.end]
+        return sorted(ranges)
+
+    def finish(self, segment):
+        with self._lock:
+            segment.finished_at = time.time()
+            self._active.discard(segment)
+
+    def abort(self):
+        """
+        中止下载：其它线程不再领取新分片，进行中的分片尽快停止
+        """
+        with self._lock:
+            self._aborted = True
+
+    def is_aborted(self):
+        with self._lock:
+            return self._aborted
+
+    def is_complete(self):
+        with self._lock:
+            return not self._pending and not self._active and all(s.remaining() == 0 for s in self._segments)
+
+    def stats(self):
+        """
+        每个分片的吞吐量统计
+
+        :return: list of dict，包含分片编号、区间、拆分来源、字节数、耗时和速度（字节/秒）
+        """
+        with self._lock:
+            segments = list(self._segments)
+        result = []
+        for s in segments:
+            elapsed = ((s.finished_at or time.time()) - s.started_at) if s.started_at else 0.0
+            result.append({
+                'index': s.index,
+                'start': s.start,
+                'end': s.end,
+                'split_from': s.parent,
+                'bytes': s.downloaded,
+                'seconds': round(elapsed, 3),
+                'bytes_per_second': round(s.throughput(), 1),
+            })
+        return result
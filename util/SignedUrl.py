@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+"""
+带时效签名的下载地址
+
+下载地址中的 auth_key 有有效期，大文件分片下载或断点续传时可能中途过期（返回 401/403）。
+SignedUrl 保存当前地址，过期时通过回调重新获取：多个分片线程同时遇到过期只刷新一次，
+其它线程直接使用刷新后的地址继续下载剩余部分。
+"""
+
+import logging
+import threading
+
+from util.Metrics import Metrics
+
+# 表示签名过期 / 无权限的状态码
+AUTH_EXPIRED_STATUS = (401, 403)
+
+metrics = Metrics.shared()
+metrics.describe('liblib_download_url_refreshes_total', 'counter', '下载地址过期后重新获取的次数')
+
+
+class SignedUrl:
+    """
+    可刷新的下载地址，线程安全
+    """
+
+    def __init__(self, url, refresh=None, max_refreshes=3):
+        """
+        :param url: 当前下载地址
+        :param refresh: 可选，无参回调，返回新的下载地址（失败时返回 None）
+        :param max_refreshes: 单个文件最多刷新次数，避免无权限时无限重试
+        """
+        self.url = url
+        self._refresh = refresh
+        self.max_refreshes = max_refreshes
+        self.refreshes = 0
+        self._lock = threading.Lock()
+        self.logger = logging.getLogger()
+
+    def request(self, client, method='GET', **kwargs):
+        """
+        请求当前地址，签名过期（401/403）时重新获取地址后重试
+
+        :param client: HttpClient 实例
+        :return: Response（由调用方关闭）
+        """
+        url = self.url
+        r = client.request(method, url, **kwargs)
+        while r.status_code in AUTH_EXPIRED_STATUS:
+            new_url = self.refresh(url)
+            if new_url is None:
+                break
+            r.close()
+            url = new_url
+            r = client.request(method, url, **kwargs)
+        return r
+
+    def refresh(self, stale_url):
+        """
+        下载地址过期时获取新地址
+
+        :param stale_url: 请求失败时使用的地址；已被其它线程刷新过时直接返回当前地址
+        :return: 新的下载地址，无法刷新时返回 None
+        """
+        if self._refresh is None:
+            return None
+        with self._lock:
+            if self.url != stale_url:
+                return self.url
+            if self.refreshes >= self.max_refreshes:
+                return None
+            self.refreshes += 1
+            try:
+                url = self._refresh()
+            except Exception as e:
+                self.logger.warning(f"重新获取下载地址失败: {e}")
+                return None
+            if not url:
+                return None
+            self.url = url
+            metrics.inc('liblib_download_url_refreshes_total')
+            self.logger.info(f"下载地址已过期，已重新获取（第 {self.refreshes} 次）")
+            return url
@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+"""
+下载过程中的流式哈希计算
+
+在写入文件的同时计算 SHA-256 / MD5，下载完成后无需再完整读取一遍文件：
+- StreamHasher：顺序写入（单线程下载、分片合并）时直接对数据块计算
+- OrderedHasher：多线程分片乱序写入时，由后台线程按文件顺序从页缓存读取并单次计算
+"""
+
+import hashlib
+import threading
+from collections import deque
+
+DEFAULT_ALGORITHMS = ('sha256', 'md5')
+
+
+class StreamHasher:
+    """
+    顺序数据流的哈希计算
+    """
+
+    def __init__(self, algorithms=DEFAULT_ALGORITHMS):
+        self.hashers = {name: hashlib.new(name) for name in algorithms}
+
+    def update(self, data):
+        for hasher in self.hashers.values():
+            hasher.update(data)
+
+    def update_from_file(self, path, length=None, block_size=1024 * 1024):
+        """
+        读取文件开头 length 字节计算哈希（断点续传时补算已下载的部分）
+        """
+        remaining = length
+        with open(path, 'rb') as f:
+            while remaining is None or remaining > 0:
+                block = f.read(block_size if remaining is None else min(block_size, remaining))
+                if not block:
+                    break
+                self.update(block)
+                if remaining is not None:
+                    remaining -= len(block)
+
+    def hexdigests(self):
+        return {name: hasher.hexdigest() for name, hasher in self.hashers.items()}
+
+
+class OrderedHasher:
+    """
+    乱序写入的文件按顺序计算哈希：
+
+    各分片线程写入后调用 mark_written(offset, length) 登记区间（读缓冲区会被复用，不保留数据）。
+    区间接上已登记的连续部分后，由后台线程从刚写入的文件（页缓存）中按顺序读取计算；
+    整个文件只按顺序计算一遍，分片线程不会因为哈希计算而阻塞。
+    """
+
+    def __init__(self, read_at, total_size, algorithms=DEFAULT_ALGORITHMS, block_size=1024 * 1024):
+        """
+        :param read_at: 按偏移读取已写入数据的函数，参数为 (offset, length)
+        :param total_size: 文件总大小
+        :param algorithms: 哈希算法
+        :param block_size: 从文件读取时的块大小
+        """
+        self.read_at = read_at
+        self.total_size = total_size
+        self.block_size = block_size
+        self._hasher = StreamHasher(algorithms)
+        self._cond = threading.Condition()
+        # 已交给后台线程的连续数据的末尾位置
+        self._expected = 0
+        # 已写入但尚未连续的区间：offset -> length
+        self._intervals = {}
+        # 已连续、等待计算的区间：(offset, length)
+        self._queue = deque()
+        self._closed = False
+        self._error = None
+        self._thread = threading.Thread(target=self._run, name='ordered-hasher', daemon=True)
+        self._thread.start()
+
+    def mark_written(self, offset, length):
+        """
+        记录一段已写入文件的数据（包括断点续传时已下载的部分），由后台线程从文件读取计算
+
+        :param offset: 数据在文件中的偏移
+        :param length: 数据长度
+        """
+        if length <= 0:
+            return
+        with self._cond:
+            if offset == self._expected:
+                self._queue.append((offset, length))
+                self._expected += length
+                self._drain_intervals()
+                self._cond.notify()
+            else:
+                self._intervals[offset] = length
+
+    def _drain_intervals(self):
+        # 之前乱序写入、现在已接上的区间（持锁调用）
+        while self._expected in self._intervals:
+            start = self._expected
+            self._expected += self._intervals.pop(start)
+            self._queue.append((start, self._expected - start))
+
+    def _run(self):
+        try:
+            while True:
+                with self._cond:
+                    while not self._queue and not self._closed:
+                        self._cond.wait()
+                    if not self._queue:
+                        return
+                    offset, length = self._queue.popleft()
+                self._hash_from_file(offset, length)
+        except Exception as e:
+            self._error = e
+
+    def _hash_from_file(self, offset, length):
+        end = offset + length
+        while offset < end:
+            block = self.read_at(offset, min(self.block_size, end - offset))
+            if not block:
+                raise IOError(f"读取文件失败，偏移 {offset}")
+            self._hasher.update(block)
+            offset += len(block)
+
+    def finish(self):
+        """
+        等待后台计算完成
+
+        :return: {算法: 十六进制摘要}
+        """
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._thread.join()
+        if self._error is not None:
+            raise self._error
+        if self._expected != self.total_size:
+            raise IOError(f"哈希计算不完整：{self._expected}/{self.total_size}")
+        return self._hasher.hexdigests()
+
+    def close(self):
+        """
+        放弃计算（下载失败时调用）
+        """
+        with self._cond:
+            self._closed = True
+            self._queue.clear()
+            self._cond.notify()
+        self._thread.join()
+
+
+def verify_hashes(actual, expected):
+    """
+    对比实际哈希与期望哈希，忽略大小写，只比较双方都有的算法
+
+    :return: 不一致的算法列表
+    """
+    mismatched = []
+    for name, value in (expected or {}).items():
+        if value and name in actual and actual[name].lower() != str(value).lower():
+            mismatched.append(name)
+    return mismatched
@@ -1,14 +1,20 @@
-# 这里修改为自己的token，通过浏览器获取
 # 读取 YAML 配置文件
 import yaml
 import os
 
+from util.Config import Config
+
+
 class file_util:
 
     def __init__(self):
         self.path = os.path.dirname(os.path.abspath(__file__))
 
-    def read_yml(file_path='conf/conf.yml'):
+    @staticmethod
+    def read_yml(file_path=None):
+        # 不指定文件时返回进程内共享的 conf.yml（只解析一次）
+        if file_path is None:
+            return Config.shared().data
         with open(file_path, 'r', encoding='utf-8') as file:
             config = yaml.safe_load(file)
-        return config
\ No newline at end of file
+        return config